@@ -0,0 +1,160 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, select, and_, func
+from scrapebot.database import base, User, Instance, Recipe, RecipeStep, RecipeStepTypeEnum, Run, RunStatusEnum, \
+    Log, Data, SchemaVersion
+from scrapebot.migrate import SchemaMigrator, get_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time frequent database queries on a synthetic dataset, both before ' +
+                                                 'and after migrating the database schema (i.e., adding its indexes).')
+    parser.add_argument('--database', help='SQLAlchemy URL of an empty(!) database to use (default is a temporary ' +
+                                           'SQLite file)')
+    parser.add_argument('--recipes', type=int, default=100, help='number of recipes (default is 100)')
+    parser.add_argument('--runs', type=int, default=200, help='number of runs per recipe (default is 200)')
+    parser.add_argument('--rows', type=int, default=10,
+                        help='number of log entries and data rows per run (default is 10 each)')
+    parser.add_argument('--repeat', type=int, default=50, help='number of times to run each query (default is 50)')
+    args = parser.parse_args()
+
+    temp_dir = None
+    database = args.database
+    if database is None:
+        temp_dir = tempfile.TemporaryDirectory()
+        database = 'sqlite:///' + os.path.join(temp_dir.name, 'benchmark.db')
+    engine = create_engine(database, encoding='utf-8')
+    create_unmigrated_schema(engine)
+    print('Filling database with ' + str(args.recipes) + ' recipes, ' + str(args.recipes * args.runs) + ' runs, and ' +
+          str(args.recipes * args.runs * args.rows) + ' log entries as well as data rows ...')
+    recipe_uids, instance_uids = fill(engine, args.recipes, args.runs, args.rows)
+    queries = get_queries(engine, recipe_uids, instance_uids, args.repeat)
+
+    before = time_queries(engine, queries)
+    print('Migrating database schema ...')
+    for version, description in SchemaMigrator(engine).migrate():
+        print('- version ' + str(version) + ': ' + description)
+    after = time_queries(engine, queries)
+
+    print('')
+    print('%-40s %12s %12s %9s' % ('query (median of ' + str(args.repeat) + ')', 'before [ms]', 'after [ms]', 'speedup'))
+    for name in before.keys():
+        print('%-40s %12.3f %12.3f %8.1fx' % (name, before[name] * 1000, after[name] * 1000,
+                                               before[name] / max(after[name], 1e-9)))
+    if temp_dir is not None:
+        engine.dispose()
+        temp_dir.cleanup()
+
+
+def create_unmigrated_schema(engine):
+    """
+    Create all tables as they were before any migration, i.e., without the indexes added through migrations
+    :param engine:
+    :return:
+    """
+    base.metadata.create_all(engine)
+    for table, name in [(Run.__table__, 'ix_run_recipe_instance_status_created'), (Data.__table__, 'ix_data_run_step'),
+                        (Log.__table__, 'ix_log_run_created'), (RecipeStep.__table__, 'ix_recipestep_recipe_sort')]:
+        get_index(table, name).drop(engine)
+    engine.execute(SchemaVersion.__table__.delete())
+
+
+def fill(engine, recipe_count, run_count, row_count):
+    with engine.begin() as connection:
+        user_uid = connection.execute(User.__table__.insert().values(name='benchmark', email='benchmark@localhost'))\
+            .inserted_primary_key[0]
+        instance_uids = [connection.execute(Instance.__table__.insert().values(name='benchmark_' + str(i),
+                                                                               owner_uid=user_uid))
+                         .inserted_primary_key[0] for i in range(2)]
+        recipe_uids = []
+        step_uids = {}
+        for i in range(recipe_count):
+            recipe_uid = connection.execute(Recipe.__table__.insert().values(name='benchmark_' + str(i), active=True,
+                                                                             owner_uid=user_uid))\
+                .inserted_primary_key[0]
+            recipe_uids.append(recipe_uid)
+            step_uids[recipe_uid] = [connection.execute(RecipeStep.__table__.insert().values(
+                recipe_uid=recipe_uid, sort=sort, type=RecipeStepTypeEnum.data, value='x', active=True
+            )).inserted_primary_key[0] for sort in range(1, 6)]
+    start = datetime(2020, 1, 1)
+    statuses = list(RunStatusEnum)
+    for i in range(run_count):
+        with engine.begin() as connection:
+            runs = [{
+                'recipe_uid': recipe_uid,
+                'instance_uid': random.choice(instance_uids),
+                'status': random.choice(statuses),
+                'created': start + timedelta(minutes=i * 15, seconds=j)
+            } for j, recipe_uid in enumerate(recipe_uids)]
+            last_uid = connection.execute(select([func.max(Run.uid)])).scalar() or 0
+            connection.execute(Run.__table__.insert(), runs)
+            run_uids = connection.execute(select([Run.uid, Run.recipe_uid]).where(Run.uid > last_uid)).fetchall()
+            logs = []
+            data = []
+            for run_uid, recipe_uid in run_uids:
+                created = start + timedelta(minutes=i * 15)
+                for k in range(row_count):
+                    logs.append({'run_uid': run_uid, 'created': created + timedelta(seconds=k),
+                                 'message': 'log ' + str(k)})
+                    data.append({'run_uid': run_uid, 'step_uid': step_uids[recipe_uid][k % 5],
+                                 'created': created + timedelta(seconds=k), 'value': 'value ' + str(k)})
+            connection.execute(Log.__table__.insert(), logs)
+            connection.execute(Data.__table__.insert(), data)
+    return recipe_uids, instance_uids
+
+
+def get_queries(engine, recipe_uids, instance_uids, repeat):
+    """
+    The queries run most often by instances and the web frontend, each with randomly chosen parameters
+    :param engine:
+    :param recipe_uids:
+    :param instance_uids:
+    :param repeat:
+    :return:
+    """
+    runs = engine.execute(select([Run.uid, Run.recipe_uid])).fetchall()
+    step_uids = {}
+    for uid, recipe_uid in engine.execute(select([RecipeStep.uid, RecipeStep.recipe_uid])):
+        step_uids.setdefault(recipe_uid, []).append(uid)
+    queries = {'latest successful run of recipe': [], 'log of run': [], 'data of run': [], 'data of run and step': [],
+               'steps of recipe': []}
+    for i in range(repeat):
+        recipe_uid = random.choice(recipe_uids)
+        run_uid, run_recipe_uid = random.choice(runs)
+        step_uid = random.choice(step_uids[run_recipe_uid])
+        queries['latest successful run of recipe'].append(
+            select([Run.uid, Run.created])
+            .where(and_(Run.recipe_uid == recipe_uid, Run.instance_uid == random.choice(instance_uids),
+                        Run.status == RunStatusEnum.success))
+            .order_by(Run.created.desc()).limit(1)
+        )
+        queries['log of run'].append(select([Log.__table__]).where(Log.run_uid == run_uid)
+                                     .order_by(Log.created, Log.uid))
+        queries['data of run'].append(select([Data.__table__]).where(Data.run_uid == run_uid)
+                                      .order_by(Data.created, Data.uid))
+        queries['data of run and step'].append(select([Data.__table__])
+                                               .where(and_(Data.run_uid == run_uid, Data.step_uid == step_uid)))
+        queries['steps of recipe'].append(select([RecipeStep.__table__]).where(RecipeStep.recipe_uid == recipe_uid)
+                                          .order_by(RecipeStep.sort))
+    return queries
+
+
+def time_queries(engine, queries):
+    medians = {}
+    with engine.connect() as connection:
+        for name, statements in queries.items():
+            times = []
+            for statement in statements:
+                start = time.perf_counter()
+                connection.execute(statement).fetchall()
+                times.append(time.perf_counter() - start)
+            medians[name] = sorted(times)[len(times) // 2]
+    return medians
+
+
+if __name__ == '__main__':
+    main()
@@ -1,87 +1,380 @@
 import sys
 import time
+import argparse
 import traceback
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
 from random import shuffle
 from setup import get_config, get_engine, get_db
 from scrapebot.database import *
+from scrapebot.emulate import browser_pool, shared_display, get_display_size
+from scrapebot.cluster import WorkQueue
+from scrapebot.lease import Lease
+from scrapebot.plan import ExecutionPlan
+from scrapebot.scheduler import Scheduler
+from scrapebot.blobstore import get_blob_store
+from scrapebot.buffer import RunBuffer, get_buffer_engine
 
 
-print('[' + str(datetime.now()) + '] ScrapeBot initiated (this is server time)')
-config = get_config(False)
-db = get_db(get_engine(config))
+def main():
+    parser = argparse.ArgumentParser(description='Run all due recipes of this ScrapeBot instance.')
+    parser.add_argument('--daemon', action='store_true',
+                        help='keep running and start each recipe as soon as it is due (instead of being run by cron)')
+    args = parser.parse_args()
 
-this_instance_name = config.get('Instance', 'name')
-this_instance = None
-try:
-    if this_instance_name == '' or db.query(Instance).filter(Instance.name == this_instance_name).count() == 0:
-        print('Error: Instance not found')
-        db.close()
-        exit(1)
+    print('[' + str(datetime.now()) + '] ScrapeBot initiated (this is server time)')
+    config = get_config(False)
+    run_buffer = get_run_buffer(config)
+    if run_buffer is not None:
+        sync_run_buffer(run_buffer)
+        db = get_db(run_buffer.get_engine())
+    else:
+        db = get_db(get_engine(config))
+    this_instance = get_instance(db, config)
+    fail_abandoned_runs(config, db, this_instance)
+    start_shared_display(config)
+    if args.daemon and is_cluster_worker(config):
+        run_cluster_worker(config, db, this_instance)
+    elif args.daemon:
+        run_daemon(config, db, this_instance, run_buffer)
     else:
-        print('Authenticated as instance "' + this_instance_name + '"')
-        this_instance = db.query(Instance).filter(Instance.name == this_instance_name).one()
-except:
-    print('Error: Initial database query failed')
-    error = sys.exc_info()[0]
-    if error is not None:
-        print('- ' + str(error))
-        print('- ' + traceback.format_exc())
+        run_once(config, db, this_instance)
+    browser_pool.close_all()
+    shared_display.stop()
     db.close()
-    exit(1)
-
-recipes = this_instance.get_active_recipes()
-if len(recipes) > 0:
-    shuffle(recipes)
-    print(str(len(recipes)) + ' active recipe(s) found to be handled by this instance')
-    for recipe in recipes:
-        steps = recipe.get_active_steps()
-        if len(steps) > 0:
-            latest_run = recipe.get_latest_run(this_instance, only_include_successful_runs=True)
-            # to compare with an adequate timezone, we use the same database function as CREATE does
-            now = db.query(func.now()).first()[0]
-            if latest_run is not None and \
-               (int(time.mktime(now.timetuple()) - time.mktime(latest_run.created.timetuple()))/60) < recipe.interval:
+    if run_buffer is not None:
+        sync_run_buffer(run_buffer)
+
+
+def fail_abandoned_runs(config, db, this_instance):
+    """
+    Mark runs of this instance which are still in progress, although started more than AbandonAfter seconds ago and no
+    longer leased, as failed, since their runner has been killed before it could finish them
+    :param config:
+    :param db:
+    :param this_instance:
+    :return:
+    """
+    try:
+        before = db.query(func.now()).scalar() - \
+            timedelta(seconds=int(config.get('Instance', 'AbandonAfter', fallback=86400)))
+        count = Run.fail_abandoned(db, before, this_instance)
+        db.commit()
+        if count > 0:
+            print('- ' + str(count) + ' abandoned run(s) marked as failed')
+    except Exception:
+        db.rollback()
+        print('- Warning: abandoned runs could not be marked as failed: ' +
+              traceback.format_exc().strip().splitlines()[-1])
+
+
+def start_shared_display(config):
+    """
+    Start the virtual display for all browsers before any worker does, as starting a display changes the environment
+    of the whole process
+    :param config:
+    :return:
+    """
+    try:
+        shared_display.start(*get_display_size(config))
+    except Exception:
+        # runs with the HTTP engine do not need a display, while browser runs log the error themselves
+        print('- Warning: virtual display could not be started: ' + traceback.format_exc().strip().splitlines()[-1])
+
+
+def get_run_buffer(config):
+    """
+    The local buffer runs are recorded in (if Instance/Buffer is set to the path of an SQLite file), except for
+    cluster workers, which need to claim recipes from the central database
+    :param config:
+    :return:
+    """
+    path = config.get('Instance', 'Buffer', fallback=None)
+    if path is None or path.strip() == '' or is_cluster_worker(config):
+        return None
+    return RunBuffer(get_buffer_engine(path.strip()), get_engine(config), config.get('Instance', 'name'),
+                     batch_size=int(config.get('Instance', 'SyncBatchSize', fallback=100)),
+                     retries=int(config.get('Instance', 'SyncRetries', fallback=3)))
+
+
+def sync_run_buffer(run_buffer, retry=True):
+    try:
+        count = run_buffer.sync(None if retry else 0)
+        print('[' + str(datetime.now()) + '] ' + str(count) + ' run(s) uploaded from buffer to the central database')
+    except Exception:
+        print('[' + str(datetime.now()) + '] Central database not reachable, ' + str(run_buffer.count_pending()) +
+              ' run(s) kept in buffer: ' + traceback.format_exc().strip().splitlines()[-1])
+
+
+def get_instance(db, config):
+    this_instance_name = config.get('Instance', 'name')
+    try:
+        if this_instance_name == '' or db.query(Instance).filter(Instance.name == this_instance_name).count() == 0:
+            print('Error: Instance not found')
+            db.close()
+            exit(1)
+        else:
+            print('Authenticated as instance "' + this_instance_name + '"')
+            return db.query(Instance).filter(Instance.name == this_instance_name).one()
+    except SystemExit:
+        raise
+    except:
+        print('Error: Initial database query failed')
+        error = sys.exc_info()[0]
+        if error is not None:
+            print('- ' + str(error))
+            print('- ' + traceback.format_exc())
+        db.close()
+        exit(1)
+
 
+def get_worker_count(config):
+    try:
+        return max(int(config.get('Instance', 'Workers', fallback=1)), 1)
+    except ValueError:
+        return 1
+
+
+def get_log_level(config):
+    try:
+        return LogTypeEnum[config.get('Instance', 'LogLevel', fallback='info').strip().lower()]
+    except KeyError:
+        return LogTypeEnum.info
+
+
+def is_cluster_worker(config):
+    return config.get('Instance', 'Cluster', fallback='0').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def run_once(config, db, this_instance):
+    schedule = this_instance.get_recipe_schedule()
+    if len(schedule) > 0:
+        shuffle(schedule)
+        print(str(len(schedule)) + ' active recipe(s) found to be handled by this instance')
+        due_recipe_uids = []
+        for recipe, active_steps, latest_run_created, now in schedule:
+            if active_steps == 0:
+                print('# skipping ' + recipe.name + ' since no active steps were found')
+            elif not recipe.is_due(latest_run_created, now):
                 print('# skipping ' + recipe.name + ' since latest successful run was less than ' +
                       str(recipe.interval) + ' minute(s) ago')
             else:
-                if latest_run is None:
-                    print('# ' + recipe.name + ' (' + str(len(steps)) +
+                if latest_run_created is None:
+                    print('# ' + recipe.name + ' (' + str(active_steps) +
                           ' active step(s) found, never successfully run on this instance)')
                 else:
-                    print('# ' + recipe.name + ' (' + str(len(steps)) +
-                          ' active step(s) found, last run on this instance at ' + str(latest_run.created) + ')')
-                status = RunStatusEnum.in_progress
-                run = Run(instance=this_instance, recipe=recipe, status=status)
-                db.add(run)
-                prior_step = None
-                for step in steps:
-                    try:
-                        status = step.run(config, run, prior_step)
-                    except:
-                        error = sys.exc_info()[0]
-                        if error is not None:
-                            error = str(error).strip('<>')
-                            print('- Fatal ERROR: ' + error)
-                            run.log.append(Log(message=error, type=LogTypeEnum.error))
-                        status = RunStatusEnum.error
-                    if status is not RunStatusEnum.success:
-                        run.status = status
-                        break
-                    if step.temp_result is None and prior_step is not None and prior_step.temp_result is not None:
-                        step.temp_result = prior_step.temp_result
-                    prior_step = step
-                run.end_session()
-                if run.status == RunStatusEnum.in_progress:
-                    run.status = RunStatusEnum.success
-                time_after_run = db.query(func.now()).first()[0]
-                run.runtime = int(time.mktime(time_after_run.timetuple()) - time.mktime(now.timetuple()))
-                db.commit()
-        else:
-            print('# skipping ' + recipe.name + ' since no active steps were found')
-    print('All done')
-else:
-    print('No (active) recipes found (actively) ascribed to this instance')
+                    print('# ' + recipe.name + ' (' + str(active_steps) +
+                          ' active step(s) found, last run on this instance at ' + str(latest_run_created) + ')')
+                due_recipe_uids.append(recipe.uid)
+        with ThreadPoolExecutor(max_workers=get_worker_count(config)) as pool:
+            for recipe_uid in due_recipe_uids:
+                pool.submit(run_recipe_in_worker, config, db, this_instance.uid, recipe_uid)
+        print('All done')
+    else:
+        print('No (active) recipes found (actively) ascribed to this instance')
+
+
+def run_daemon(config, db, this_instance, run_buffer=None):
+    sync_interval = int(config.get('Instance', 'SyncInterval', fallback=300))
+    last_sync = time.time()
+    scheduler = Scheduler(db, this_instance,
+                          reload_interval=int(config.get('Instance', 'ReloadInterval', fallback=60)),
+                          retry_interval=int(config.get('Instance', 'RetryInterval', fallback=120)))
+    workers = get_worker_count(config)
+    pool = ThreadPoolExecutor(max_workers=workers)
+    running = {}
+    print('Running as daemon with ' + str(workers) + ' worker(s) (stop with Ctrl+C)')
+    try:
+        while True:
+            if run_buffer is not None and time.time() - last_sync > sync_interval:
+                # without waiting for retries, as the next sync follows soon enough
+                sync_run_buffer(run_buffer, retry=False)
+                last_sync = time.time()
+            if scheduler.refresh():
+                print('[' + str(datetime.now()) + '] ' + str(len(scheduler)) +
+                      ' active recipe(s) scheduled for this instance')
+            while len(running) < workers:
+                recipe = scheduler.pop_due()
+                if recipe is None:
+                    break
+                print('[' + str(datetime.now()) + '] # ' + recipe.name + ' started')
+                running[pool.submit(run_recipe_in_worker, config, db, this_instance.uid, recipe.uid)] = recipe
+            if len(running) == 0:
+                time.sleep(scheduler.get_sleep_time())
+                continue
+            done, not_done = wait(list(running), timeout=scheduler.get_sleep_time(len(running) < workers),
+                                  return_when=FIRST_COMPLETED)
+            for future in done:
+                scheduler.reschedule(running.pop(future), future.result())
+    except KeyboardInterrupt:
+        print('Daemon stopping, waiting for ' + str(len(running)) + ' running recipe(s) to finish')
+        pool.shutdown(wait=True)
+        print('Daemon stopped')
+
+
+def run_cluster_worker(config, db, this_instance):
+    """
+    Share the instance's recipes with all other runners registered as workers of the same instance: instead of
+    keeping a schedule of its own, each worker claims due recipes from the database whenever it has a free slot.
+    :param config:
+    :param db:
+    :param this_instance:
+    :return:
+    """
+    poll_interval = int(config.get('Instance', 'ReloadInterval', fallback=60))
+    queue = WorkQueue(db, this_instance,
+                      name=config.get('Instance', 'WorkerName', fallback=None),
+                      lease_duration=int(config.get('Instance', 'LeaseDuration', fallback=300)),
+                      poll_interval=poll_interval)
+    workers = get_worker_count(config)
+    pool = ThreadPoolExecutor(max_workers=workers)
+    running = {}
+    queue.register()
+    print('Running as worker "' + queue.get_name() + '" of a cluster of ' + str(len(queue.get_active_workers())) +
+          ' with ' + str(workers) + ' worker thread(s) (stop with Ctrl+C)')
+    last_seen = time.time()
+    try:
+        while True:
+            if time.time() - last_seen > poll_interval:
+                queue.register()
+                last_seen = time.time()
+            while len(running) < workers:
+                lease = queue.claim(exclude=set(running.values()))
+                if lease is None:
+                    break
+                print('[' + str(datetime.now()) + '] # recipe ' + str(lease.get_recipe_uid()) + ' claimed')
+                running[pool.submit(run_recipe_in_worker, config, db, this_instance.uid, lease.get_recipe_uid(),
+                                    lease)] = lease.get_recipe_uid()
+            if len(running) == 0:
+                time.sleep(queue.get_sleep_time())
+                continue
+            done, not_done = wait(list(running), timeout=queue.get_sleep_time() if len(running) < workers else None,
+                                  return_when=FIRST_COMPLETED)
+            for future in done:
+                running.pop(future)
+    except KeyboardInterrupt:
+        print('Worker stopping, waiting for ' + str(len(running)) + ' running recipe(s) to finish')
+        pool.shutdown(wait=True)
+        print('Worker stopped')
+
+
+def run_recipe_in_worker(config, db, instance_uid, recipe_uid, lease=None):
+    """
+    Run a recipe inside a worker thread. As db is a scoped session, every worker thread uses its own session (and,
+    through its run, its own emulator) and thus needs to fetch instance and recipe on its own. To prevent overlapping
+    runner processes from running the same recipe, the run is guarded by a lease; after a failed run, the lease is
+    kept for RetryInterval seconds so that no other runner retries the recipe right away.
+    :param config:
+    :param db:
+    :param instance_uid:
+    :param recipe_uid:
+    :param lease: a lease on the recipe that has already been acquired (e.g., claimed from a WorkQueue), if any
+    :return: the (detached) run (or the latest successful one, if it was just run elsewhere) or None if the recipe
+    is in progress elsewhere or in case of an unexpected error
+    """
+    acquired = lease is not None
+    retry_after = int(config.get('Instance', 'RetryInterval', fallback=120))
+    if lease is None:
+        lease = Lease(db.get_bind(), recipe_uid, instance_uid,
+                      duration=int(config.get('Instance', 'LeaseDuration', fallback=300)),
+                      lock_dir=config.get('Instance', 'LockDirectory'))
+    try:
+        this_instance = db.query(Instance).filter(Instance.uid == instance_uid).one()
+        recipe = db.query(Recipe).filter(Recipe.uid == recipe_uid).one()
+        if not acquired and not lease.acquire():
+            print('# skipping ' + recipe.name + ' since it is already in progress elsewhere')
+            return None
+        lease.start_heartbeat()
+        # another runner may have finished this recipe between our due check and acquiring the lease
+        latest_run = recipe.get_latest_run(this_instance, only_include_successful_runs=True)
+        if latest_run is not None and not recipe.is_due(latest_run.created, db.query(func.now()).first()[0]):
+            print('# skipping ' + recipe.name + ' since it has just been run elsewhere')
+            retry_after = None
+            return latest_run
+        run = run_recipe(config, db, this_instance, recipe, recipe.get_active_steps(), lease)
+        if run.status == RunStatusEnum.success:
+            retry_after = None
+        # load status and creation time (as required for rescheduling) before the session is closed
+        print('# ' + recipe.name + ' finished with status "' + run.status.name + '" (created ' +
+              str(run.created) + ')')
+        return run
+    except Exception:
+        db.rollback()
+        print('- Fatal ERROR: ' + traceback.format_exc())
+        return None
+    finally:
+        try:
+            lease.release(retry_after)
+        except Exception:
+            print('- Warning: lease could not be released and will expire')
+        db.remove()
+
+
+def run_recipe(config, db, this_instance, recipe, steps, lease=None):
+    # to compare with an adequate timezone, we use the same database function as CREATE does
+    now = db.query(func.now()).first()[0]
+    status = RunStatusEnum.in_progress
+    run = Run(instance=this_instance, recipe=recipe, status=status)
+    run.flush_rows = int(config.get('Instance', 'FlushRows', fallback=500))
+    run.flush_size = int(config.get('Instance', 'FlushSize', fallback=1048576))
+    run.log_level = get_log_level(config)
+    run.compact_log = config.get('Instance', 'LogStorage', fallback='rows').strip().lower() == 'compact'
+    run.blob_store = get_blob_store(config)
+    db.add(run)
+    # the run is stored right away and log entries and data are stored after every step (or every flush_rows rows)
+    run.flush_results()
+    RunEvent.record(db, run, RunEventTypeEnum.started)
+    db.commit()
+    plan = ExecutionPlan(steps, run.get_emulator().handlers)
+    if not plan.is_valid():
+        # broken recipes are rejected before any browser is started
+        for error in plan.errors:
+            print('- Config ERROR: ' + error)
+            run.log.append(Log(message=error, type=LogTypeEnum.error))
+        run.status = RunStatusEnum.config_error
+    prior_step = None
+    try:
+        for step in plan.steps if plan.is_valid() else []:
+            try:
+                status = step.run(config, run, prior_step)
+            except:
+                error = sys.exc_info()[0]
+                if error is not None:
+                    error = str(error).strip('<>')
+                    print('- Fatal ERROR: ' + error)
+                    run.log.append(Log(message=error, type=LogTypeEnum.error))
+                status = RunStatusEnum.error
+            if status is RunStatusEnum.success and lease is not None and lease.is_lost():
+                # another runner may run the recipe by now, so the run stops after this step
+                print('- Fatal ERROR: lease lost, run stopped')
+                run.log.append(Log(message='Lease lost (run stopped)', type=LogTypeEnum.error))
+                status = RunStatusEnum.error
+            run.flush_results()
+            if status is not RunStatusEnum.success:
+                run.status = status
+                break
+            if step.temp_result is None and prior_step is not None and prior_step.temp_result is not None:
+                step.temp_result = prior_step.temp_result
+            prior_step = step
+        run.end_session()
+        run.flush_results()
+    except:
+        # results stored thus far remain, but the run must not stay in progress
+        db.rollback()
+        run.status = RunStatusEnum.error
+        RunStats.record(db, run)
+        RunEvent.record(db, run, RunEventTypeEnum.finished)
+        db.commit()
+        raise
+    if run.status == RunStatusEnum.in_progress:
+        run.status = RunStatusEnum.success
+    time_after_run = db.query(func.now()).first()[0]
+    run.runtime = int(time.mktime(time_after_run.timetuple()) - time.mktime(now.timetuple()))
+    RunStats.record(db, run)
+    RunEvent.record(db, run, RunEventTypeEnum.finished)
+    db.commit()
+    return run
+
 
-db.close()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+from sqlalchemy import event, select, literal, union_all, or_, and_, true
+from scrapebot.database import Instance, Recipe, Run, UserInstancePrivilege, UserRecipePrivilege
+
+# bumped whenever ownerships or privileges change, which invalidates all computed access sets of this process
+acl_generation = [0]
+
+
+def invalidate_access_control(*args):
+    acl_generation[0] = acl_generation[0] + 1
+
+
+for model in (Instance, Recipe, UserInstancePrivilege, UserRecipePrivilege):
+    for event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(model, event_name, invalidate_access_control)
+
+
+class AccessControl:
+    """
+    The recipes and instances a user may view and edit (as owner or through privileges), fetched all at once in one
+    single query and kept until ownerships or privileges change. Checks for single objects are answered from these
+    sets, while the according filters push the same checks into SQL queries.
+    """
+    def __init__(self, db, user):
+        self.__db = db
+        self.__user_uid = user.uid
+        self.__generation = None
+        self.__visible = None
+        self.__editable = None
+
+    def get_query(self):
+        """
+        One query for all recipes and instances owned by or shared with the user
+        :return: select of (kind, uid, whether editable) rows
+        """
+        user_uid = self.__user_uid
+        return union_all(
+            select([literal('recipe'), Recipe.uid, true()]).where(Recipe.owner_uid == user_uid),
+            select([literal('recipe'), UserRecipePrivilege.recipe_uid, UserRecipePrivilege.allowed_to_edit])
+            .where(UserRecipePrivilege.user_uid == user_uid),
+            select([literal('instance'), Instance.uid, true()]).where(Instance.owner_uid == user_uid),
+            select([literal('instance'), UserInstancePrivilege.instance_uid, UserInstancePrivilege.allowed_to_edit])
+            .where(UserInstancePrivilege.user_uid == user_uid)
+        )
+
+    def __load(self):
+        if self.__generation == acl_generation[0]:
+            return
+        generation = acl_generation[0]
+        visible = {'recipe': set(), 'instance': set()}
+        editable = {'recipe': set(), 'instance': set()}
+        for kind, uid, allowed_to_edit in self.__db.execute(self.get_query()):
+            visible[kind].add(uid)
+            if allowed_to_edit:
+                editable[kind].add(uid)
+        self.__visible = visible
+        self.__editable = editable
+        self.__generation = generation
+
+    @staticmethod
+    def __get_uid(obj):
+        return obj if obj is None or isinstance(obj, int) else obj.uid
+
+    def get_visible_recipe_uids(self):
+        self.__load()
+        return self.__visible['recipe']
+
+    def get_editable_recipe_uids(self):
+        self.__load()
+        return self.__editable['recipe']
+
+    def get_visible_instance_uids(self):
+        self.__load()
+        return self.__visible['instance']
+
+    def get_editable_instance_uids(self):
+        self.__load()
+        return self.__editable['instance']
+
+    def can_view_recipe(self, recipe):
+        return self.__get_uid(recipe) in self.get_visible_recipe_uids()
+
+    def can_edit_recipe(self, recipe):
+        return self.__get_uid(recipe) in self.get_editable_recipe_uids()
+
+    def can_view_instance(self, instance):
+        return self.__get_uid(instance) in self.get_visible_instance_uids()
+
+    def can_edit_instance(self, instance):
+        return self.__get_uid(instance) in self.get_editable_instance_uids()
+
+    def can_view_run(self, run):
+        return self.can_view_recipe(run.recipe_uid) and self.can_view_instance(run.instance_uid)
+
+    def get_recipe_filter(self, column=Recipe.uid, only_editable=False):
+        """
+        SQL condition on whether the recipe referenced by column (e.g., Run.recipe_uid) is visible to (or editable by)
+        the user, evaluated by the database rather than through the sets kept in memory
+        :param column:
+        :param only_editable:
+        :return:
+        """
+        # subqueries must not be correlated to the recipe table of the enclosing query, if any
+        owned = select([Recipe.uid]).where(Recipe.owner_uid == self.__user_uid).correlate(None)
+        privileges = select([UserRecipePrivilege.recipe_uid])\
+            .where(UserRecipePrivilege.user_uid == self.__user_uid)\
+            .correlate(None)
+        if only_editable:
+            privileges = privileges.where(UserRecipePrivilege.allowed_to_edit == True)
+        return or_(column.in_(owned), column.in_(privileges))
+
+    def get_instance_filter(self, column=Instance.uid, only_editable=False):
+        """
+        SQL condition on whether the instance referenced by column (e.g., Run.instance_uid) is visible to (or editable
+        by) the user, evaluated by the database rather than through the sets kept in memory
+        :param column:
+        :param only_editable:
+        :return:
+        """
+        owned = select([Instance.uid]).where(Instance.owner_uid == self.__user_uid).correlate(None)
+        privileges = select([UserInstancePrivilege.instance_uid])\
+            .where(UserInstancePrivilege.user_uid == self.__user_uid)\
+            .correlate(None)
+        if only_editable:
+            privileges = privileges.where(UserInstancePrivilege.allowed_to_edit == True)
+        return or_(column.in_(owned), column.in_(privileges))
+
+    def get_run_filter(self):
+        """
+        SQL condition on whether runs are visible to the user, i.e., both their recipe and their instance
+        :return:
+        """
+        return and_(self.get_recipe_filter(Run.recipe_uid), self.get_instance_filter(Run.instance_uid))
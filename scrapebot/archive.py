@@ -0,0 +1,174 @@
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload
+from scrapebot.database import Recipe, Run, RunStatusEnum, Log, LogTypeEnum, LogBlob, Data
+
+
+def parse_date(value):
+    """
+    Inverse of str() on dates, which leaves out the microseconds if there are none
+    :param value:
+    :return:
+    """
+    return datetime.strptime(value, '%Y-%m-%d %H:%M:%S.%f' if '.' in value else '%Y-%m-%d %H:%M:%S')
+
+
+class RunArchive:
+    """
+    Runs moved out of the database along with their log entries and data, stored as gzip-compressed newline-delimited
+    JSON (one run per line) in one file per recipe and month (i.e., <directory>/recipe_<uid>/<YYYY-MM>.ndjson.gz).
+    Every archival appends a new gzip member to these files, so existing archives are never rewritten. Runs are only
+    deleted from the database once they are safely written, and runs archived twice (e.g., if deleting them failed)
+    are read only once.
+    """
+    def __init__(self, directory='archive/'):
+        self.__directory = directory
+
+    def get_path(self, recipe_uid, month):
+        return os.path.join(self.__directory, 'recipe_' + str(recipe_uid), month + '.ndjson.gz')
+
+    def get_months(self, recipe_uid):
+        """
+        All months of which runs of the given recipe have been archived, oldest first
+        :param recipe_uid:
+        :return: list of months as 'YYYY-MM'
+        """
+        directory = os.path.join(self.__directory, 'recipe_' + str(recipe_uid))
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[:-len('.ndjson.gz')] for name in os.listdir(directory) if name.endswith('.ndjson.gz'))
+
+    @staticmethod
+    def dump_run(run):
+        """
+        One archived run with its log entries and data (including the sort and type of their steps, so that archives
+        remain readable after steps have been changed or deleted)
+        :param run:
+        :return:
+        """
+        return {
+            'uid': run.uid,
+            'created': str(run.created),
+            'runtime': run.runtime,
+            'instance_uid': run.instance_uid,
+            'recipe_uid': run.recipe_uid,
+            'status': run.status.name,
+            'log': [[log.uid, str(log.created), log.type.name, log.message] for log in run.get_log()],
+            'data': [[data.uid, str(data.created), data.value, data.step_uid,
+                      data.step.sort if data.step is not None else None,
+                      data.step.type.name if data.step is not None else None] for data in run.data]
+        }
+
+    @staticmethod
+    def load_run(line):
+        """
+        Inverse of dump_run, with dates and enums restored
+        :param line:
+        :return: dict of the run's columns with 'log' and 'data' as lists of dicts
+        """
+        run = json.loads(line)
+        run['created'] = parse_date(run['created'])
+        run['status'] = RunStatusEnum[run['status']]
+        run['log'] = [{
+            'uid': uid,
+            'created': parse_date(created),
+            'type': LogTypeEnum[log_type],
+            'message': message
+        } for uid, created, log_type, message in run['log']]
+        run['data'] = [{
+            'uid': uid,
+            'created': parse_date(created),
+            'value': value,
+            'step_uid': step_uid,
+            'step_sort': step_sort,
+            'step_type': step_type
+        } for uid, created, value, step_uid, step_sort, step_type in run['data']]
+        return run
+
+    def write(self, runs):
+        """
+        Append runs to the archive files of their recipes and months, synced to disk before returning
+        :param runs:
+        :return:
+        """
+        partitions = {}
+        for run in runs:
+            partitions.setdefault((run.recipe_uid, run.created.strftime('%Y-%m')), []).append(run)
+        for (recipe_uid, month), partition in partitions.items():
+            path = self.get_path(recipe_uid, month)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'ab') as file:
+                with gzip.GzipFile(fileobj=file, mode='wb') as compressed:
+                    for run in partition:
+                        compressed.write(json.dumps(self.dump_run(run)).encode('utf-8') + b'\n')
+                file.flush()
+                os.fsync(file.fileno())
+
+    def read(self, recipe_uid, instance_uid=None):
+        """
+        Iterate over all archived runs of a recipe (and, optionally, only those of one instance), oldest month first
+        :param recipe_uid:
+        :param instance_uid:
+        :return: generator of dicts as returned by load_run
+        """
+        seen = set()
+        for month in self.get_months(recipe_uid):
+            with gzip.open(self.get_path(recipe_uid, month), 'rb') as compressed:
+                for line in compressed:
+                    run = self.load_run(line)
+                    if run['uid'] in seen or (instance_uid is not None and run['instance_uid'] != instance_uid):
+                        continue
+                    seen.add(run['uid'])
+                    yield run
+
+    def archive_recipe(self, db, recipe_uid, cutoff, batch_size=100):
+        """
+        Move all finished runs of a recipe created before cutoff into the archive, batch by batch
+        :param db:
+        :param recipe_uid:
+        :param cutoff:
+        :param batch_size: number of runs (with all their log entries and data) loaded at once
+        :return: number of runs archived
+        """
+        count = 0
+        while True:
+            runs = db.query(Run)\
+                .options(selectinload(Run.log), selectinload(Run.log_blobs),
+                         selectinload(Run.data).joinedload(Data.step))\
+                .filter(Run.recipe_uid == recipe_uid, Run.created < cutoff, Run.status != RunStatusEnum.in_progress)\
+                .order_by(Run.created, Run.uid)\
+                .limit(batch_size)\
+                .all()
+            if len(runs) == 0:
+                return count
+            self.write(runs)
+            run_uids = [run.uid for run in runs]
+            db.execute(Data.__table__.delete().where(Data.run_uid.in_(run_uids)))
+            db.execute(Log.__table__.delete().where(Log.run_uid.in_(run_uids)))
+            db.execute(LogBlob.__table__.delete().where(LogBlob.run_uid.in_(run_uids)))
+            db.execute(Run.__table__.delete().where(Run.uid.in_(run_uids)))
+            db.commit()
+            count += len(run_uids)
+
+    def archive(self, db, default_retention=None, batch_size=100):
+        """
+        Archive the runs of all recipes older than their retention (in days) or, for recipes without retention, the
+        default retention; a retention of 0 (or no retention at all) keeps all runs in the database
+        :param db:
+        :param default_retention:
+        :param batch_size:
+        :return: dict of recipe uids and the number of runs archived
+        """
+        now = db.query(func.now()).first()[0]
+        retentions = {}
+        for uid, retention in db.query(Recipe.uid, Recipe.retention).order_by(Recipe.uid):
+            retention = default_retention if retention is None else retention
+            if retention is not None and retention > 0:
+                retentions[uid] = retention
+        archived = {}
+        for uid, retention in retentions.items():
+            archived[uid] = self.archive_recipe(db, uid, now - timedelta(days=retention), batch_size)
+        return archived
@@ -0,0 +1,130 @@
+import abc
+import hashlib
+import os
+import zlib
+
+# data values stored as blob are replaced by this prefix and the SHA-256 hash of their content
+reference_prefix = 'blob:sha256:'
+
+
+class BlobStore(abc.ABC):
+    """
+    Content-addressed storage for large data values (e.g., HTML sources): values of at least min_size characters are
+    stored zlib-compressed under the hash of their content, so identical values (e.g., unchanged pages) are stored only
+    once, while the database only keeps a reference to them
+    """
+    def __init__(self, min_size=65536):
+        self.min_size = min_size
+
+    @staticmethod
+    def is_reference(value):
+        return isinstance(value, str) and value.startswith(reference_prefix)
+
+    @abc.abstractmethod
+    def has_blob(self, key):
+        pass
+
+    @abc.abstractmethod
+    def put_blob(self, key, content):
+        pass
+
+    @abc.abstractmethod
+    def get_blob(self, key):
+        pass
+
+    def store(self, value):
+        """
+        Store a value as blob if it is large enough
+        :param value:
+        :return: the reference to store in the database instead of the value, or the value itself if it is small
+        """
+        if value is None or self.min_size is None or len(value) < self.min_size or self.is_reference(value):
+            return value
+        content = value.encode('utf-8')
+        key = hashlib.sha256(content).hexdigest()
+        if not self.has_blob(key):
+            self.put_blob(key, zlib.compress(content))
+        return reference_prefix + key
+
+    def load(self, value):
+        """
+        Inverse of store, i.e., the original value of a reference (or the value itself if it is no reference)
+        :param value:
+        :return:
+        """
+        if not self.is_reference(value):
+            return value
+        return zlib.decompress(self.get_blob(value[len(reference_prefix):])).decode('utf-8')
+
+
+class LocalBlobStore(BlobStore):
+    """
+    Blobs stored as files on the local file system (or on a network share), spread over sub directories by the first
+    characters of their hashes
+    """
+    def __init__(self, directory='blobs/', min_size=65536):
+        super().__init__(min_size)
+        self.__directory = directory
+
+    def get_path(self, key):
+        return os.path.join(self.__directory, key[:2], key[2:4], key + '.z')
+
+    def has_blob(self, key):
+        return os.path.isfile(self.get_path(key))
+
+    def put_blob(self, key, content):
+        path = self.get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # written under a temporary name first, so that no one ever reads a partial blob
+        temp_path = path + '.' + str(os.getpid()) + '.tmp'
+        with open(temp_path, 'wb') as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+
+    def get_blob(self, key):
+        with open(self.get_path(key), 'rb') as file:
+            return file.read()
+
+
+class S3BlobStore(BlobStore):
+    """
+    Blobs stored as objects in an Amazon S3 bucket
+    """
+    def __init__(self, bucket, access, secret, prefix='blobs/', min_size=65536):
+        super().__init__(min_size)
+        import boto3
+        self.__client = boto3.client('s3', aws_access_key_id=access, aws_secret_access_key=secret)
+        self.__bucket = bucket
+        self.__prefix = prefix
+
+    def has_blob(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            self.__client.head_object(Bucket=self.__bucket, Key=self.__prefix + key)
+            return True
+        except ClientError:
+            return False
+
+    def put_blob(self, key, content):
+        self.__client.put_object(Bucket=self.__bucket, Key=self.__prefix + key, Body=content)
+
+    def get_blob(self, key):
+        return self.__client.get_object(Bucket=self.__bucket, Key=self.__prefix + key)['Body'].read()
+
+
+def get_blob_store(config):
+    """
+    The blob store configured in the Database section, i.e., in BlobDirectory or, with BlobStorage set to "s3", in the
+    AWS bucket (also used for screenshots); values are only stored as blobs if BlobMinSize is set
+    :param config:
+    :return: None if large values are to be stored in the database
+    """
+    min_size = config.get('Database', 'BlobMinSize', fallback=None)
+    if min_size is None or int(min_size) <= 0:
+        return None
+    if config.get('Database', 'BlobStorage', fallback='local').strip().lower() == 's3':
+        return S3BlobStore(config.get('Database', 'AWSbucket'), config.get('Database', 'AWSaccess'),
+                           config.get('Database', 'AWSsecret'), min_size=int(min_size))
+    return LocalBlobStore(config.get('Database', 'BlobDirectory', fallback='blobs/'), int(min_size))
@@ -0,0 +1,250 @@
+import time
+import uuid
+from sqlalchemy import create_engine, event, select, func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from scrapebot.database import base, Instance, Recipe, RecipeOrder, RecipeStep, RecipeStepItem, Run, RunStatusEnum, \
+    RunStats, RunEvent, RunEventTypeEnum, Log, LogBlob, Data
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # readers (e.g., other runner processes) do not block writers and vice versa
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
+
+def get_buffer_engine(path):
+    """
+    Engine of the local SQLite buffer at path (created if necessary)
+    :param path:
+    :return:
+    """
+    engine = create_engine('sqlite:///' + path, encoding='utf-8', connect_args={'timeout': 30})
+    event.listen(engine, 'connect', set_sqlite_pragmas)
+    base.metadata.create_all(engine)
+    return engine
+
+
+class RunBuffer:
+    """
+    Local SQLite database (in WAL mode) that this instance runs its recipes from and records its runs (including log
+    entries and data) in, so that neither running recipes nor storing their results depend on the connection to the
+    central database. Syncing uploads all finished runs to the central database in batches of bulk inserts, retrying
+    with exponential backoff if the central database is unreachable, and refreshes the local copy of this instance's
+    recipes and run statistics. Runs are deleted from the buffer once they have been uploaded.
+    """
+    # copied from the central database (in this order, as they reference each other)
+    mirrored_tables = (Instance.__table__, Recipe.__table__, RecipeOrder.__table__, RecipeStep.__table__,
+                       RecipeStepItem.__table__)
+
+    def __init__(self, engine, central_engine, instance_name, batch_size=100, retries=3, backoff=5):
+        """
+        :param engine: engine of the local buffer (see get_buffer_engine)
+        :param central_engine:
+        :param instance_name:
+        :param batch_size: number of runs uploaded (with their log entries and data) per transaction
+        :param retries: number of retries if the central database is unreachable
+        :param backoff: seconds to wait before the first retry (doubled for every further retry)
+        """
+        self.__engine = engine
+        self.__central_engine = central_engine
+        self.__instance_name = instance_name
+        self.__batch_size = batch_size
+        self.__retries = retries
+        self.__backoff = backoff
+
+    def get_engine(self):
+        return self.__engine
+
+    def get_clock_offset(self):
+        """
+        Difference between the clocks of the central database and the buffer (e.g., as SQLite's clock is UTC), which
+        all dates are shifted by when syncing
+        :return:
+        """
+        with self.__central_engine.connect() as connection:
+            central_now = connection.execute(select([func.now()])).scalar()
+        with self.__engine.connect() as connection:
+            now = connection.execute(select([func.now()])).scalar()
+        return central_now - now
+
+    def count_pending(self):
+        with self.__engine.connect() as connection:
+            return connection.execute(
+                select([func.count(Run.uid)]).where(Run.status != RunStatusEnum.in_progress)
+            ).scalar()
+
+    def push(self, clock_offset):
+        """
+        Upload all finished runs with their log entries and data, one batch of runs per transaction; every run is given
+        its origin before, so that runs uploaded already (e.g., if the buffer could not delete them afterwards) are
+        recognized and not uploaded again
+        :param clock_offset:
+        :return: number of runs uploaded
+        """
+        count = 0
+        while True:
+            with self.__engine.begin() as connection:
+                query = select([Run.__table__])\
+                    .where(Run.status != RunStatusEnum.in_progress)\
+                    .order_by(Run.uid)\
+                    .limit(self.__batch_size)
+                runs = connection.execute(query).fetchall()
+                if len(runs) == 0:
+                    return count
+                if any(run.origin is None for run in runs):
+                    for run in runs:
+                        if run.origin is None:
+                            connection.execute(Run.__table__.update()
+                                               .where(Run.uid == run.uid)
+                                               .values(origin=uuid.uuid4().hex))
+                    runs = connection.execute(query).fetchall()
+                buffer_uids = [run.uid for run in runs]
+                rows = {}
+                for table in (Log.__table__, LogBlob.__table__, Data.__table__):
+                    rows[table] = connection.execute(
+                        select([table]).where(table.c.run_uid.in_(buffer_uids)).order_by(table.c.uid)
+                    ).fetchall()
+            count += self.__upload(runs, rows, clock_offset)
+            with self.__engine.begin() as connection:
+                for table in (Data.__table__, LogBlob.__table__, Log.__table__, RunEvent.__table__):
+                    connection.execute(table.delete().where(table.c.run_uid.in_(buffer_uids)))
+                connection.execute(Run.__table__.delete().where(Run.uid.in_(buffer_uids)))
+
+    def __upload(self, runs, rows, clock_offset):
+        central_db = sessionmaker(bind=self.__central_engine)()
+        try:
+            uploaded = set(origin for origin, in central_db.execute(
+                select([Run.origin]).where(Run.origin.in_([run.origin for run in runs]))
+            ))
+            run_uids = {}
+            for run in runs:
+                if run.origin in uploaded:
+                    continue
+                values = self.__shift(dict(run), clock_offset, 'created')
+                del values['uid']
+                # runs are inserted one by one, since their uids change and log entries and data need to refer to them
+                run_uids[run.uid] = central_db.execute(Run.__table__.insert(), values).inserted_primary_key[0]
+                uploaded_run = Run(uid=run_uids[run.uid], **values)
+                RunStats.record(central_db, uploaded_run)
+                RunEvent.record(central_db, uploaded_run, RunEventTypeEnum.finished)
+            for table, date_column in ((Log.__table__, 'created'), (LogBlob.__table__, 'created'),
+                                       (Data.__table__, 'created')):
+                values = []
+                for row in rows[table]:
+                    if row.run_uid not in run_uids:
+                        continue
+                    row = self.__shift(dict(row), clock_offset, date_column)
+                    del row['uid']
+                    row['run_uid'] = run_uids[row['run_uid']]
+                    values.append(row)
+                if len(values) > 0:
+                    central_db.execute(table.insert(), values)
+            central_db.commit()
+            return len(run_uids)
+        except:
+            central_db.rollback()
+            raise
+        finally:
+            central_db.close()
+
+    @staticmethod
+    def __shift(values, clock_offset, *date_columns):
+        for column in date_columns:
+            if values[column] is not None:
+                values[column] = values[column] + clock_offset
+        return values
+
+    def push_cookies(self):
+        """
+        Upload the cookies kept from the last runs of recipes (see RecipeOrder.cookies_from_last_run), which runners
+        store in the local copy of this instance's recipe orders, so that they are not lost when the copy is refreshed
+        :return: number of recipe orders updated
+        """
+        with self.__engine.connect() as connection:
+            cookies = dict(connection.execute(select([RecipeOrder.uid, RecipeOrder.cookies_from_last_run])).fetchall())
+        if len(cookies) == 0:
+            return 0
+        count = 0
+        with self.__central_engine.begin() as connection:
+            for uid, central_cookies in connection.execute(
+                select([RecipeOrder.uid, RecipeOrder.cookies_from_last_run]).where(RecipeOrder.uid.in_(cookies.keys()))
+            ).fetchall():
+                if cookies[uid] != central_cookies:
+                    connection.execute(RecipeOrder.__table__.update()
+                                       .where(RecipeOrder.uid == uid)
+                                       .values(cookies_from_last_run=cookies[uid]))
+                    count += 1
+        return count
+
+    def pull(self, clock_offset):
+        """
+        Replace the local copy of this instance, its recipes (with their steps and items), and its run statistics with
+        those in the central database
+        :param clock_offset:
+        :return: False if the instance is unknown to the central database
+        """
+        rows = {}
+        with self.__central_engine.connect() as connection:
+            instance = connection.execute(
+                select([Instance.__table__]).where(Instance.name == self.__instance_name)
+            ).first()
+            if instance is None:
+                return False
+            rows[Instance.__table__] = [instance]
+            rows[RecipeOrder.__table__] = connection.execute(
+                select([RecipeOrder.__table__]).where(RecipeOrder.instance_uid == instance.uid)
+            ).fetchall()
+            recipe_uids = [order.recipe_uid for order in rows[RecipeOrder.__table__]]
+            rows[Recipe.__table__] = connection.execute(
+                select([Recipe.__table__]).where(Recipe.uid.in_(recipe_uids))
+            ).fetchall()
+            rows[RecipeStep.__table__] = connection.execute(
+                select([RecipeStep.__table__]).where(RecipeStep.recipe_uid.in_(recipe_uids))
+            ).fetchall()
+            rows[RecipeStepItem.__table__] = connection.execute(
+                select([RecipeStepItem.__table__])
+                .where(RecipeStepItem.step_uid.in_([step.uid for step in rows[RecipeStep.__table__]]))
+            ).fetchall()
+            stats = connection.execute(
+                select([RunStats.__table__]).where(RunStats.instance_uid == instance.uid)
+            ).fetchall()
+        with self.__engine.begin() as connection:
+            for table in reversed(self.mirrored_tables):
+                connection.execute(table.delete())
+            for table in self.mirrored_tables:
+                if len(rows[table]) > 0:
+                    connection.execute(table.insert(), [dict(row) for row in rows[table]])
+            connection.execute(RunStats.__table__.delete())
+            if len(stats) > 0:
+                connection.execute(RunStats.__table__.insert(), [
+                    self.__shift(dict(row), -clock_offset, 'created', 'updated', 'last_run_created',
+                                 'last_success_created') for row in stats
+                ])
+        return True
+
+    def sync(self, retries=None):
+        """
+        Upload finished runs (and the cookies kept from them) and refresh recipes, retrying with exponential backoff if
+        the central database is unreachable (or the connection breaks off); as runs are only deleted from the buffer
+        once their upload has been committed, a retry continues with the runs not uploaded yet
+        :param retries: number of retries (default is the number given on initialization)
+        :return: number of runs uploaded
+        """
+        retries = self.__retries if retries is None else retries
+        attempt = 0
+        count = 0
+        while True:
+            try:
+                clock_offset = self.get_clock_offset()
+                count += self.push(clock_offset)
+                self.push_cookies()
+                self.pull(clock_offset)
+                return count
+            except OperationalError:
+                if attempt >= retries:
+                    raise
+                time.sleep(self.__backoff * 2 ** attempt)
+                attempt += 1
@@ -0,0 +1,187 @@
+import socket
+from datetime import datetime, timedelta
+from sqlalchemy import select, or_, func
+from sqlalchemy.exc import IntegrityError
+from scrapebot.database import InstanceWorker, RunLease
+from scrapebot.lease import Lease
+
+
+class WorkQueue:
+    """
+    Database-backed queue of due recipes which several runners (possibly on different hosts) share as workers of the
+    same instance. Each claim takes over the recipe's lease, so no recipe is ever run by two workers at once. Where the
+    database supports it, jobs are claimed via SELECT ... FOR UPDATE SKIP LOCKED; otherwise (e.g., on SQLite), workers
+    compete for the leases of due recipes one by one.
+    """
+    def __init__(self, db, instance, name=None, lease_duration=300, poll_interval=60):
+        self.__db = db
+        self.__instance = instance
+        self.__name = socket.gethostname() if name is None else name
+        self.__lease_duration = lease_duration
+        self.__poll_interval = poll_interval
+        self.__next_due = None
+        self.__offset = timedelta(0)
+
+    def get_name(self):
+        return self.__name
+
+    def register(self):
+        """
+        Register this runner as worker of the instance or, if already registered, update its last_seen time.
+        :return:
+        """
+        worker = self.__db.query(InstanceWorker)\
+            .filter(InstanceWorker.instance_uid == self.__instance.uid, InstanceWorker.name == self.__name)\
+            .one_or_none()
+        if worker is None:
+            worker = InstanceWorker(instance=self.__instance, name=self.__name)
+            self.__db.add(worker)
+        worker.last_seen = func.now()
+        try:
+            self.__db.commit()
+        except IntegrityError:
+            # registered by another process on the same host in the meantime
+            self.__db.rollback()
+        return worker
+
+    def get_active_workers(self, max_age=None):
+        """
+        All workers of the instance that have been seen within max_age seconds (by default: three poll intervals).
+        :param max_age:
+        :return:
+        """
+        max_age = self.__poll_interval * 3 if max_age is None else max_age
+        now = self.__db.query(func.now()).first()[0]
+        return self.__db.query(InstanceWorker)\
+            .filter(InstanceWorker.instance_uid == self.__instance.uid,
+                    InstanceWorker.last_seen >= now - timedelta(seconds=max_age))\
+            .order_by(InstanceWorker.name)\
+            .all()
+
+    def get_due_recipe_uids(self, exclude=()):
+        """
+        Uids of all recipes of the instance that are due now, ordered by due time; also memorizes when the next recipe
+        that is not yet due will become due.
+        :param exclude: uids of recipes to ignore (e.g., those run by this worker at the moment)
+        :return:
+        """
+        self.__db.expire_all()
+        due = []
+        self.__next_due = None
+        db_now = None
+        for recipe, active_steps, latest_run_created, now in self.__instance.get_recipe_schedule():
+            db_now = now
+            if recipe.uid in exclude or active_steps == 0:
+                continue
+            next_due = recipe.get_next_due(latest_run_created, now)
+            if next_due <= now:
+                due.append((next_due, recipe.uid))
+            elif self.__next_due is None or next_due < self.__next_due:
+                self.__next_due = next_due
+        if db_now is not None:
+            self.__offset = db_now - datetime.now()
+        # the database session is kept idle while claiming, which happens on separate connections
+        self.__db.commit()
+        return [recipe_uid for next_due, recipe_uid in sorted(due)]
+
+    def claim(self, exclude=()):
+        """
+        Claim the due recipe that has been waiting the longest and is not claimed by another worker yet.
+        :param exclude: uids of recipes to ignore (e.g., those run by this worker at the moment)
+        :return: the acquired lease of the claimed recipe or None if there is nothing to do right now
+        """
+        recipe_uids = self.get_due_recipe_uids(exclude)
+        if len(recipe_uids) == 0:
+            return None
+        engine = self.__db.get_bind()
+        if self.supports_skip_locked(engine.dialect):
+            return self.__claim_skip_locked(engine, recipe_uids)
+        for recipe_uid in recipe_uids:
+            lease = Lease(engine, recipe_uid, self.__instance.uid, duration=self.__lease_duration)
+            if lease.acquire():
+                return lease
+        return None
+
+    def get_sleep_time(self):
+        """
+        Seconds until the next recipe becomes due, but at most one poll interval as other workers may finish early or
+        recipe definitions may change.
+        :return:
+        """
+        sleep = self.__poll_interval
+        if self.__next_due is not None:
+            sleep = min(sleep, (self.__next_due - (datetime.now() + self.__offset)).total_seconds())
+        return max(sleep, 0)
+
+    @staticmethod
+    def supports_skip_locked(dialect):
+        """
+        Whether the database behind the dialect supports SELECT ... FOR UPDATE SKIP LOCKED.
+        :param dialect:
+        :return:
+        """
+        if dialect.name == 'postgresql':
+            return True
+        if dialect.name == 'mysql':
+            version = dialect.server_version_info or ()
+            if getattr(dialect, '_is_mariadb', False):
+                return tuple(version[:2]) >= (10, 6)
+            return tuple(version[:3]) >= (8, 0, 1)
+        return False
+
+    def get_claim_query(self, recipe_uids, now):
+        """
+        Select one unclaimed lease row among the given recipes and lock it, skipping rows locked by other workers.
+        :param recipe_uids:
+        :param now:
+        :return:
+        """
+        query = select([RunLease.uid, RunLease.recipe_uid])\
+            .where(RunLease.instance_uid == self.__instance.uid)\
+            .where(RunLease.recipe_uid.in_(recipe_uids))\
+            .where(or_(RunLease.holder == None, RunLease.expires < now))\
+            .order_by(RunLease.expires, RunLease.uid)\
+            .limit(1)
+        # SQLAlchemy's MySQL dialect does not render skip_locked (yet), so we add it as suffix there
+        return query.with_for_update(skip_locked=True).suffix_with('SKIP LOCKED', dialect='mysql')
+
+    def __claim_skip_locked(self, engine, recipe_uids):
+        with engine.connect() as connection:
+            self.__insert_missing_leases(connection, recipe_uids)
+            holder = Lease.create_holder()
+            with connection.begin():
+                now = connection.execute(select([func.now()])).scalar()
+                row = connection.execute(self.get_claim_query(recipe_uids, now)).first()
+                if row is None:
+                    return None
+                connection.execute(
+                    RunLease.__table__.update()
+                    .where(RunLease.uid == row[0])
+                    .values(holder=holder, expires=now + timedelta(seconds=self.__lease_duration))
+                )
+        lease = Lease(engine, row[1], self.__instance.uid, duration=self.__lease_duration, holder=holder)
+        lease.adopt()
+        return lease
+
+    def __insert_missing_leases(self, connection, recipe_uids):
+        """
+        Rows can only be locked if they exist, so add an unclaimed lease row for recipes that have never been claimed.
+        :param connection:
+        :param recipe_uids:
+        :return:
+        """
+        existing = set(row[0] for row in connection.execute(
+            select([RunLease.recipe_uid])
+            .where(RunLease.instance_uid == self.__instance.uid)
+            .where(RunLease.recipe_uid.in_(recipe_uids))
+        ))
+        for recipe_uid in recipe_uids:
+            if recipe_uid not in existing:
+                try:
+                    connection.execute(RunLease.__table__.insert().values(
+                        recipe_uid=recipe_uid,
+                        instance_uid=self.__instance.uid
+                    ))
+                except IntegrityError:
+                    # inserted by another worker in the meantime
+                    pass
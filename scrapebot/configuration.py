@@ -7,17 +7,51 @@ class Configuration:
         self.config.read(ini_file)
         self.__dict = {}
 
-    def get_db_engine_string(self):
+    def get_db_engine_string(self, replica=False):
         """
         Generates the mysql connection string, ready for SQLAlchemy
-        :return:
+        :param replica: whether to connect to the read-only replica at ReplicaHost (as ReplicaUser with ReplicaPassword,
+        if these differ from User and Password) instead of the primary database
+        :return: None if the replica is requested but not configured
         """
+        user = self.get('Database', 'user', fallback='root')
+        password = self.get('Database', 'password', fallback='password')
+        host = self.get('Database', 'host', fallback='localhost')
+        if replica:
+            if not self.has_replica():
+                return None
+            user = self.get('Database', 'ReplicaUser', fallback=user)
+            password = self.get('Database', 'ReplicaPassword', fallback=password)
+            host = self.get('Database', 'ReplicaHost')
         return self.config.get('Database', 'dialect', fallback='mysql+pymysql') + \
-            '://' + self.get('Database', 'user', fallback='root') + \
-            ':' + self.get('Database', 'password', fallback='password') + \
-            '@' + self.get('Database', 'host', fallback='localhost') + \
+            '://' + user + \
+            ':' + password + \
+            '@' + host + \
             '/' + self.get('Database', 'database', fallback='scrapebot')
 
+    def has_replica(self):
+        return self.get('Database', 'ReplicaHost', fallback='').strip() != ''
+
+    def get_db_engine_options(self):
+        """
+        Connection pool settings for SQLAlchemy from the Database section; settings not configured are left to
+        SQLAlchemy's defaults
+        :return: keyword arguments for create_engine
+        """
+        options = {}
+        for key, option in (('PoolSize', 'pool_size'), ('PoolOverflow', 'max_overflow'),
+                            ('PoolTimeout', 'pool_timeout'), ('Timeout', 'pool_recycle')):
+            try:
+                value = int(self.get('Database', key, fallback=-1))
+            except ValueError:
+                continue
+            if value > 0 or (option == 'max_overflow' and value == 0):
+                options[option] = value
+        pre_ping = self.get('Database', 'PoolPrePing')
+        if pre_ping is not None:
+            options['pool_pre_ping'] = pre_ping.strip().lower() in ('1', 'true', 'yes', 'on')
+        return options
+
     def add_section(self, section):
         if section not in self.config:
             self.config[section] = {}
@@ -25,6 +59,8 @@ class Configuration:
     def add_value(self, section, name, value):
         self.add_section(section)
         self.config[section][name] = str(value)
+        if section in self.__dict:
+            self.__dict[section].pop(name.lower(), None)
 
     def write(self):
         try:
@@ -1,10 +1,16 @@
 import string
 import enum
 import random
-from sqlalchemy import Column, DateTime, String, Integer, Enum, Text, Boolean, ForeignKey, func
-from sqlalchemy.orm import relationship
+import json
+import zlib
+from datetime import datetime, timedelta
+from sqlalchemy import Column, DateTime, String, Integer, Float, Enum, Text, Boolean, LargeBinary, ForeignKey, \
+    UniqueConstraint, Index, func, select, and_, or_, inspect
+from sqlalchemy.orm import relationship, object_session, aliased
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.ext.declarative import declarative_base
-from scrapebot.emulate import RecipeStepTypeEnum, Emulator
+from scrapebot.emulate import RecipeStepTypeEnum, RecipeEngineEnum, Emulator
+from scrapebot.http_emulate import HttpEmulator, http_step_handlers
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 
@@ -108,6 +114,7 @@ class Instance(base):
     __tablename__ = 'instance'
     uid = Column(Integer, primary_key=True)
     created = Column(DateTime, default=func.now())
+    updated = Column(DateTime, default=func.now(), onupdate=func.now())
     name = Column(String(256))
     description = Column(Text)
     owner_uid = Column(Integer, ForeignKey('user.uid'))
@@ -123,6 +130,8 @@ class Instance(base):
         back_populates='instance',
         order_by='RecipeOrder.created'
     )
+    workers = relationship('InstanceWorker', back_populates='instance', order_by='InstanceWorker.name')
+    stats = relationship('RunStats', back_populates='instance')
 
     def __repr__(self):
         return "<Instance(name='%s', owner='%s')>" % (self.name, self.owner.name)
@@ -138,19 +147,41 @@ class Instance(base):
                 recipes.append(recipe_order.recipe)
         return recipes
 
+    def get_recipe_schedule(self):
+        """
+        Fetch all active recipes of this instance together with their number of active steps, the creation time of
+        their latest successful run on this instance (as kept in the run statistics), and the current database time,
+        all in one single query.
+        :return: list of (recipe, active step count, latest successful run's creation time or None, database time)
+        """
+        db = object_session(self)
+        active_steps = select([func.count(RecipeStep.uid)])\
+            .where(and_(RecipeStep.recipe_uid == Recipe.uid, RecipeStep.active == True))\
+            .correlate(Recipe)\
+            .as_scalar()
+        return db.query(Recipe, active_steps, RunStats.last_success_created, func.now())\
+            .join(RecipeOrder, RecipeOrder.recipe_uid == Recipe.uid)\
+            .outerjoin(RunStats, and_(RunStats.recipe_uid == Recipe.uid, RunStats.instance_uid == self.uid))\
+            .filter(RecipeOrder.instance_uid == self.uid, Recipe.active == True)\
+            .order_by(RecipeOrder.created)\
+            .all()
+
+    def get_run_count(self):
+        return sum(stats.run_count for stats in self.stats)
+
     def is_visible_to_user(self, user):
-        if self.owner_uid is user.uid:
+        if self.owner_uid == user.uid:
             return True
         for user_privilege in self.privileged_users:
-            if user_privilege.user_uid is user.uid:
+            if user_privilege.user_uid == user.uid:
                 return True
         return False
 
     def is_editable_by_user(self, user):
-        if self.owner_uid is user.uid:
+        if self.owner_uid == user.uid:
             return True
         for user_privilege in self.privileged_users:
-            if user_privilege.user_uid is user.uid and user_privilege.allowed_to_edit:
+            if user_privilege.user_uid == user.uid and user_privilege.allowed_to_edit:
                 return True
         return False
 
@@ -161,13 +192,22 @@ class Instance(base):
         return False
 
     def get_latest_run(self, recipe=None, only_include_successful_runs=False):
-        for run in self.runs:
-            if recipe is None or run.recipe is recipe:
-                if not only_include_successful_runs or run.status == RunStatusEnum.success:
-                    return run
-        return None
+        runs = self.get_latest_runs(1, recipe, only_include_successful_runs)
+        return runs[0] if len(runs) > 0 else None
 
     def get_latest_runs(self, n=10, recipe=None, only_include_successful_runs=False):
+        """
+        The n most recent runs of this instance (optionally only those of the given recipe and/or successful ones),
+        newest first; for a stored instance, only these are fetched from the database rather than its entire history
+        :param n:
+        :param recipe:
+        :param only_include_successful_runs:
+        :return:
+        """
+        db = object_session(self)
+        if db is not None and inspect(self).persistent:
+            return Run.query_latest(db, instance=self, recipe=recipe,
+                                    only_include_successful_runs=only_include_successful_runs).limit(n).all()
         n_runs = []
         for run in self.runs:
             if recipe is None or run.recipe is recipe:
@@ -177,6 +217,19 @@ class Instance(base):
                         break
         return n_runs
 
+    def get_latest_stats(self, recipe=None):
+        """
+        Run statistics of this instance (on the given recipe only, if any) that include the most recent run
+        :param recipe:
+        :return:
+        """
+        latest_stats = None
+        for stats in self.stats:
+            if (recipe is None or stats.recipe_uid == recipe.uid) and stats.last_run_created is not None:
+                if latest_stats is None or stats.last_run_created > latest_stats.last_run_created:
+                    latest_stats = stats
+        return latest_stats
+
     def jsonify(self, include_latest_run=False, recipe=None):
         if include_latest_run:
             latest_run = self.get_latest_run(recipe)
@@ -198,6 +251,29 @@ class Instance(base):
             }
 
 
+class InstanceWorker(base):
+    __tablename__ = 'instanceworker'
+    __table_args__ = (UniqueConstraint('instance_uid', 'name'),)
+    uid = Column(Integer, primary_key=True)
+    created = Column(DateTime, default=func.now())
+    instance_uid = Column(Integer, ForeignKey('instance.uid'))
+    instance = relationship(Instance, back_populates='workers')
+    name = Column(String(256))
+    last_seen = Column(DateTime, default=func.now())
+
+    def __repr__(self):
+        return "<InstanceWorker(instance='%s', name='%s', last_seen='%s')>" % \
+               (self.instance.name, self.name, self.last_seen)
+
+    def jsonify(self):
+        return {
+            'uid': self.uid,
+            'created': self.created,
+            'name': self.name,
+            'last_seen': self.last_seen
+        }
+
+
 class RecipeOrder(base):
     __tablename__ = 'recipe2instance'
     uid = Column(Integer, primary_key=True)
@@ -225,11 +301,15 @@ class Recipe(base):
     __tablename__ = 'recipe'
     uid = Column(Integer, primary_key=True)
     created = Column(DateTime, default=func.now())
+    updated = Column(DateTime, default=func.now(), onupdate=func.now())
     name = Column(String(256))
     description = Column(Text)
     active = Column(Boolean, default=False)
     cookies = Column(Boolean, default=False)
     interval = Column(Integer, default=15)
+    engine = Column(Enum(RecipeEngineEnum), default=RecipeEngineEnum.auto)
+    # days after which runs are moved into the archive (None to use the default retention, 0 to never archive)
+    retention = Column(Integer)
     owner_uid = Column(Integer, ForeignKey('user.uid'))
     owner = relationship(User, back_populates='recipes_owned')
     privileged_users = relationship(
@@ -239,6 +319,7 @@ class Recipe(base):
     )
     steps = relationship('RecipeStep', back_populates='recipe', order_by='RecipeStep.sort')
     runs = relationship('Run', back_populates='recipe', order_by='desc(Run.created)', lazy='select')
+    stats = relationship('RunStats', back_populates='recipe')
     instances = relationship(
         RecipeOrder,
         back_populates='recipe',
@@ -249,6 +330,22 @@ class Recipe(base):
         return "<Recipe(name='%s', owner='%s', interval='%d min', active='%d')>" % \
                (self.name, self.owner.name, self.interval, self.active)
 
+    def get_engine(self):
+        """
+        Engine to run this recipe with, either as set explicitly or, if set to auto, the browserless HTTP engine as long
+        as it supports all active steps and no cookies need to be stored (recipes without any engine set, i.e., from
+        before there were engines, use the browser)
+        :return: RecipeEngineEnum.browser or RecipeEngineEnum.http
+        """
+        if self.engine is not RecipeEngineEnum.auto:
+            return RecipeEngineEnum.browser if self.engine is None else self.engine
+        if not self.cookies and HttpEmulator.is_available():
+            for step in self.get_active_steps():
+                if step.type not in http_step_handlers:
+                    return RecipeEngineEnum.browser
+            return RecipeEngineEnum.http
+        return RecipeEngineEnum.browser
+
     def get_active_steps(self):
         """
         Fetch the ordered list of active steps from this recipe.
@@ -260,27 +357,42 @@ class Recipe(base):
                 steps.append(step)
         return steps
 
+    def get_next_due(self, latest_run_created, now):
+        """
+        Point in time at which this recipe is due again, given the creation time of its latest successful run.
+        :param latest_run_created:
+        :param now:
+        :return:
+        """
+        if latest_run_created is None:
+            return now
+        return latest_run_created + timedelta(minutes=self.interval)
+
+    def is_due(self, latest_run_created, now):
+        return self.get_next_due(latest_run_created, now) <= now
+
+    def get_run_count(self):
+        return sum(stats.run_count for stats in self.stats)
+
     def get_average_runtime(self):
-        if len(self.runs) > 0:
-            summed_runtime = 0
-            for run in self.runs:
-                summed_runtime = summed_runtime + run.runtime
-            return round(summed_runtime/len(self.runs))
+        run_count = self.get_run_count()
+        if run_count > 0:
+            return round(sum(stats.runtime_sum for stats in self.stats)/run_count)
         return 0
 
     def is_visible_to_user(self, user):
-        if self.owner_uid is user.uid:
+        if self.owner_uid == user.uid:
             return True
         for user_privilege in self.privileged_users:
-            if user_privilege.user_uid is user.uid:
+            if user_privilege.user_uid == user.uid:
                 return True
         return False
 
     def is_editable_by_user(self, user):
-        if self.owner_uid is user.uid:
+        if self.owner_uid == user.uid:
             return True
         for user_privilege in self.privileged_users:
-            if user_privilege.user_uid is user.uid and user_privilege.allowed_to_edit:
+            if user_privilege.user_uid == user.uid and user_privilege.allowed_to_edit:
                 return True
         return False
 
@@ -291,13 +403,22 @@ class Recipe(base):
         return False
 
     def get_latest_run(self, instance=None, only_include_successful_runs=False):
-        for run in self.runs:
-            if instance is None or run.instance is instance:
-                if not only_include_successful_runs or run.status == RunStatusEnum.success:
-                    return run
-        return None
+        runs = self.get_latest_runs(1, instance, only_include_successful_runs)
+        return runs[0] if len(runs) > 0 else None
 
     def get_latest_runs(self, n=10, instance=None, only_include_successful_runs=False):
+        """
+        The n most recent runs of this recipe (optionally only those on the given instance and/or successful ones),
+        newest first; for a stored recipe, only these are fetched from the database rather than its entire history
+        :param n:
+        :param instance:
+        :param only_include_successful_runs:
+        :return:
+        """
+        db = object_session(self)
+        if db is not None and inspect(self).persistent:
+            return Run.query_latest(db, recipe=self, instance=instance,
+                                    only_include_successful_runs=only_include_successful_runs).limit(n).all()
         n_runs = []
         for run in self.runs:
             if instance is None or run.instance is instance:
@@ -307,6 +428,19 @@ class Recipe(base):
                         break
         return n_runs
 
+    def get_latest_stats(self, instance=None):
+        """
+        Run statistics of this recipe (on the given instance only, if any) that include the most recent run
+        :param instance:
+        :return:
+        """
+        latest_stats = None
+        for stats in self.stats:
+            if (instance is None or stats.instance_uid == instance.uid) and stats.last_run_created is not None:
+                if latest_stats is None or stats.last_run_created > latest_stats.last_run_created:
+                    latest_stats = stats
+        return latest_stats
+
     def jsonify(self, include_latest_run=False, instance=None):
         if include_latest_run:
             latest_run = self.get_latest_run(instance)
@@ -336,6 +470,7 @@ class Recipe(base):
 
 class RecipeStep(base):
     __tablename__ = 'recipestep'
+    __table_args__ = (Index('ix_recipestep_recipe_sort', 'recipe_uid', 'sort'),)
     uid = Column(Integer, primary_key=True)
     created = Column(DateTime, default=func.now())
     sort = Column(Integer)
@@ -347,7 +482,8 @@ class RecipeStep(base):
     active = Column(Boolean, default=False)
     recipe_uid = Column(Integer, ForeignKey('recipe.uid'))
     recipe = relationship(Recipe, back_populates='steps')
-    data = relationship('Data', back_populates='step', lazy='select')
+    # data is only ever added through its run, so that collected data is not kept in memory by the step as well
+    data = relationship('Data', viewonly=True, lazy='select')
     temp_result = None
 
     def __repr__(self):
@@ -370,16 +506,14 @@ class RecipeStep(base):
         :return:
         """
         if self.use_data_item_instead_of_value > 0:
-            data_item_step_sort = int(self.use_data_item_instead_of_value)
-            for data in run.data:
-                if data.step.sort is data_item_step_sort:
-                    self.value = str(data.value)
-                    run.log.append(Log(message='"' + data.value + '" as value loaded from data'))
-                    break
+            value = run.get_data_item(int(self.use_data_item_instead_of_value))
+            if value is not None:
+                self.value = str(value)
+                run.log.append(Log(message='"' + self.value + '" as value loaded from data'))
         elif self.use_random_item_instead_of_value:
             item = self.find_random_item()
             self.value = str(item.value)
-            self.data.append(Data(run=run, value=self.value))
+            run.data.append(Data(step=self, value=self.value))
             run.log.append(Log(message='"' + item.value + '" randomly selected'))
         return run.process(config, self, prior_step)
 
@@ -427,9 +561,16 @@ class RunStatusEnum(enum.Enum):
 
 class Run(base):
     __tablename__ = 'run'
+    __table_args__ = (Index('ix_run_recipe_instance_status_created', 'recipe_uid', 'instance_uid', 'status',
+                            'created'),
+                      Index('ix_run_recipe_created_uid', 'recipe_uid', 'created', 'uid'),
+                      Index('ix_run_instance_created_uid', 'instance_uid', 'created', 'uid'),
+                      Index('ix_run_origin', 'origin', unique=True))
     uid = Column(Integer, primary_key=True)
     created = Column(DateTime, default=func.now())
     runtime = Column(Integer, default=0)
+    # random token of runs recorded in a local buffer (see RunBuffer), so that each of them is uploaded only once
+    origin = Column(String(32))
     instance_uid = Column(Integer, ForeignKey('instance.uid'))
     instance = relationship('Instance', back_populates='runs')
     recipe_uid = Column(Integer, ForeignKey('recipe.uid'))
@@ -437,18 +578,146 @@ class Run(base):
     status = Column(Enum(RunStatusEnum), default=RunStatusEnum.success)
     log = relationship('Log', back_populates='run', order_by='Log.created, Log.uid', lazy='select')
     data = relationship('Data', back_populates='run', order_by='Data.created, Data.uid', lazy='select')
-    __emulator = Emulator()
+    log_blobs = relationship('LogBlob', back_populates='run', order_by='LogBlob.sequence', lazy='select')
+    __emulator = None
+    __data_items = None
+    __log_sequence = 0
+    flush_rows = None
+    flush_size = None
+    log_level = None
+    compact_log = False
+    blob_store = None
 
     def __repr__(self):
         return "<Run(date='%s', recipe='%s', instance='%s', status='%s')>" % \
                (self.created, self.recipe.name, self.instance.name, self.status)
 
+    @staticmethod
+    def query_latest(db, recipe=None, instance=None, only_include_successful_runs=False):
+        """
+        Query for runs (optionally only those of the given recipe and/or instance and/or successful ones), newest first
+        :param db:
+        :param recipe:
+        :param instance:
+        :param only_include_successful_runs:
+        :return:
+        """
+        query = db.query(Run)
+        if recipe is not None:
+            query = query.filter(Run.recipe == recipe)
+        if instance is not None:
+            query = query.filter(Run.instance == instance)
+        if only_include_successful_runs:
+            query = query.filter(Run.status == RunStatusEnum.success)
+        return query.order_by(Run.created.desc(), Run.uid.desc())
+
+    def get_cursor(self):
+        """
+        Position of this run in a list of runs ordered by creation, to continue the list after this run (see paginate);
+        only the uid, so that the run's creation date is compared as stored (which a date formatted here and bound
+        again might not match, e.g., dates stored by SQLite without microseconds)
+        :return:
+        """
+        return str(self.uid)
+
+    @staticmethod
+    def parse_cursor(cursor):
+        """
+        Inverse of get_cursor
+        :param cursor:
+        :return: uid
+        :raises ValueError: if the cursor is malformed
+        """
+        return int(cursor)
+
+    @staticmethod
+    def paginate(query, before=None, limit=10):
+        """
+        One page of runs, newest first, continuing after the given cursor: instead of skipping all prior runs (as with
+        offsets), runs are looked up right from the cursor's position (via the indexes on recipe or instance, creation
+        date, and uid), so every page takes the same time however far back it is
+        :param query: query for runs, already filtered (e.g., by recipe, instance, and permissions)
+        :param before: cursor of the last run of the previous page (see get_cursor), or None for the first page
+        :param limit: maximum number of runs on the page
+        :return: tuple of the runs and the cursor of the next page (None if there are no further runs)
+        """
+        if before is not None:
+            uid = Run.parse_cursor(before)
+            prior = aliased(Run)
+            created = select([prior.created]).where(prior.uid == uid).as_scalar()
+            query = query.filter(or_(Run.created < created, and_(Run.created == created, Run.uid < uid)))
+        # one run more than requested tells whether there is a next page, without counting all runs
+        runs = query.order_by(Run.created.desc(), Run.uid.desc()).limit(limit + 1).all()
+        if len(runs) > limit:
+            return runs[:limit], runs[limit - 1].get_cursor()
+        return runs, None
+
+    @staticmethod
+    def fail_abandoned(db, before, instance=None):
+        """
+        Mark runs still in progress although started before the given date as failed, unless their recipe and instance
+        are still leased (i.e., the run goes on), as runs whose runner has been killed would remain in progress forever
+        :param db:
+        :param before:
+        :param instance: optionally, only runs of this instance
+        :return: number of runs marked as failed (to be committed)
+        """
+        now = db.query(func.now()).scalar()
+        leased = db.query(RunLease.uid).filter(RunLease.recipe_uid == Run.recipe_uid,
+                                               RunLease.instance_uid == Run.instance_uid,
+                                               RunLease.holder != None, RunLease.expires >= now)
+        query = db.query(Run).filter(Run.status == RunStatusEnum.in_progress, Run.created < before, ~leased.exists())
+        if instance is not None:
+            query = query.filter(Run.instance_uid == instance.uid)
+        runs = query.all()
+        for run in runs:
+            run.status = RunStatusEnum.error
+            db.add(Log(run_uid=run.uid, message='Run abandoned (its runner has stopped)', type=LogTypeEnum.error))
+            RunStats.record(db, run)
+            RunEvent.record(db, run, RunEventTypeEnum.finished)
+        return len(runs)
+
+    @staticmethod
+    def get_latest_uids(db, instance_uids, recipe_uids=None):
+        """
+        The most recent run (including runs in progress) of each of the given instances, both on any recipe and on each
+        recipe separately (as Instance.get_latest_run for many instances at once), fetched in one single grouped query
+        :param db:
+        :param instance_uids:
+        :param recipe_uids: optionally, the recipes to consider (default is all)
+        :return: dict of (instance uid, recipe uid or None for any recipe) and run uid
+        """
+        if len(instance_uids) == 0:
+            return {}
+        query = db.query(Run.instance_uid, Run.recipe_uid, func.max(Run.uid))\
+            .filter(Run.instance_uid.in_(instance_uids))\
+            .group_by(Run.instance_uid, Run.recipe_uid)
+        if recipe_uids is not None:
+            query = query.filter(Run.recipe_uid.in_(recipe_uids))
+        latest = {}
+        for instance_uid, recipe_uid, run_uid in query:
+            latest[(instance_uid, recipe_uid)] = run_uid
+            latest[(instance_uid, None)] = max(run_uid, latest.get((instance_uid, None), run_uid))
+        return latest
+
     def get_recipe_order(self):
         for temp_order in self.recipe.instances:
             if temp_order.instance is self.instance:
                 return temp_order
         return None
 
+    def get_emulator(self):
+        """
+        Every run gets its own emulator (and thus browser) so that runs can be processed in parallel
+        :return:
+        """
+        if self.__emulator is None:
+            if self.recipe is not None and self.recipe.get_engine() is RecipeEngineEnum.http:
+                self.__emulator = HttpEmulator()
+            else:
+                self.__emulator = Emulator()
+        return self.__emulator
+
     def process(self, config, step, prior_step=None):
         """
         Processes the actual step handling and forwards it to the emulator
@@ -457,29 +726,382 @@ class Run(base):
         :param prior_step:
         :return:
         """
-        return self.__emulator.run(config, self, step, prior_step)
+        return self.get_emulator().run(config, self, step, prior_step)
 
     def end_session(self):
-        return self.__emulator.close_session(self)
+        return self.get_emulator().close_session(self)
+
+    def flush_results(self, force=True):
+        """
+        Bulk insert the log entries and data collected (but not yet stored) during this run, commit them, and drop them
+        from memory, so that memory use stays bounded and partial results survive failures
+        :param force: if False, only flush if more than flush_rows rows or flush_size bytes of data are pending
+        :return: number of rows written
+        """
+        session = object_session(self)
+        if session is None:
+            return 0
+        if not force:
+            if self.flush_rows is None or self.uid is None:
+                return 0
+            if len(self.log) + len(self.data) < self.flush_rows and \
+                    (self.flush_size is None or sum(len(str(data.value)) for data in self.data) < self.flush_size):
+                return 0
+        # (re)loading a collection expired by a commit in the meantime must not flush the pending objects on its own
+        with session.no_autoflush:
+            new_log = [log for log in self.log if inspect(log).key is None]
+            pending_data = [data for data in self.data if inspect(data).key is None]
+        if self.uid is None:
+            # only store the run itself for now, as log entries might be stored compactly (or not at all) and data
+            # values might be stored as blobs
+            self.__index_data_items()
+            set_committed_value(self, 'log', [])
+            set_committed_value(self, 'data', [])
+            for pending in new_log + pending_data:
+                if pending in session:
+                    session.expunge(pending)
+            session.flush()
+        self.__index_data_items()
+        pending_log = [log for log in new_log if self.is_logged(log)]
+        if len(pending_log) > 0 and self.compact_log:
+            self.__store_log_blob(session, pending_log)
+        elif len(pending_log) > 0:
+            session.execute(Log.__table__.insert(), [{
+                'type': LogTypeEnum.info if log.type is None else log.type,
+                'message': log.message,
+                'run_uid': self.uid
+            } for log in pending_log])
+        if len(pending_data) > 0:
+            session.execute(Data.__table__.insert(), [{
+                'value': data.value if self.blob_store is None else self.blob_store.store(data.value),
+                'run_uid': self.uid,
+                'step_uid': data.step_uid if data.step is None else data.step.uid
+            } for data in pending_data])
+        # forget about stored objects before committing, so that they are not added again by the unit of work
+        set_committed_value(self, 'log', [])
+        set_committed_value(self, 'data', [])
+        for pending in new_log + pending_data:
+            if pending in session:
+                session.expunge(pending)
+        session.commit()
+        # committing expires all attributes and the collections would otherwise be loaded (entirely) upon next access
+        set_committed_value(self, 'log', [])
+        set_committed_value(self, 'data', [])
+        return len(pending_log) + len(pending_data)
+
+    def is_logged(self, log):
+        """
+        Whether a log entry is to be stored, i.e., whether its type is at least as severe as log_level
+        :param log:
+        :return:
+        """
+        if self.log_level is None:
+            return True
+        return (LogTypeEnum.info if log.type is None else log.type).value >= self.log_level.value
+
+    def __store_log_blob(self, session, pending_log):
+        # one more chunk per flush, whose entries are dated by the database (through the chunk) unless dated already
+        entries = [(log.created, LogTypeEnum.info if log.type is None else log.type, log.message)
+                   for log in pending_log]
+        session.execute(LogBlob.__table__.insert(), {
+            'run_uid': self.uid,
+            'sequence': self.__log_sequence,
+            'entry_count': len(entries),
+            'content': LogBlob.compress(entries)
+        })
+        self.__log_sequence = self.__log_sequence + 1
+
+    def get_log(self):
+        """
+        All log entries stored for this run, both as rows and compactly (as unsaved Log objects without uid)
+        :return:
+        """
+        return sorted(list(self.log) + [log for log_blob in self.log_blobs for log in log_blob.get_log()],
+                      key=lambda log: log.created)
 
-    def jsonify(self, include_log=False, include_data=False):
-        temp = {
+    def __index_data_items(self):
+        if self.__data_items is None:
+            self.__data_items = {}
+        for data in self.data:
+            if data.step is not None:
+                self.__data_items.setdefault(data.step.sort, data.value)
+
+    def get_data_item(self, step_sort):
+        """
+        Value of the first data collected during this run by the step with the given sort, looked up in an index of data
+        already flushed to the database and, if not found there, among the data still pending in memory
+        :param step_sort:
+        :return: None if that step has not collected any data (yet)
+        """
+        if self.__data_items is not None and step_sort in self.__data_items:
+            return self.__data_items[step_sort]
+        for data in self.data:
+            if data.step is not None and data.step.sort == step_sort:
+                return data.value
+        return None
+
+    def get_all_data(self):
+        """
+        All data collected during this run thus far, both already flushed to the database and still pending in memory
+        :return:
+        """
+        session = object_session(self)
+        if session is None or self.uid is None:
+            return list(self.data)
+        with session.no_autoflush:
+            flushed = session.query(Data).filter(Data.run_uid == self.uid).order_by(Data.created, Data.uid).all()
+        if self.blob_store is not None:
+            for data in flushed:
+                if self.blob_store.is_reference(data.value):
+                    # replaced as if loaded that way, so that the value is not written back
+                    set_committed_value(data, 'value', self.blob_store.load(data.value))
+        return flushed + [data for data in self.data if inspect(data).key is None]
+
+    def jsonify(self, include_log=False, include_data=False, blob_store=None):
+        from scrapebot.serialize import get_run_serializer
+        return get_run_serializer(include_log, include_data, blob_store).dump(self)
+
+
+class RunLease(base):
+    __tablename__ = 'runlease'
+    __table_args__ = (UniqueConstraint('recipe_uid', 'instance_uid'),)
+    uid = Column(Integer, primary_key=True)
+    created = Column(DateTime, default=func.now())
+    recipe_uid = Column(Integer, ForeignKey('recipe.uid'))
+    instance_uid = Column(Integer, ForeignKey('instance.uid'))
+    holder = Column(String(256))
+    expires = Column(DateTime)
+
+    def __repr__(self):
+        return "<RunLease(recipe='%s', instance='%s', holder='%s', expires='%s')>" % \
+               (self.recipe_uid, self.instance_uid, self.holder, self.expires)
+
+
+class RunStats(base):
+    """
+    Statistics on all finished runs of a recipe on an instance, updated whenever a run finishes, so that neither the
+    web frontend nor the scheduler need to aggregate the entire run history
+    """
+    __tablename__ = 'runstats'
+    __table_args__ = (UniqueConstraint('recipe_uid', 'instance_uid'),)
+    uid = Column(Integer, primary_key=True)
+    created = Column(DateTime, default=func.now())
+    updated = Column(DateTime, default=func.now(), onupdate=func.now())
+    recipe_uid = Column(Integer, ForeignKey('recipe.uid'))
+    recipe = relationship(Recipe, back_populates='stats')
+    instance_uid = Column(Integer, ForeignKey('instance.uid'))
+    instance = relationship(Instance, back_populates='stats')
+    run_count = Column(Integer, default=0)
+    error_count = Column(Integer, default=0)
+    runtime_sum = Column(Integer, default=0)
+    runtime_min = Column(Integer)
+    runtime_max = Column(Integer)
+    runtime_ewma = Column(Float)
+    # runs are referenced without foreign keys so that old runs can still be deleted (or archived)
+    last_run_uid = Column(Integer)
+    last_run = relationship(Run, primaryjoin='foreign(RunStats.last_run_uid) == Run.uid', viewonly=True)
+    last_run_created = Column(DateTime)
+    last_run_status = Column(Enum(RunStatusEnum))
+    last_success_run_uid = Column(Integer)
+    last_success_run = relationship(Run, primaryjoin='foreign(RunStats.last_success_run_uid) == Run.uid',
+                                    viewonly=True)
+    last_success_created = Column(DateTime)
+    # weight of the latest runtime in the exponentially weighted moving average
+    ewma_weight = .2
+
+    def __repr__(self):
+        return "<RunStats(recipe='%s', instance='%s', runs='%s', errors='%s')>" % \
+               (self.recipe_uid, self.instance_uid, self.run_count, self.error_count)
+
+    def add_run(self, run):
+        """
+        Account for a finished run
+        :param run: the run or any row with its uid, created, status, and runtime
+        :return:
+        """
+        runtime = run.runtime or 0
+        self.run_count = self.run_count + 1
+        if run.status is not RunStatusEnum.success:
+            self.error_count = self.error_count + 1
+        self.runtime_sum = self.runtime_sum + runtime
+        self.runtime_min = runtime if self.runtime_min is None else min(self.runtime_min, runtime)
+        self.runtime_max = runtime if self.runtime_max is None else max(self.runtime_max, runtime)
+        if self.runtime_ewma is None:
+            self.runtime_ewma = float(runtime)
+        else:
+            self.runtime_ewma = self.ewma_weight * runtime + (1 - self.ewma_weight) * self.runtime_ewma
+        if self.last_run_created is None or run.created >= self.last_run_created:
+            self.last_run_uid = run.uid
+            self.last_run_created = run.created
+            self.last_run_status = run.status
+        if run.status is RunStatusEnum.success and \
+                (self.last_success_created is None or run.created >= self.last_success_created):
+            self.last_success_run_uid = run.uid
+            self.last_success_created = run.created
+
+    def get_average_runtime(self):
+        return self.runtime_sum / self.run_count if self.run_count else 0
+
+    @staticmethod
+    def create(recipe_uid, instance_uid):
+        return RunStats(recipe_uid=recipe_uid, instance_uid=instance_uid, run_count=0, error_count=0, runtime_sum=0)
+
+    @staticmethod
+    def record(db, run):
+        """
+        Add a finished run to the statistics of its recipe on its instance (which need to be committed along with the
+        run); as a recipe is only ever run once at a time per instance, rows are never updated concurrently
+        :param db:
+        :param run:
+        :return:
+        """
+        if run.uid is None:
+            db.flush()
+        stats = db.query(RunStats)\
+            .filter(RunStats.recipe_uid == run.recipe_uid, RunStats.instance_uid == run.instance_uid)\
+            .one_or_none()
+        if stats is None:
+            stats = RunStats.create(run.recipe_uid, run.instance_uid)
+            db.add(stats)
+        stats.add_run(run)
+        return stats
+
+    @staticmethod
+    def rebuild(connection):
+        """
+        Recompute all statistics from the finished runs stored so far, e.g., for runs stored before statistics were
+        kept; runs are streamed in order (through a server-side cursor, as drivers like PyMySQL would otherwise fetch
+        all rows at once), so that only one row per recipe and instance is kept in memory
+        :param connection:
+        :return: number of statistics rows written
+        """
+        stats = []
+        for run in connection.execution_options(stream_results=True).execute(
+            select([Run.uid, Run.recipe_uid, Run.instance_uid, Run.created, Run.status, Run.runtime])
+            .where(and_(Run.status != RunStatusEnum.in_progress, Run.recipe_uid != None, Run.instance_uid != None))
+            .order_by(Run.recipe_uid, Run.instance_uid, Run.created, Run.uid)
+        ):
+            if len(stats) == 0 or stats[-1].recipe_uid != run.recipe_uid or stats[-1].instance_uid != run.instance_uid:
+                stats.append(RunStats.create(run.recipe_uid, run.instance_uid))
+            stats[-1].add_run(run)
+        columns = [column.key for column in RunStats.__table__.columns
+                   if column.key not in ('uid', 'created', 'updated')]
+        connection.execute(RunStats.__table__.delete())
+        if len(stats) > 0:
+            connection.execute(RunStats.__table__.insert(), [
+                dict((column, getattr(temp_stats, column)) for column in columns) for temp_stats in stats
+            ])
+        return len(stats)
+
+    def jsonify(self):
+        return {
             'uid': self.uid,
-            'created': self.created,
-            'runtime': self.runtime,
-            'instance': self.instance.jsonify(),
-            'recipe': self.recipe.jsonify(),
-            'status': self.status.name
+            'updated': self.updated,
+            'run_count': self.run_count,
+            'error_count': self.error_count,
+            'runtime_average': self.get_average_runtime(),
+            'runtime_min': self.runtime_min,
+            'runtime_max': self.runtime_max,
+            'runtime_ewma': self.runtime_ewma,
+            'last_run_uid': self.last_run_uid,
+            'last_run_created': self.last_run_created,
+            'last_run_status': None if self.last_run_status is None else self.last_run_status.name,
+            'last_success_run_uid': self.last_success_run_uid,
+            'last_success_created': self.last_success_created
+        }
+
+
+class RunEventTypeEnum(enum.Enum):
+    started = 0
+    finished = 1
+
+
+class RunEvent(base):
+    """
+    Change feed of runs, i.e., one row for every run started and every run finished, in the order of their uids, so that
+    the web frontend only needs to look for rows newer than the last one it has seen to learn about all changes
+    """
+    __tablename__ = 'runevent'
+    uid = Column(Integer, primary_key=True)
+    created = Column(DateTime, default=func.now())
+    type = Column(Enum(RunEventTypeEnum))
+    # runs are referenced without foreign keys so that old runs can still be deleted (or archived)
+    run_uid = Column(Integer)
+    recipe_uid = Column(Integer)
+    instance_uid = Column(Integer)
+    status = Column(Enum(RunStatusEnum))
+    runtime = Column(Integer)
+
+    def __repr__(self):
+        return "<RunEvent(run='%s', type='%s', status='%s')>" % (self.run_uid, self.type, self.status)
+
+    @staticmethod
+    def record(db, run, event_type):
+        """
+        Add the event of a run having started or finished to the session (to be committed together with the run)
+        :param db:
+        :param run:
+        :param event_type:
+        :return:
+        """
+        if run.uid is None:
+            db.flush()
+        event = RunEvent(type=event_type, run_uid=run.uid, recipe_uid=run.recipe_uid, instance_uid=run.instance_uid,
+                         status=run.status, runtime=run.runtime)
+        db.add(event)
+        return event
+
+    @staticmethod
+    def query_since(connection, after_uid=None, limit=1000):
+        """
+        Events newer than the given one, together with the names of their recipes and instances and the creation date
+        of their runs, oldest first
+        :param connection:
+        :param after_uid: uid of the last event seen (None for all events)
+        :param limit:
+        :return:
+        """
+        query = select([RunEvent.__table__, Run.created.label('run_created'), Recipe.name.label('recipe_name'),
+                        Instance.name.label('instance_name')])\
+            .select_from(RunEvent.__table__
+                         .outerjoin(Run.__table__, Run.uid == RunEvent.run_uid)
+                         .outerjoin(Recipe.__table__, Recipe.uid == RunEvent.recipe_uid)
+                         .outerjoin(Instance.__table__, Instance.uid == RunEvent.instance_uid))\
+            .order_by(RunEvent.uid)\
+            .limit(limit)
+        if after_uid is not None:
+            query = query.where(RunEvent.uid > after_uid)
+        return connection.execute(query).fetchall()
+
+    @staticmethod
+    def prune(connection, before):
+        """
+        Delete all events created before the given date, as events are only of interest while they are new
+        :param connection:
+        :param before:
+        :return: number of events deleted
+        """
+        return connection.execute(RunEvent.__table__.delete().where(RunEvent.created < before)).rowcount
+
+    @staticmethod
+    def jsonify_row(row):
+        """
+        JSON representation of an event as fetched by query_since, in the shape of runs (as in Run.jsonify)
+        :param row:
+        :return:
+        """
+        return {
+            'uid': row.uid,
+            'type': row.type.name,
+            'run': {
+                'uid': row.run_uid,
+                'created': row.run_created,
+                'status': None if row.status is None else row.status.name,
+                'runtime': row.runtime,
+                'recipe': {'uid': row.recipe_uid, 'name': row.recipe_name},
+                'instance': {'uid': row.instance_uid, 'name': row.instance_name}
+            }
         }
-        if include_log:
-            temp['log'] = []
-            for temp_log in self.log:
-                temp['log'].append(temp_log.jsonify())
-        if include_data:
-            temp['data'] = []
-            for temp_data in self.data:
-                temp['data'].append(temp_data.jsonify())
-        return temp
 
 
 class LogTypeEnum(enum.Enum):
@@ -490,6 +1112,7 @@ class LogTypeEnum(enum.Enum):
 
 class Log(base):
     __tablename__ = 'log'
+    __table_args__ = (Index('ix_log_run_created', 'run_uid', 'created'),)
     uid = Column(Integer, primary_key=True)
     created = Column(DateTime, default=func.now())
     type = Column(Enum(LogTypeEnum), default=LogTypeEnum.info)
@@ -502,34 +1125,83 @@ class Log(base):
                (self.created, self.run.recipe.name, self.type, self.message)
 
     def jsonify(self):
-        return {
-            'uid': self.uid,
-            'created': self.created,
-            'type': self.type.name,
-            'message': self.message,
-            'run': self.run.jsonify()
-        }
+        from scrapebot.serialize import Serializer
+        return Serializer(Log).dump(self)
+
+
+class LogBlob(base):
+    """
+    Log entries of a run stored compactly in compressed rows (rather than one Log row each), one row appended per flush
+    of the run's results, so that entries once stored are neither kept in memory nor rewritten
+    """
+    __tablename__ = 'logblob'
+    __table_args__ = (Index('ix_logblob_run_sequence', 'run_uid', 'sequence', unique=True),)
+    uid = Column(Integer, primary_key=True)
+    # entries without a date of their own are dated by the database when stored, just like log rows
+    created = Column(DateTime, default=func.now())
+    run_uid = Column(Integer, ForeignKey('run.uid'))
+    run = relationship(Run, back_populates='log_blobs')
+    sequence = Column(Integer, default=0)
+    entry_count = Column(Integer, default=0)
+    # up to 16 MB (i.e., MEDIUMBLOB on MySQL)
+    content = Column(LargeBinary(length=16777215))
+    date_format = '%Y-%m-%d %H:%M:%S.%f'
+
+    def __repr__(self):
+        return "<LogBlob(run='%s', entries='%s')>" % (self.run_uid, self.entry_count)
+
+    @staticmethod
+    def compress(entries):
+        """
+        :param entries: list of (created or None, type, message)
+        :return:
+        """
+        return zlib.compress(json.dumps([
+            [None if created is None else created.strftime(LogBlob.date_format), log_type.name, message]
+            for created, log_type, message in entries
+        ]).encode('utf-8'))
+
+    def get_log(self):
+        """
+        The entries as Log objects, which are not added to any session
+        :return:
+        """
+        if self.content is None:
+            return []
+        return [
+            Log(created=self.created if created is None else datetime.strptime(created, self.date_format),
+                type=LogTypeEnum[log_type], message=message, run_uid=self.run_uid)
+            for created, log_type, message in json.loads(zlib.decompress(self.content).decode('utf-8'))
+        ]
 
 
 class Data(base):
     __tablename__ = 'data'
+    __table_args__ = (Index('ix_data_run_step', 'run_uid', 'step_uid'),)
     uid = Column(Integer, primary_key=True)
     created = Column(DateTime, default=func.now())
     value = Column(Text)
     run_uid = Column(Integer, ForeignKey('run.uid'))
     run = relationship(Run, back_populates='data')
     step_uid = Column(Integer, ForeignKey('recipestep.uid'))
-    step = relationship(RecipeStep, back_populates='data')
+    step = relationship(RecipeStep)
 
     def __repr__(self):
         return "<Data(date='%s', recipe='%s', step='%s', value='%s')>" % \
                (self.created, self.run.recipe.name, self.step.sort, self.value)
 
-    def jsonify(self):
-        return {
-            'uid': self.uid,
-            'created': self.created,
-            'value': self.value,
-            'run': self.run.jsonify(),
-            'step': self.step.jsonify()
-        }
+    def jsonify(self, blob_store=None):
+        from scrapebot.serialize import get_data_serializer
+        return get_data_serializer(blob_store).dump(self)
+
+
+class SchemaVersion(base):
+    __tablename__ = 'schemaversion'
+    uid = Column(Integer, primary_key=True)
+    created = Column(DateTime, default=func.now())
+    version = Column(Integer, unique=True)
+    description = Column(String(256))
+
+    def __repr__(self):
+        return "<SchemaVersion(version='%s', description='%s', date='%s')>" % \
+               (self.version, self.description, self.created)
@@ -6,6 +6,8 @@ import time
 import random
 import platform
 import traceback
+import threading
+import urllib.parse
 from pyvirtualdisplay import Display
 # https://selenium-python.readthedocs.io
 from selenium import webdriver
@@ -77,11 +79,157 @@ class RecipeStepTypeEnum(enum.Enum):
             return None
 
 
+class RecipeEngineEnum(enum.Enum):
+    auto = 'Automatically (without browser if all steps allow for it and cookies are not stored)'
+    browser = 'Browser (Selenium)'
+    http = 'Without browser (plain HTTP requests, no JavaScript, only some step types available)'
+
+    @classmethod
+    def choices(cls):
+        return [(choice.name, choice.value) for choice in cls]
+
+    @classmethod
+    def coerce(cls, item):
+        return item.name if isinstance(item, RecipeEngineEnum) else item
+
+
+class SharedDisplay:
+    """
+    The one virtual display (on Linux) all browsers of this process run on. Starting and stopping a display changes the
+    process-wide DISPLAY environment variable, so displays must not be started and stopped by parallel runs; instead,
+    this display is started once (before any worker starts a browser) and only stopped on shutdown.
+    """
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__display = None
+        self.size = None
+
+    def start(self, width, height):
+        """
+        Start the display, unless already started (or not on Linux)
+        :param width:
+        :param height:
+        :return: whether the display is running
+        """
+        with self.__lock:
+            if self.__display is None and platform.system() == 'Linux':
+                display = Display(visible=0, size=(width, height))
+                display.start()
+                self.__display = display
+                self.size = (width, height)
+            return self.__display is not None
+
+    def stop(self):
+        with self.__lock:
+            if self.__display is not None:
+                try:
+                    self.__display.stop()
+                finally:
+                    self.__display = None
+                    self.size = None
+
+
+def get_display_size(config):
+    """
+    Size of the virtual display, somewhat larger than the browser window configured
+    :param config:
+    :return: tuple of width and height
+    """
+    return (int(int(config.get('Instance', 'BrowserWidth', fallback=1024)) * 1.2),
+            int(int(config.get('Instance', 'BrowserHeight', fallback=768)) * 1.2))
+
+
+class BrowserSession:
+    """
+    A running browser (i.e., Selenium driver) which may be used for several runs; it runs on the shared display.
+    """
+    def __init__(self, selenium, user_agent):
+        self.selenium = selenium
+        self.user_agent = user_agent
+        self.uses = 0
+
+    def is_alive(self):
+        try:
+            return self.selenium.current_url is not None
+        except:
+            return False
+
+    def close(self):
+        self.selenium.quit()
+
+
+class BrowserPool:
+    """
+    Keeps idle browser sessions warm, keyed by their configuration, so that not every run needs to start a browser.
+    """
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__idle = {}
+
+    def acquire(self, key):
+        with self.__lock:
+            sessions = self.__idle.get(key, [])
+            return sessions.pop() if len(sessions) > 0 else None
+
+    def release(self, key, session, size):
+        with self.__lock:
+            sessions = self.__idle.setdefault(key, [])
+            if len(sessions) < size:
+                sessions.append(session)
+                return True
+        return False
+
+    def close_all(self):
+        with self.__lock:
+            sessions = [session for sessions in self.__idle.values() for session in sessions]
+            self.__idle = {}
+        for session in sessions:
+            try:
+                session.close()
+            except:
+                pass
+
+
+shared_display = SharedDisplay()
+browser_pool = BrowserPool()
+step_handlers = {}
+
+
+def handles(*step_types, registry=None):
+    """
+    Register the decorated Emulator method as handler of the given step type(s)
+    :param step_types:
+    :param registry: dict of handlers to register with (default is the browser engine's step_handlers)
+    :return:
+    """
+    def register(handler):
+        for step_type in step_types:
+            (step_handlers if registry is None else registry)[step_type] = handler
+        return handler
+    return register
+
+
 class Emulator:
+    handlers = step_handlers
     __selenium = None
-    __display = None
+    __session = None
+    __pool_key = None
     __timeout = 0
     __config = None
+    # scripts to retrieve a value from a list of elements (passed as arguments[0]) all at once, roughly resembling
+    # what WebElement.text and WebElement.get_attribute() (with the attribute name as arguments[1]) would return
+    bulk_size = 500
+    bulk_text_script = 'return arguments[0].map(function(element) { ' \
+                       'return (element.innerText === undefined ? element.textContent : element.innerText).trim(); });'
+    bulk_attribute_script = 'var name = arguments[1]; return arguments[0].map(function(element) { ' \
+                            'var value = name === "style" ? element.style.cssText : element[name]; ' \
+                            'if (value === undefined || value === null || typeof value === "object" || ' \
+                            'typeof value === "function") { value = element.getAttribute(name); } ' \
+                            'if (typeof value === "boolean") { value = value ? "true" : null; } ' \
+                            'return value === null ? null : String(value); });'
+
+    def __init__(self):
+        self.__origins = set()
 
     def run(self, config, run, step, prior_step=None):
         from scrapebot.database import Log, RunStatusEnum
@@ -103,93 +251,30 @@ class Emulator:
         user_agent = self.__config.get('Instance', 'BrowserUserAgent', fallback='')
         language = self.__config.get('Instance', 'BrowserLanguage', fallback='en')
         try:
-            lib_prefix = self.__config.get('Instance', 'LibDirPrefix', fallback='')
             browser_width = int(self.__config.get('Instance', 'BrowserWidth', fallback=1024))
             browser_height = int(self.__config.get('Instance', 'BrowserHeight', fallback=768))
-            display_width = int(browser_width*1.2)
-            display_height = int(browser_height*1.2)
             geo_lat = float(self.__config.get('Instance', 'BrowserGeoLatitude', fallback=0.0))
             geo_lon = float(self.__config.get('Instance', 'BrowserGeoLongitude', fallback=0.0))
-            if platform.system() == 'Linux':
-                self.__display = Display(visible=0, size=(display_width, display_height))
-                self.__display.start()
-                run.log.append(Log(message='Running on a virtual display at ' + str(display_width) + ' by ' +
-                                           str(display_height)))
-            if browser == 'Firefox':
-                gecko = '64' if '64' in platform.machine() else '32'
-                if platform.system() == 'Linux':
-                    if platform.machine().lower().startswith('arm'):
-                        gecko = lib_prefix + 'lib/geckodriver-arm-v0.23'
-                    else:
-                        gecko = lib_prefix + 'lib/geckodriver-linux' + gecko
-                elif platform.system() == 'Darwin':
-                    gecko = lib_prefix + 'lib/geckodriver-macos'
-                else:
-                    gecko = lib_prefix + 'lib/geckodriver-win' + gecko + '.exe'
-                profile = webdriver.FirefoxProfile()
-                if user_agent != '':
-                    profile.set_preference('general.useragent.override', user_agent)
-                profile.set_preference('intl.accept_languages', language)
-                run.log.append(Log(message='Browser accept language set to "' + language + '"'))
-                if geo_lat != 0.0 and geo_lon != 0.0:
-                    geo_uri = 'data:application/json,{"location": {"lat": ' + str(geo_lat) + ', "lng": ' \
-                              + str(geo_lon) + '}, "accuracy": 10}'
-                    profile.set_preference('geo.enabled', True)
-                    profile.set_preference('geo.provider.use_corelocation', False)
-                    profile.set_preference('geo.provider.use_gpsd', False)
-                    profile.set_preference('geo.provider.use_mls', False)
-                    profile.set_preference('geo.provider.ms-windows-location', False)
-                    profile.set_preference('geo.prompt.testing', True)
-                    profile.set_preference('geo.prompt.testing.allow', True)
-                    profile.set_preference('geo.provider.testing', True)
-                    profile.set_preference('geo.provider.network.url', geo_uri)
-                    profile.set_preference('geo.wifi.uri', geo_uri)
-                    run.log.append(Log(message='Firefox geolocation set to ' + str(geo_lat) + ', ' + str(geo_lon)))
-
-                if executable == '':
-                    self.__selenium = webdriver.Firefox(firefox_profile=profile, executable_path=gecko)
-                    run.log.append(Log(message='Browser instance set to Firefox with Geckodriver "' + gecko + '"'))
-                else:
-                    self.__selenium = webdriver.Firefox(firefox_profile=profile,
-                                                        executable_path=gecko,
-                                                        firefox_binary=FirefoxBinary(executable))
-                    run.log.append(Log(message='Browser instance set to Firefox with Geckodriver "' + gecko +
-                                               '" and executable path "' + executable + '"'))
-            elif browser == 'Chrome':
-                if executable == '':
-                    if platform.system() == 'Linux':
-                        if platform.machine().lower().startswith('arm'):
-                            executable = lib_prefix + 'lib/chromedriver-arm'
-                        else:
-                            executable = lib_prefix + 'lib/chromedriver-linux'
-                    elif platform.system() == 'Darwin':
-                        executable = lib_prefix + 'lib/chromedriver-macos'
-                    else:
-                        executable = lib_prefix + 'lib/chromedriver-win.exe'
-                options = webdriver.ChromeOptions()
-                if user_agent != '':
-                    options.add_argument('--user-agent=' + user_agent)
-                options.add_argument('--lang=' + language)
-                options.add_experimental_option('prefs', {'intl.accept_languages': language})
-                run.log.append(Log(message='Browser accept language set to "' + language + '"'))
-                self.__selenium = webdriver.Chrome(executable_path=executable, chrome_options=options)
-                run.log.append(Log(message='Browser instance set to Chrome with ChromeDriver "' + executable + '"'))
+            self.__pool_key = (browser, executable, user_agent, language, geo_lat, geo_lon,
+                               browser_width, browser_height)
+            if self.__get_pool_size() > 0:
+                self.__session = browser_pool.acquire(self.__pool_key)
+                if self.__session is not None and not self.__session.is_alive():
+                    try:
+                        self.__session.close()
+                    except:
+                        pass
+                    self.__session = None
+            if self.__session is None:
+                self.__launch_browser(run, browser, executable, user_agent, language, browser_width, browser_height,
+                                      geo_lat, geo_lon)
             else:
-                webdriver_class = getattr(webdriver, browser)
-                if executable == '':
-                    self.__selenium = webdriver_class()
-                    run.log.append(Log(message='Browser instance set to ' + browser))
-                else:
-                    self.__selenium = webdriver.Chrome(executable_path=executable)
-                    run.log.append(Log(message='Browser instance set to ' + browser + ' with executable path "' +
-                                               executable + '"'))
-            self.__selenium.set_window_size(browser_width, browser_height)
-            run.log.append(Log(message='Browser size set to ' + str(browser_width) + ' by ' +
-                                       str(browser_height) + ' pixel'))
+                self.__selenium = self.__session.selenium
+                run.log.append(Log(message='Reusing warm ' + browser + ' session (used ' +
+                                           str(self.__session.uses) + ' time(s) before)'))
             self.__timeout = float(self.__config.get('Instance', 'Timeout', fallback=0))
             run.log.append(Log(message='Browser timeout set to ' + str(self.__timeout) + ' seconds'))
-            user_agent = self.__selenium.execute_script('return navigator.userAgent')
-            run.log.append(Log(message='User agent for this session is "' + user_agent + '"'))
+            run.log.append(Log(message='User agent for this session is "' + self.__session.user_agent + '"'))
             # @todo?: add encoding (Accept-Charset and Accept); however, neither is currently available to Selenium
             return True
         except WebDriverException:
@@ -206,6 +291,152 @@ class Emulator:
             self.close_session(run)
             return False
 
+    def __launch_browser(self, run, browser, executable, user_agent, language, browser_width, browser_height,
+                         geo_lat, geo_lon):
+        from scrapebot.database import Log
+        lib_prefix = self.__config.get('Instance', 'LibDirPrefix', fallback='')
+        # usually, the display has been started already (before any worker), so browsers are launched on it directly
+        if shared_display.start(*get_display_size(self.__config)):
+            run.log.append(Log(message='Running on the virtual display at ' + str(shared_display.size[0]) + ' by ' +
+                                       str(shared_display.size[1])))
+        if browser == 'Firefox':
+            gecko = '64' if '64' in platform.machine() else '32'
+            if platform.system() == 'Linux':
+                if platform.machine().lower().startswith('arm'):
+                    gecko = lib_prefix + 'lib/geckodriver-arm-v0.23'
+                else:
+                    gecko = lib_prefix + 'lib/geckodriver-linux' + gecko
+            elif platform.system() == 'Darwin':
+                gecko = lib_prefix + 'lib/geckodriver-macos'
+            else:
+                gecko = lib_prefix + 'lib/geckodriver-win' + gecko + '.exe'
+            profile = webdriver.FirefoxProfile()
+            if user_agent != '':
+                profile.set_preference('general.useragent.override', user_agent)
+            profile.set_preference('intl.accept_languages', language)
+            run.log.append(Log(message='Browser accept language set to "' + language + '"'))
+            if geo_lat != 0.0 and geo_lon != 0.0:
+                geo_uri = 'data:application/json,{"location": {"lat": ' + str(geo_lat) + ', "lng": ' \
+                          + str(geo_lon) + '}, "accuracy": 10}'
+                profile.set_preference('geo.enabled', True)
+                profile.set_preference('geo.provider.use_corelocation', False)
+                profile.set_preference('geo.provider.use_gpsd', False)
+                profile.set_preference('geo.provider.use_mls', False)
+                profile.set_preference('geo.provider.ms-windows-location', False)
+                profile.set_preference('geo.prompt.testing', True)
+                profile.set_preference('geo.prompt.testing.allow', True)
+                profile.set_preference('geo.provider.testing', True)
+                profile.set_preference('geo.provider.network.url', geo_uri)
+                profile.set_preference('geo.wifi.uri', geo_uri)
+                run.log.append(Log(message='Firefox geolocation set to ' + str(geo_lat) + ', ' + str(geo_lon)))
+
+            if executable == '':
+                self.__selenium = webdriver.Firefox(firefox_profile=profile, executable_path=gecko)
+                run.log.append(Log(message='Browser instance set to Firefox with Geckodriver "' + gecko + '"'))
+            else:
+                self.__selenium = webdriver.Firefox(firefox_profile=profile,
+                                                    executable_path=gecko,
+                                                    firefox_binary=FirefoxBinary(executable))
+                run.log.append(Log(message='Browser instance set to Firefox with Geckodriver "' + gecko +
+                                           '" and executable path "' + executable + '"'))
+        elif browser == 'Chrome':
+            if executable == '':
+                if platform.system() == 'Linux':
+                    if platform.machine().lower().startswith('arm'):
+                        executable = lib_prefix + 'lib/chromedriver-arm'
+                    else:
+                        executable = lib_prefix + 'lib/chromedriver-linux'
+                elif platform.system() == 'Darwin':
+                    executable = lib_prefix + 'lib/chromedriver-macos'
+                else:
+                    executable = lib_prefix + 'lib/chromedriver-win.exe'
+            options = webdriver.ChromeOptions()
+            if user_agent != '':
+                options.add_argument('--user-agent=' + user_agent)
+            options.add_argument('--lang=' + language)
+            options.add_experimental_option('prefs', {'intl.accept_languages': language})
+            run.log.append(Log(message='Browser accept language set to "' + language + '"'))
+            self.__selenium = webdriver.Chrome(executable_path=executable, chrome_options=options)
+            run.log.append(Log(message='Browser instance set to Chrome with ChromeDriver "' + executable + '"'))
+        else:
+            webdriver_class = getattr(webdriver, browser)
+            if executable == '':
+                self.__selenium = webdriver_class()
+                run.log.append(Log(message='Browser instance set to ' + browser))
+            else:
+                self.__selenium = webdriver.Chrome(executable_path=executable)
+                run.log.append(Log(message='Browser instance set to ' + browser + ' with executable path "' +
+                                           executable + '"'))
+        self.__selenium.set_window_size(browser_width, browser_height)
+        run.log.append(Log(message='Browser size set to ' + str(browser_width) + ' by ' +
+                                   str(browser_height) + ' pixel'))
+        self.__session = BrowserSession(self.__selenium, self.__selenium.execute_script('return navigator.userAgent'))
+
+    def __get_pool_size(self):
+        try:
+            return int(self.__config.get('Instance', 'BrowserPool', fallback=0))
+        except ValueError:
+            return 0
+
+    def __reset_browser(self):
+        """
+        Remove everything a run has left behind (i.e., cookies, storage, cache, history, and additional windows) so
+        that a warm browser session can be reused by another run.
+        :return:
+        """
+        current_url = self.__selenium.current_url
+        if current_url.startswith('http'):
+            self.__origins.add(self.__get_origin(current_url))
+            self.__selenium.execute_script('try { window.localStorage.clear(); window.sessionStorage.clear(); } '
+                                           'catch(e) {}')
+        self.__selenium.delete_all_cookies()
+        if isinstance(self.__selenium, webdriver.Firefox):
+            with self.__selenium.context(self.__selenium.CONTEXT_CHROME):
+                self.__selenium.execute_async_script(
+                    'var callback = arguments[arguments.length - 1];' +
+                    'Services.clearData.deleteData(' +
+                    'Ci.nsIClearDataService.CLEAR_COOKIES | Ci.nsIClearDataService.CLEAR_DOM_STORAGES | ' +
+                    'Ci.nsIClearDataService.CLEAR_HISTORY | Ci.nsIClearDataService.CLEAR_ALL_CACHES, ' +
+                    'function() { callback(true); });'
+                )
+        elif isinstance(self.__selenium, webdriver.Chrome):
+            self.__selenium.execute_cdp_cmd('Network.clearBrowserCookies', {})
+            self.__selenium.execute_cdp_cmd('Network.clearBrowserCache', {})
+            for origin in self.__origins:
+                self.__selenium.execute_cdp_cmd('Storage.clearDataForOrigin', {'origin': origin, 'storageTypes': 'all'})
+        self.__origins = set()
+        # a fresh window comes without any back/forward history
+        old_windows = self.__selenium.window_handles
+        self.__selenium.execute_script('window.open("about:blank", "_blank");')
+        new_windows = [window for window in self.__selenium.window_handles if window not in old_windows]
+        if len(new_windows) == 0:
+            raise WebDriverException('Browser history could not be reset')
+        for window in old_windows:
+            self.__selenium.switch_to.window(window)
+            self.__selenium.close()
+        self.__selenium.switch_to.window(new_windows[0])
+        self.__selenium.set_window_size(self.__pool_key[6], self.__pool_key[7])
+
+    def __release_to_pool(self):
+        """
+        Reset the browser and keep it warm for the next run, unless pooling is disabled or it has been used too often.
+        :return: True if the browser has been kept
+        """
+        max_uses = int(self.__config.get('Instance', 'BrowserPoolMaxUses', fallback=25))
+        if self.__session is None or self.__get_pool_size() <= 0 or self.__session.uses + 1 >= max_uses:
+            return False
+        try:
+            self.__reset_browser()
+        except WebDriverException:
+            return False
+        self.__session.uses = self.__session.uses + 1
+        return browser_pool.release(self.__pool_key, self.__session, self.__get_pool_size())
+
+    @staticmethod
+    def __get_origin(url):
+        parsed_url = urllib.parse.urlparse(url)
+        return parsed_url.scheme + '://' + parsed_url.netloc
+
     def close_session(self, run):
         from scrapebot.database import Log
         if self.__selenium is not None:
@@ -214,14 +445,13 @@ class Emulator:
                 if order is not None:
                     order.cookies_from_last_run = json.dumps(self.__selenium.get_cookies())
                     run.log.append(Log(message='Cookies stored'))
+            if self.__release_to_pool():
+                self.__selenium = None
+                self.__session = None
+                run.log.append(Log(message='Browser session reset and kept warm for upcoming runs'))
+                return True
             self.__selenium.quit()
             run.log.append(Log(message='Browser session closed'))
-        if self.__display is not None:
-            try:
-                self.__display.stop()
-                run.log.append(Log(message='Virtual display closed'))
-            except:
-                return False
 
     def __get_first_elem_or_none(self, element):
         if element is None:
@@ -239,320 +469,455 @@ class Emulator:
         else:
             return [elements]
 
+    @staticmethod
+    def get_bulk_values(selenium, elements, script, fallback, *arguments):
+        """
+        Retrieve values of many elements with one single script execution (i.e., browser round trip) per bulk_size
+        elements instead of one round trip per element
+        :param selenium:
+        :param elements:
+        :param script: JavaScript code that returns one value per element in arguments[0]
+        :param fallback: function to retrieve a single element's value in case the script fails
+        :param arguments: further arguments passed to the script
+        :return:
+        """
+        values = []
+        for i in range(0, len(elements), Emulator.bulk_size):
+            chunk = elements[i:i+Emulator.bulk_size]
+            try:
+                chunk_values = selenium.execute_script(script, chunk, *arguments)
+            except WebDriverException:
+                chunk_values = None
+            if not isinstance(chunk_values, list) or len(chunk_values) != len(chunk):
+                chunk_values = [fallback(element) for element in chunk]
+            values.extend(chunk_values)
+        return values
+
     def __handle(self, run, step, prior_step=None):
-        from scrapebot.database import Log, LogTypeEnum, RunStatusEnum, Data
-        if step.type.name == 'log':
-            run.log.append(Log(message=step.value))
-        elif step.type.name == 'data':
-            run.data.append(Data(step=step, value=step.value))
-        elif step.type.name == 'post_all_data' or step.type.name == 'post_previous_step_data':
-            post_data = {}
-            for data in run.data:
-                if step.type.name == 'post_all_data' or (prior_step is not None and data.step.uid is prior_step.uid):
-                    post_data['data[' + str(len(post_data)) + ']'] = data.value
-            if len(post_data) > 0:
-                http = urllib3.PoolManager()
-                response = http.request('POST', step.value, fields=post_data)
-                run.log.append(Log(message='Posted %d data values collected thus far to %s (HTTP status was %d)' %
-                                           (len(post_data), step.value, response.status)))
-            else:
-                run.log.append(Log(message='Attempted to post data to %s but nothing was stored so far' % step.value))
-        elif step.type.name == 'execute_js':
-            return_value = self.__selenium.execute_script(step.value)
-            if return_value:
-                run.data.append(Data(step=step, value=return_value))
-                run.log.append(Log(message='Ran some JavaScript code, return values stored as data'))
-            else:
-                run.log.append(Log(message='Ran JavaScript code, no return values retrieved'))
-        elif step.type.name == 'navigate':
-            self.__selenium.get(step.value)
-            if run.recipe.cookies:
-                order = run.get_recipe_order()
-                if order is not None:
-                    cookies = json.loads(order.cookies_from_last_run)
-                    for cookie in cookies:
-                        self.__selenium.add_cookie(cookie)
-                    run.log.append(Log(message='Cookies loaded for browser session'))
-                    self.__selenium.get(step.value)
-            run.log.append(Log(message='Navigated to "' + step.value + '"'))
-        elif step.type.name == 'click':
-            element = self.__get_first_elem_or_none(prior_step.temp_result)
-            if element is None:
-                run.log.append(Log(message='No element available for clicking', type=LogTypeEnum.warning))
-            else:
-                element.click()
-                run.log.append(Log(message='Clicked on previously retrieved element'))
-        elif step.type.name == 'submit':
-            element = self.__get_first_elem_or_none(prior_step.temp_result)
-            if element is None:
-                run.log.append(Log(message='No element available for submitting', type=LogTypeEnum.warning))
-            else:
-                element.submit()
-                run.log.append(Log(message='Submitted on previously retrieved element'))
-                prior_step.temp_result = None
-                step.temp_result = None
-                run.log.append(Log(message='Removed previously retrieved element as it may disappear after submit'))
-        elif step.type.name == 'pause':
-            pause = int(step.value)
-            pause = random.uniform(pause*.75, pause*1.25)
-            time.sleep(pause)
-            run.log.append(Log(message='Paused for ' + str(round(pause, 1)) + ' seconds'))
-        elif step.type.name == 'write':
-            element = self.__get_first_elem_or_none(prior_step.temp_result)
-            if element is None:
-                run.log.append(Log(message='No element available for typing', type=LogTypeEnum.warning))
-            else:
-                element.send_keys(step.value)
-                run.log.append(Log(message='Typed "' + step.value + '" on previously retrieved element'))
-        elif step.type.name == 'write_slowly':
-            element = self.__get_first_elem_or_none(prior_step.temp_result)
-            if element is None:
-                run.log.append(Log(message='No element available for typing', type=LogTypeEnum.warning))
-            else:
-                for char in step.value:
-                    element.send_keys(char)
-                    time.sleep(random.uniform(0.1, 1))
-                run.log.append(Log(message='Typed "' + step.value + '" very slowly on previously retrieved element'))
-        elif step.type.name == 'scroll_to':
+        from scrapebot.database import RunStatusEnum
+        handler = step_handlers.get(step.type)
+        if handler is None:
+            return RunStatusEnum.config_error
+        handler(self, run, step, prior_step)
+        return RunStatusEnum.success
+
+    @handles(RecipeStepTypeEnum.log)
+    def __handle_log(self, run, step, prior_step=None):
+        from scrapebot.database import Log
+        run.log.append(Log(message=step.value))
+
+    @handles(RecipeStepTypeEnum.data)
+    def __handle_data(self, run, step, prior_step=None):
+        from scrapebot.database import Data
+        run.data.append(Data(step=step, value=step.value))
+
+    @handles(RecipeStepTypeEnum.post_all_data, RecipeStepTypeEnum.post_previous_step_data)
+    def __handle_post_all_data(self, run, step, prior_step=None):
+        from scrapebot.database import Log
+        post_data = {}
+        for data in run.get_all_data():
+            if step.type.name == 'post_all_data' or (prior_step is not None and data.step.uid == prior_step.uid):
+                post_data['data[' + str(len(post_data)) + ']'] = data.value
+        if len(post_data) > 0:
+            http = urllib3.PoolManager()
+            response = http.request('POST', step.value, fields=post_data)
+            run.log.append(Log(message='Posted %d data values collected thus far to %s (HTTP status was %d)' %
+                                       (len(post_data), step.value, response.status)))
+        else:
+            run.log.append(Log(message='Attempted to post data to %s but nothing was stored so far' % step.value))
+
+    @handles(RecipeStepTypeEnum.execute_js)
+    def __handle_execute_js(self, run, step, prior_step=None):
+        from scrapebot.database import Log, Data
+        return_value = self.__selenium.execute_script(step.value)
+        if return_value:
+            run.data.append(Data(step=step, value=return_value))
+            run.log.append(Log(message='Ran some JavaScript code, return values stored as data'))
+        else:
+            run.log.append(Log(message='Ran JavaScript code, no return values retrieved'))
+
+    @handles(RecipeStepTypeEnum.navigate)
+    def __handle_navigate(self, run, step, prior_step=None):
+        from scrapebot.database import Log
+        self.__selenium.get(step.value)
+        self.__origins.add(self.__get_origin(step.value))
+        if run.recipe.cookies:
+            order = run.get_recipe_order()
+            if order is not None:
+                cookies = json.loads(order.cookies_from_last_run)
+                for cookie in cookies:
+                    self.__selenium.add_cookie(cookie)
+                run.log.append(Log(message='Cookies loaded for browser session'))
+                self.__selenium.get(step.value)
+        run.log.append(Log(message='Navigated to "' + step.value + '"'))
+
+    @handles(RecipeStepTypeEnum.click)
+    def __handle_click(self, run, step, prior_step=None):
+        from scrapebot.database import Log, LogTypeEnum
+        element = self.__get_first_elem_or_none(prior_step.temp_result)
+        if element is None:
+            run.log.append(Log(message='No element available for clicking', type=LogTypeEnum.warning))
+        else:
+            element.click()
+            run.log.append(Log(message='Clicked on previously retrieved element'))
+
+    @handles(RecipeStepTypeEnum.submit)
+    def __handle_submit(self, run, step, prior_step=None):
+        from scrapebot.database import Log, LogTypeEnum
+        element = self.__get_first_elem_or_none(prior_step.temp_result)
+        if element is None:
+            run.log.append(Log(message='No element available for submitting', type=LogTypeEnum.warning))
+        else:
+            element.submit()
+            run.log.append(Log(message='Submitted on previously retrieved element'))
+            prior_step.temp_result = None
+            step.temp_result = None
+            run.log.append(Log(message='Removed previously retrieved element as it may disappear after submit'))
+
+    @handles(RecipeStepTypeEnum.pause)
+    def __handle_pause(self, run, step, prior_step=None):
+        from scrapebot.database import Log
+        pause = int(step.value)
+        pause = random.uniform(pause*.75, pause*1.25)
+        time.sleep(pause)
+        run.log.append(Log(message='Paused for ' + str(round(pause, 1)) + ' seconds'))
+
+    @handles(RecipeStepTypeEnum.write)
+    def __handle_write(self, run, step, prior_step=None):
+        from scrapebot.database import Log, LogTypeEnum
+        element = self.__get_first_elem_or_none(prior_step.temp_result)
+        if element is None:
+            run.log.append(Log(message='No element available for typing', type=LogTypeEnum.warning))
+        else:
+            element.send_keys(step.value)
+            run.log.append(Log(message='Typed "' + step.value + '" on previously retrieved element'))
+
+    @handles(RecipeStepTypeEnum.write_slowly)
+    def __handle_write_slowly(self, run, step, prior_step=None):
+        from scrapebot.database import Log, LogTypeEnum
+        element = self.__get_first_elem_or_none(prior_step.temp_result)
+        if element is None:
+            run.log.append(Log(message='No element available for typing', type=LogTypeEnum.warning))
+        else:
+            for char in step.value:
+                element.send_keys(char)
+                time.sleep(random.uniform(0.1, 1))
+            run.log.append(Log(message='Typed "' + step.value + '" very slowly on previously retrieved element'))
+
+    @handles(RecipeStepTypeEnum.scroll_to)
+    def __handle_scroll_to(self, run, step, prior_step=None):
+        from scrapebot.database import Log
+        scroll_to = -1
+        try:
+            scroll_to = int(step.value)
+            if scroll_to == 0:
+                raise ValueError
+            run.log.append(Log(message='Scrolling for ' + str(scroll_to) + ' pixels'))
+        except ValueError:
             scroll_to = -1
-            try:
-                scroll_to = int(step.value)
-                if scroll_to == 0:
-                    raise ValueError
-                run.log.append(Log(message='Scrolling for ' + str(scroll_to) + ' pixels'))
-            except ValueError:
-                scroll_to = -1
-                run.log.append(Log(message='Scrolling to the bottom of the page'))
-            scroll_step = 10 if scroll_to > 10 or scroll_to == -1 else scroll_to
-            scroll_js = 'function scroll_and_wait(step, scrolled, last_pos, limit) {' \
-                'if(window.pageYOffset > last_pos && (scrolled <= limit || limit < 0)) {' + \
-                'last_pos = window.pageYOffset;' + \
-                'window.scrollBy(0, step);' + \
-                'setTimeout(scroll_and_wait, 20, step, (scrolled+step), last_pos, limit);' + \
-                '}' + \
-                '}' + \
-                'scroll_and_wait(' + str(scroll_step) + ', 0, -1, ' + str(scroll_to) + ')'
-            self.__selenium.execute_script(scroll_js)
-        elif step.type.name == 'go_back':
-            self.__selenium.back()
-            run.log.append(Log(message='Navigated back one page'))
-        elif step.type.name == 'go_forward':
-            self.__selenium.forward()
-            run.log.append(Log(message='Navigated forward one page'))
-        elif step.type.name == 'screenshot' or step.type.name == 'sometimes_screenshot':
-            screenshot = True
-            if step.type.name == 'sometimes_screenshot':
-                latest_runs = run.recipe.get_latest_runs(20, run.instance)
-                for late_run in latest_runs:
-                    if screenshot:
-                        for single_data in late_run.data:
-                            if single_data.step is step and single_data.value != '':
-                                screenshot = False
-                                run.log.append(Log(message='No screenshot taken this time'))
-                                break
-            if screenshot:
-                # Selenium cannot take full-size screenshots, so here's a little workaround
-                # @see https://stackoverflow.com/a/52572919
-                original_size = self.__selenium.get_window_size()
-                required_width = self.__selenium.execute_script('return document.body.parentNode.scrollWidth')
-                required_height = self.__selenium.execute_script('return document.body.parentNode.scrollHeight')
-                self.__selenium.set_window_size(required_width, required_height)
-                screenshot_name = self.__store_screenshot(self.__selenium.find_element_by_tag_name('body'), run, step)
-                self.__selenium.set_window_size(original_size['width'], original_size['height'])
-                run.log.append(Log(message='Screenshot stored as ' + screenshot_name + ' and referenced as data'))
-        elif step.type.name == 'element_screenshot':
-            element = self.__get_first_elem_or_none(prior_step.temp_result)
-            if element is None:
-                run.log.append(Log(message='No element available to screenshot', type=LogTypeEnum.warning))
-            else:
-                screenshot_name = self.__store_screenshot(element, run, step)
-                run.log.append(Log(message='Element screenshot stored as ' + screenshot_name +
-                                           ' and referenced as data'))
-        elif step.type.name == 'find_by_id':
-            try:
-                step.temp_result = self.__selenium.find_element_by_id(step.value)
-                run.data.append(Data(step=step, value='1'))
-                run.log.append(Log(message='Element with ID "' + step.value + '" retrieved (count stored as data)'))
-            except NoSuchElementException:
-                step.temp_result = None
-                run.data.append(Data(step=step, value='0'))
-                run.log.append(Log(message='Element with ID "' + step.value + '" not found (stored 0 as data)',
-                                   type=LogTypeEnum.warning))
-        elif step.type.name == 'find_by_name':
-            try:
-                step.temp_result = self.__selenium.find_element_by_name(step.value)
-                run.data.append(Data(step=step, value='1'))
-                run.log.append(Log(message='Element with name "' + step.value + '" retrieved (count stored as data)'))
-            except NoSuchElementException:
-                step.temp_result = None
-                run.data.append(Data(step=step, value='0'))
-                run.log.append(Log(message='No element with name "' + step.value + '" found (stored 0 as data)',
-                                   type=LogTypeEnum.warning))
-        elif step.type.name == 'find_by_class':
-            try:
-                step.temp_result = self.__selenium.find_elements_by_class_name(step.value)
-                count = str(len(step.temp_result))
-                run.data.append(Data(step=step, value=count))
-                run.log.append(Log(message='Retrieved ' + count + ' element(s) with class "' + step.value +
-                                           '" (count stored as data)'))
-            except NoSuchElementException:
-                step.temp_result = None
-                run.data.append(Data(step=step, value='0'))
-                run.log.append(Log(message='No element with class "' + step.value + '" found (stored 0 as data)',
-                                   type=LogTypeEnum.warning))
-        elif step.type.name == 'find_by_tag':
-            try:
-                step.temp_result = self.__selenium.find_elements_by_tag_name(step.value)
-                count = str(len(step.temp_result))
-                run.data.append(Data(step=step, value=count))
-                run.log.append(Log(message='Retrieved ' + count + ' "' + step.value + '" element(s) '
-                                                                                      '(count stored as data)'))
-            except NoSuchElementException:
-                step.temp_result = None
-                run.data.append(Data(step=step, value='0'))
-                run.log.append(Log(message='No "' + step.value + '" element found (stored 0 as data)',
-                                   type=LogTypeEnum.warning))
-        elif step.type.name == 'find_by_link':
-            try:
-                step.temp_result = self.__selenium.find_elements_by_link_text(step.value)
-                count = str(len(step.temp_result))
-                run.data.append(Data(step=step, value=count))
-                run.log.append(Log(message='Retrieved ' + count + ' element(s) with link "' + step.value +
-                                           '" (count stored as data)'))
-            except NoSuchElementException:
-                step.temp_result = None
-                run.data.append(Data(step=step, value='0'))
-                run.log.append(Log(message='No element with link "' + step.value + '" found (stored 0 as data)',
-                                   type=LogTypeEnum.warning))
-        elif step.type.name == 'find_by_link_partial':
-            try:
-                step.temp_result = self.__selenium.find_elements_by_partial_link_text(step.value)
-                count = str(len(step.temp_result))
-                run.data.append(Data(step=step, value=count))
-                run.log.append(Log(message='Retrieved ' + count + ' element(s) with link partially equal to "' +
-                                           step.value + '" (count stored as data)'))
-            except NoSuchElementException:
-                step.temp_result = None
-                run.data.append(Data(step=step, value='0'))
-                run.log.append(Log(message='No element with link containing "' + step.value +
-                                           '" found (stored 0 as data)', type=LogTypeEnum.warning))
-        elif step.type.name == 'find_by_css':
-            try:
-                step.temp_result = self.__selenium.find_elements_by_css_selector(step.value)
-                count = str(len(step.temp_result))
-                run.data.append(Data(step=step, value=count))
-                run.log.append(Log(message='Retrieved ' + count + ' element(s) with CSS selector "' + step.value +
-                                           '" (count stored as data)'))
-            except NoSuchElementException:
-                step.temp_result = None
-                run.data.append(Data(step=step, value='0'))
-                run.log.append(Log(message='No element matching CSS selector "' + step.value +
-                                           '" found (stored 0 as data)', type=LogTypeEnum.warning))
-        elif step.type.name == 'find_by_xpath':
-            try:
-                step.temp_result = self.__selenium.find_elements_by_xpath(step.value)
-                count = str(len(step.temp_result))
-                run.data.append(Data(step=step, value=count))
-                run.log.append(Log(message='Retrieved ' + count + ' element(s) with XPath "' + step.value +
-                                           '" (count stored as data)'))
-            except NoSuchElementException:
-                step.temp_result = None
-                run.data.append(Data(step=step, value='0'))
-                run.log.append(Log(message='No element from XPath "' + step.value + '" found (stored 0 as data)',
-                                   type=LogTypeEnum.warning))
-        elif step.type.name == 'random_select':
-            if prior_step.temp_result is None:
-                run.log.append(Log(message='No element from previous step found, hence no element randomly selected',
-                                   type=LogTypeEnum.warning))
-            elif isinstance(prior_step.temp_result, list):
-                count = len(prior_step.temp_result)
-                if count > 0:
-                    i = random.randint(0, count-1)
-                    step.temp_result = prior_step.temp_result[i]
-                    run.data.append(Data(step=step, value=(i+1)))
-                    run.log.append(Log(message='Randomly selected element ' + str(i+1) + '/' + str(count) +
-                                               ' (stored ' + str(i+1) + ' as data)'))
-                else:
-                    run.log.append(
-                        Log(message='No element from previous step found, hence no element randomly selected',
-                            type=LogTypeEnum.warning)
-                    )
-            else:
-                step.temp_result = prior_step.temp_result
-                run.data.append(Data(step=step, value='0'))
-                run.log.append(Log(message='Only one element from previous step found, so this was selected "randomly"'))
-        elif step.type.name == 'get_text':
-            element = self.__get_first_elem_or_none(prior_step.temp_result)
-            if element is None:
-                run.log.append(Log(message='No element available to get text from', type=LogTypeEnum.warning))
-            else:
-                value = element.text
-                run.data.append(Data(step=step, value=value))
-                run.log.append(Log(message='Retrieved and stored text "' + value[:15] + '..." of prior element'))
-        elif step.type.name == 'get_texts':
-            elements = self.__get_elem_list(prior_step.temp_result)
-            for element in elements:
-                run.data.append(Data(step=step, value=element.text))
-            run.log.append(Log(message='Stored text from ' + str(len(elements)) + ' element(s), each as separate data'))
-        elif step.type.name == 'get_value':
-            element = self.__get_first_elem_or_none(prior_step.temp_result)
-            if element is None:
-                run.log.append(Log(message='No element available to get a value from', type=LogTypeEnum.warning))
-            else:
-                value = str(element.get_attribute('value'))
-                run.data.append(Data(step=step, value=value))
-                run.log.append(Log(message='Retrieved and stored value "' + value[:15] + '..." of prior element'))
-        elif step.type.name == 'get_values':
-            elements = self.__get_elem_list(prior_step.temp_result)
-            for element in elements:
-                run.data.append(Data(step=step, value=str(element.get_attribute('value'))))
-            run.log.append(Log(message='Stored values from ' + str(len(elements)) +
-                                       ' element(s), each as separate data'))
-        elif step.type.name == 'get_attribute':
-            element = self.__get_first_elem_or_none(prior_step.temp_result)
-            if element is None:
-                run.log.append(Log(message='No element available to get the attribute "' + step.value +
-                                           '" from', type=LogTypeEnum.warning))
-            else:
-                value = str(element.get_attribute(step.value))
-                run.data.append(Data(step=step, value=value))
-                run.log.append(Log(message='Retrieved and stored value "' + value[:15] + '..." of attribute "' +
-                                           step.value + '" of prior element'))
-        elif step.type.name == 'get_attributes':
-            elements = self.__get_elem_list(prior_step.temp_result)
-            for element in elements:
-                run.data.append(Data(step=step, value=str(element.get_attribute(step.value))))
-            run.log.append(Log(message='Stored "' + step.value + '" values from ' + str(len(elements)) +
-                                       ' element(s), each as separate data'))
-        elif step.type.name == 'get_element_count':
-            if prior_step.temp_result is None:
-                run.data.append(Data(step=step, value='0'))
-                run.log.append(Log(message='No previously retrieved elements found, thus stored "0"'))
-            elif isinstance(prior_step.temp_result, list):
-                value = str(len(prior_step.temp_result))
-                run.data.append(Data(step=step, value=value))
-                run.log.append(Log(message='Counted and stored ' + value + ' element(s)'))
+            run.log.append(Log(message='Scrolling to the bottom of the page'))
+        scroll_step = 10 if scroll_to > 10 or scroll_to == -1 else scroll_to
+        scroll_js = 'function scroll_and_wait(step, scrolled, last_pos, limit) {' \
+            'if(window.pageYOffset > last_pos && (scrolled <= limit || limit < 0)) {' + \
+            'last_pos = window.pageYOffset;' + \
+            'window.scrollBy(0, step);' + \
+            'setTimeout(scroll_and_wait, 20, step, (scrolled+step), last_pos, limit);' + \
+            '}' + \
+            '}' + \
+            'scroll_and_wait(' + str(scroll_step) + ', 0, -1, ' + str(scroll_to) + ')'
+        self.__selenium.execute_script(scroll_js)
+
+    @handles(RecipeStepTypeEnum.go_back)
+    def __handle_go_back(self, run, step, prior_step=None):
+        from scrapebot.database import Log
+        self.__selenium.back()
+        run.log.append(Log(message='Navigated back one page'))
+
+    @handles(RecipeStepTypeEnum.go_forward)
+    def __handle_go_forward(self, run, step, prior_step=None):
+        from scrapebot.database import Log
+        self.__selenium.forward()
+        run.log.append(Log(message='Navigated forward one page'))
+
+    @handles(RecipeStepTypeEnum.screenshot, RecipeStepTypeEnum.sometimes_screenshot)
+    def __handle_screenshot(self, run, step, prior_step=None):
+        from scrapebot.database import Log
+        screenshot = True
+        if step.type.name == 'sometimes_screenshot':
+            latest_runs = run.recipe.get_latest_runs(20, run.instance)
+            for late_run in latest_runs:
+                if screenshot:
+                    for single_data in late_run.data:
+                        if single_data.step is step and single_data.value != '':
+                            screenshot = False
+                            run.log.append(Log(message='No screenshot taken this time'))
+                            break
+        if screenshot:
+            # Selenium cannot take full-size screenshots, so here's a little workaround
+            # @see https://stackoverflow.com/a/52572919
+            original_size = self.__selenium.get_window_size()
+            required_width = self.__selenium.execute_script('return document.body.parentNode.scrollWidth')
+            required_height = self.__selenium.execute_script('return document.body.parentNode.scrollHeight')
+            self.__selenium.set_window_size(required_width, required_height)
+            screenshot_name = self.__store_screenshot(self.__selenium.find_element_by_tag_name('body'), run, step)
+            self.__selenium.set_window_size(original_size['width'], original_size['height'])
+            run.log.append(Log(message='Screenshot stored as ' + screenshot_name + ' and referenced as data'))
+
+    @handles(RecipeStepTypeEnum.element_screenshot)
+    def __handle_element_screenshot(self, run, step, prior_step=None):
+        from scrapebot.database import Log, LogTypeEnum
+        element = self.__get_first_elem_or_none(prior_step.temp_result)
+        if element is None:
+            run.log.append(Log(message='No element available to screenshot', type=LogTypeEnum.warning))
+        else:
+            screenshot_name = self.__store_screenshot(element, run, step)
+            run.log.append(Log(message='Element screenshot stored as ' + screenshot_name +
+                                       ' and referenced as data'))
+
+    @handles(RecipeStepTypeEnum.find_by_id)
+    def __handle_find_by_id(self, run, step, prior_step=None):
+        from scrapebot.database import Log, LogTypeEnum, Data
+        try:
+            step.temp_result = self.__selenium.find_element_by_id(step.value)
+            run.data.append(Data(step=step, value='1'))
+            run.log.append(Log(message='Element with ID "' + step.value + '" retrieved (count stored as data)'))
+        except NoSuchElementException:
+            step.temp_result = None
+            run.data.append(Data(step=step, value='0'))
+            run.log.append(Log(message='Element with ID "' + step.value + '" not found (stored 0 as data)',
+                               type=LogTypeEnum.warning))
+
+    @handles(RecipeStepTypeEnum.find_by_name)
+    def __handle_find_by_name(self, run, step, prior_step=None):
+        from scrapebot.database import Log, LogTypeEnum, Data
+        try:
+            step.temp_result = self.__selenium.find_element_by_name(step.value)
+            run.data.append(Data(step=step, value='1'))
+            run.log.append(Log(message='Element with name "' + step.value + '" retrieved (count stored as data)'))
+        except NoSuchElementException:
+            step.temp_result = None
+            run.data.append(Data(step=step, value='0'))
+            run.log.append(Log(message='No element with name "' + step.value + '" found (stored 0 as data)',
+                               type=LogTypeEnum.warning))
+
+    @handles(RecipeStepTypeEnum.find_by_class)
+    def __handle_find_by_class(self, run, step, prior_step=None):
+        from scrapebot.database import Log, LogTypeEnum, Data
+        try:
+            step.temp_result = self.__selenium.find_elements_by_class_name(step.value)
+            count = str(len(step.temp_result))
+            run.data.append(Data(step=step, value=count))
+            run.log.append(Log(message='Retrieved ' + count + ' element(s) with class "' + step.value +
+                                       '" (count stored as data)'))
+        except NoSuchElementException:
+            step.temp_result = None
+            run.data.append(Data(step=step, value='0'))
+            run.log.append(Log(message='No element with class "' + step.value + '" found (stored 0 as data)',
+                               type=LogTypeEnum.warning))
+
+    @handles(RecipeStepTypeEnum.find_by_tag)
+    def __handle_find_by_tag(self, run, step, prior_step=None):
+        from scrapebot.database import Log, LogTypeEnum, Data
+        try:
+            step.temp_result = self.__selenium.find_elements_by_tag_name(step.value)
+            count = str(len(step.temp_result))
+            run.data.append(Data(step=step, value=count))
+            run.log.append(Log(message='Retrieved ' + count + ' "' + step.value + '" element(s) '
+                                                                                  '(count stored as data)'))
+        except NoSuchElementException:
+            step.temp_result = None
+            run.data.append(Data(step=step, value='0'))
+            run.log.append(Log(message='No "' + step.value + '" element found (stored 0 as data)',
+                               type=LogTypeEnum.warning))
+
+    @handles(RecipeStepTypeEnum.find_by_link)
+    def __handle_find_by_link(self, run, step, prior_step=None):
+        from scrapebot.database import Log, LogTypeEnum, Data
+        try:
+            step.temp_result = self.__selenium.find_elements_by_link_text(step.value)
+            count = str(len(step.temp_result))
+            run.data.append(Data(step=step, value=count))
+            run.log.append(Log(message='Retrieved ' + count + ' element(s) with link "' + step.value +
+                                       '" (count stored as data)'))
+        except NoSuchElementException:
+            step.temp_result = None
+            run.data.append(Data(step=step, value='0'))
+            run.log.append(Log(message='No element with link "' + step.value + '" found (stored 0 as data)',
+                               type=LogTypeEnum.warning))
+
+    @handles(RecipeStepTypeEnum.find_by_link_partial)
+    def __handle_find_by_link_partial(self, run, step, prior_step=None):
+        from scrapebot.database import Log, LogTypeEnum, Data
+        try:
+            step.temp_result = self.__selenium.find_elements_by_partial_link_text(step.value)
+            count = str(len(step.temp_result))
+            run.data.append(Data(step=step, value=count))
+            run.log.append(Log(message='Retrieved ' + count + ' element(s) with link partially equal to "' +
+                                       step.value + '" (count stored as data)'))
+        except NoSuchElementException:
+            step.temp_result = None
+            run.data.append(Data(step=step, value='0'))
+            run.log.append(Log(message='No element with link containing "' + step.value +
+                                       '" found (stored 0 as data)', type=LogTypeEnum.warning))
+
+    @handles(RecipeStepTypeEnum.find_by_css)
+    def __handle_find_by_css(self, run, step, prior_step=None):
+        from scrapebot.database import Log, LogTypeEnum, Data
+        try:
+            step.temp_result = self.__selenium.find_elements_by_css_selector(step.value)
+            count = str(len(step.temp_result))
+            run.data.append(Data(step=step, value=count))
+            run.log.append(Log(message='Retrieved ' + count + ' element(s) with CSS selector "' + step.value +
+                                       '" (count stored as data)'))
+        except NoSuchElementException:
+            step.temp_result = None
+            run.data.append(Data(step=step, value='0'))
+            run.log.append(Log(message='No element matching CSS selector "' + step.value +
+                                       '" found (stored 0 as data)', type=LogTypeEnum.warning))
+
+    @handles(RecipeStepTypeEnum.find_by_xpath)
+    def __handle_find_by_xpath(self, run, step, prior_step=None):
+        from scrapebot.database import Log, LogTypeEnum, Data
+        try:
+            step.temp_result = self.__selenium.find_elements_by_xpath(step.value)
+            count = str(len(step.temp_result))
+            run.data.append(Data(step=step, value=count))
+            run.log.append(Log(message='Retrieved ' + count + ' element(s) with XPath "' + step.value +
+                                       '" (count stored as data)'))
+        except NoSuchElementException:
+            step.temp_result = None
+            run.data.append(Data(step=step, value='0'))
+            run.log.append(Log(message='No element from XPath "' + step.value + '" found (stored 0 as data)',
+                               type=LogTypeEnum.warning))
+
+    @handles(RecipeStepTypeEnum.random_select)
+    def __handle_random_select(self, run, step, prior_step=None):
+        from scrapebot.database import Log, LogTypeEnum, Data
+        if prior_step.temp_result is None:
+            run.log.append(Log(message='No element from previous step found, hence no element randomly selected',
+                               type=LogTypeEnum.warning))
+        elif isinstance(prior_step.temp_result, list):
+            count = len(prior_step.temp_result)
+            if count > 0:
+                i = random.randint(0, count-1)
+                step.temp_result = prior_step.temp_result[i]
+                run.data.append(Data(step=step, value=(i+1)))
+                run.log.append(Log(message='Randomly selected element ' + str(i+1) + '/' + str(count) +
+                                           ' (stored ' + str(i+1) + ' as data)'))
             else:
-                run.data.append(Data(step=step, value='1'))
-                run.log.append(Log(message='Counted and stored only 1 element'))
-        elif step.type.name == 'get_pagetitle':
-            value = self.__selenium.title
+                run.log.append(
+                    Log(message='No element from previous step found, hence no element randomly selected',
+                        type=LogTypeEnum.warning)
+                )
+        else:
+            step.temp_result = prior_step.temp_result
+            run.data.append(Data(step=step, value='0'))
+            run.log.append(Log(message='Only one element from previous step found, so this was selected "randomly"'))
+
+    @handles(RecipeStepTypeEnum.get_text)
+    def __handle_get_text(self, run, step, prior_step=None):
+        from scrapebot.database import Log, LogTypeEnum, Data
+        element = self.__get_first_elem_or_none(prior_step.temp_result)
+        if element is None:
+            run.log.append(Log(message='No element available to get text from', type=LogTypeEnum.warning))
+        else:
+            value = element.text
+            run.data.append(Data(step=step, value=value))
+            run.log.append(Log(message='Retrieved and stored text "' + value[:15] + '..." of prior element'))
+
+    @handles(RecipeStepTypeEnum.get_texts)
+    def __handle_get_texts(self, run, step, prior_step=None):
+        from scrapebot.database import Log, Data
+        elements = self.__get_elem_list(prior_step.temp_result)
+        values = self.get_bulk_values(self.__selenium, elements, self.bulk_text_script,
+                                      lambda element: element.text)
+        run.data.extend(Data(step=step, value=value) for value in values)
+        run.flush_results(False)
+        run.log.append(Log(message='Stored text from ' + str(len(elements)) + ' element(s), each as separate data'))
+
+    @handles(RecipeStepTypeEnum.get_value)
+    def __handle_get_value(self, run, step, prior_step=None):
+        from scrapebot.database import Log, LogTypeEnum, Data
+        element = self.__get_first_elem_or_none(prior_step.temp_result)
+        if element is None:
+            run.log.append(Log(message='No element available to get a value from', type=LogTypeEnum.warning))
+        else:
+            value = str(element.get_attribute('value'))
+            run.data.append(Data(step=step, value=value))
+            run.log.append(Log(message='Retrieved and stored value "' + value[:15] + '..." of prior element'))
+
+    @handles(RecipeStepTypeEnum.get_values)
+    def __handle_get_values(self, run, step, prior_step=None):
+        from scrapebot.database import Log, Data
+        elements = self.__get_elem_list(prior_step.temp_result)
+        values = self.get_bulk_values(self.__selenium, elements, self.bulk_attribute_script,
+                                      lambda element: element.get_attribute('value'), 'value')
+        run.data.extend(Data(step=step, value=str(value)) for value in values)
+        run.flush_results(False)
+        run.log.append(Log(message='Stored values from ' + str(len(elements)) +
+                                   ' element(s), each as separate data'))
+
+    @handles(RecipeStepTypeEnum.get_attribute)
+    def __handle_get_attribute(self, run, step, prior_step=None):
+        from scrapebot.database import Log, LogTypeEnum, Data
+        element = self.__get_first_elem_or_none(prior_step.temp_result)
+        if element is None:
+            run.log.append(Log(message='No element available to get the attribute "' + step.value +
+                                       '" from', type=LogTypeEnum.warning))
+        else:
+            value = str(element.get_attribute(step.value))
             run.data.append(Data(step=step, value=value))
-            run.log.append(Log(message='Retrieved and stored page title "' + value + '"'))
-        elif step.type.name == 'get_htmlsource':
-            value = self.__selenium.execute_script('return typeof(XMLSerializer) === \'undefined\' ? ' +
-                                                   'document.body.parentElement.innerHTML : ' +
-                                                   'new XMLSerializer().serializeToString(document)')
+            run.log.append(Log(message='Retrieved and stored value "' + value[:15] + '..." of attribute "' +
+                                       step.value + '" of prior element'))
+
+    @handles(RecipeStepTypeEnum.get_attributes)
+    def __handle_get_attributes(self, run, step, prior_step=None):
+        from scrapebot.database import Log, Data
+        elements = self.__get_elem_list(prior_step.temp_result)
+        values = self.get_bulk_values(self.__selenium, elements, self.bulk_attribute_script,
+                                      lambda element: element.get_attribute(step.value), step.value)
+        run.data.extend(Data(step=step, value=str(value)) for value in values)
+        run.flush_results(False)
+        run.log.append(Log(message='Stored "' + step.value + '" values from ' + str(len(elements)) +
+                                   ' element(s), each as separate data'))
+
+    @handles(RecipeStepTypeEnum.get_element_count)
+    def __handle_get_element_count(self, run, step, prior_step=None):
+        from scrapebot.database import Log, Data
+        if prior_step.temp_result is None:
+            run.data.append(Data(step=step, value='0'))
+            run.log.append(Log(message='No previously retrieved elements found, thus stored "0"'))
+        elif isinstance(prior_step.temp_result, list):
+            value = str(len(prior_step.temp_result))
             run.data.append(Data(step=step, value=value))
-            run.log.append(Log(message='Retrieved and stored HTML source code'))
-        elif step.type.name == 'unset_prior_element':
-            if step.temp_result is not None:
-                prior_step.temp_result = None
-                step.temp_result = None
-                run.log.append(Log(message='Previously retrieved element removed'))
+            run.log.append(Log(message='Counted and stored ' + value + ' element(s)'))
         else:
-            return RunStatusEnum.config_error
-        return RunStatusEnum.success
+            run.data.append(Data(step=step, value='1'))
+            run.log.append(Log(message='Counted and stored only 1 element'))
+
+    @handles(RecipeStepTypeEnum.get_pagetitle)
+    def __handle_get_pagetitle(self, run, step, prior_step=None):
+        from scrapebot.database import Log, Data
+        value = self.__selenium.title
+        run.data.append(Data(step=step, value=value))
+        run.log.append(Log(message='Retrieved and stored page title "' + value + '"'))
+
+    @handles(RecipeStepTypeEnum.get_htmlsource)
+    def __handle_get_htmlsource(self, run, step, prior_step=None):
+        from scrapebot.database import Log, Data
+        value = self.__selenium.execute_script('return typeof(XMLSerializer) === \'undefined\' ? ' +
+                                               'document.body.parentElement.innerHTML : ' +
+                                               'new XMLSerializer().serializeToString(document)')
+        run.data.append(Data(step=step, value=value))
+        run.log.append(Log(message='Retrieved and stored HTML source code'))
+
+    @handles(RecipeStepTypeEnum.unset_prior_element)
+    def __handle_unset_prior_element(self, run, step, prior_step=None):
+        from scrapebot.database import Log
+        if step.temp_result is not None:
+            prior_step.temp_result = None
+            step.temp_result = None
+            run.log.append(Log(message='Previously retrieved element removed'))
 
     def __store_screenshot(self, selenium_element, run, step):
         from scrapebot.database import Data
@@ -0,0 +1,118 @@
+import threading
+import time
+import traceback
+from collections import deque
+from sqlalchemy import select, func
+from scrapebot.database import RunEvent
+
+
+class EventFeed:
+    """
+    Recent run events, fetched from the database by a single background thread per process (rather than once per
+    client), which wakes up all clients waiting for events whenever new ones have arrived. Only the latest size events
+    are kept, so clients that fell behind further learn that they have missed some (and need to reload everything).
+    Events are passed on strictly in the order of their uids, as clients continue from the uid of the last event they
+    have received: as concurrent runners may commit events in a different order than their uids were assigned,
+    events behind missing uids are held back until the missing ones have arrived or the grace period has passed (e.g.,
+    as their transaction has been rolled back).
+    """
+    def __init__(self, get_engine, interval=2, size=1000, grace=10):
+        """
+        :param get_engine: function returning the engine to fetch events from (called once the feed is started)
+        :param interval: seconds between two look-ups of new events
+        :param size: number of events kept
+        :param grace: seconds to wait for missing uids before passing on the events behind them
+        """
+        self.__get_engine = get_engine
+        self.__engine = None
+        self.__interval = interval
+        self.__grace = grace
+        # uids of events behind missing uids and when they have first been seen
+        self.__gaps = {}
+        self.__events = deque(maxlen=size)
+        # uid of the last event seen before the oldest event kept (i.e., events up to this one are no longer known)
+        self.__oldest_uid = None
+        self.__latest_uid = None
+        self.__condition = threading.Condition()
+        self.__thread = None
+
+    def start(self):
+        """
+        Start looking up new events in the background, unless already started
+        :return:
+        """
+        with self.__condition:
+            if self.__thread is not None:
+                return
+            self.__engine = self.__get_engine()
+            with self.__engine.connect() as connection:
+                self.__latest_uid = connection.execute(select([func.max(RunEvent.uid)])).scalar() or 0
+            self.__oldest_uid = self.__latest_uid
+            self.__thread = threading.Thread(target=self.__run, name='EventFeed', daemon=True)
+            self.__thread.start()
+
+    def __run(self):
+        while True:
+            time.sleep(self.__interval)
+            try:
+                self.poll()
+            except Exception:
+                print('- Warning: run events could not be fetched: ' + traceback.format_exc())
+
+    def poll(self):
+        """
+        Fetch all events newer than the latest one passed on so far and notify the waiting clients about them
+        :return: number of new events
+        """
+        rows = []
+        after_uid = self.__latest_uid
+        with self.__engine.connect() as connection:
+            while True:
+                page = RunEvent.query_since(connection, after_uid, self.__events.maxlen)
+                rows.extend(page)
+                if len(page) < self.__events.maxlen:
+                    break
+                after_uid = page[-1].uid
+        now = time.time()
+        events = []
+        latest_uid = self.__latest_uid
+        for row in rows:
+            if row.uid > latest_uid + 1 and now - self.__gaps.setdefault(row.uid, now) < self.__grace:
+                break
+            events.append(RunEvent.jsonify_row(row))
+            latest_uid = row.uid
+        self.__gaps = dict((uid, seen) for uid, seen in self.__gaps.items() if uid > latest_uid)
+        if len(events) > 0:
+            with self.__condition:
+                for event in events:
+                    if len(self.__events) == self.__events.maxlen:
+                        self.__oldest_uid = self.__events.popleft()['uid']
+                    self.__events.append(event)
+                self.__latest_uid = latest_uid
+                self.__condition.notify_all()
+        return len(events)
+
+    def get_latest_uid(self):
+        return self.__latest_uid
+
+    def get_events(self, after_uid):
+        """
+        All events kept that are newer than the given one
+        :param after_uid:
+        :return: list of events, or None if events newer than the given one have been dropped already
+        """
+        with self.__condition:
+            if after_uid < self.__oldest_uid:
+                return None
+            return [event for event in self.__events if event['uid'] > after_uid]
+
+    def wait(self, after_uid, timeout):
+        """
+        Block until there are events newer than the given one (or until the timeout has passed)
+        :param after_uid:
+        :param timeout: seconds
+        :return: as get_events (an empty list after a timeout)
+        """
+        with self.__condition:
+            self.__condition.wait_for(lambda: self.__latest_uid > after_uid, timeout)
+        return self.get_events(after_uid)
@@ -0,0 +1,231 @@
+import re
+import time
+import random
+import urllib.parse
+import urllib3
+from scrapebot.emulate import RecipeStepTypeEnum, handles
+
+http_step_handlers = {}
+# one pool of (keep-alive) connections shared among all runs of this process
+http_pool = urllib3.PoolManager(num_pools=50, maxsize=10)
+
+
+class HttpEmulator:
+    """
+    Browserless engine for recipes which only navigate to pages and extract data from their (static) HTML. Pages are
+    fetched through a pooled HTTP client and parsed with lxml, so neither a browser nor JavaScript is available.
+    """
+    handlers = http_step_handlers
+    default_user_agent = 'Mozilla/5.0 (X11; Linux x86_64; rv:77.0) Gecko/20100101 Firefox/77.0'
+    __config = None
+    __timeout = 0
+    __http_timeout = 30
+    __headers = None
+    __url = None
+    __source = None
+    __document = None
+
+    @staticmethod
+    def is_available():
+        """
+        The engine requires lxml (and cssselect), which are optional as long as no recipe uses this engine
+        :return:
+        """
+        try:
+            import lxml.html
+            import lxml.cssselect
+            return True
+        except ImportError:
+            return False
+
+    def run(self, config, run, step, prior_step=None):
+        from scrapebot.database import Log, RunStatusEnum
+        if prior_step is None:
+            self.__config = config
+            self.__init_session(run)
+        elif self.__timeout > 0:
+            timeout = random.uniform(self.__timeout*.75, self.__timeout*1.25)
+            run.log.append(Log(message='Waiting for ' + str(round(timeout, 1)) + ' seconds'))
+            time.sleep(timeout)
+        handler = http_step_handlers.get(step.type)
+        if handler is None:
+            return RunStatusEnum.config_error
+        handler(self, run, step, prior_step)
+        return RunStatusEnum.success
+
+    def __init_session(self, run):
+        from scrapebot.database import Log
+        user_agent = self.__config.get('Instance', 'BrowserUserAgent', fallback='')
+        if user_agent == '':
+            user_agent = self.default_user_agent
+        self.__headers = {
+            'User-Agent': user_agent,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': self.__config.get('Instance', 'BrowserLanguage', fallback='en')
+        }
+        self.__timeout = float(self.__config.get('Instance', 'Timeout', fallback=0))
+        self.__http_timeout = float(self.__config.get('Instance', 'HttpTimeout', fallback=30))
+        run.log.append(Log(message='Running without browser (plain HTTP requests), timeout set to ' +
+                                   str(self.__timeout) + ' seconds'))
+        run.log.append(Log(message='User agent for this session is "' + user_agent + '"'))
+
+    def close_session(self, run):
+        from scrapebot.database import Log
+        if self.__headers is not None:
+            self.__document = None
+            self.__source = None
+            self.__headers = None
+            run.log.append(Log(message='HTTP session closed'))
+        return True
+
+    @staticmethod
+    def get_charset(content_type):
+        match = re.search(r'charset=["\']?([\w.:-]+)', content_type or '', re.IGNORECASE)
+        return match.group(1) if match is not None else None
+
+    @staticmethod
+    def get_text(element):
+        """
+        Text of an element (without scripts and styles), with whitespace collapsed similar to what a browser shows
+        :param element:
+        :return:
+        """
+        text = ''.join(element.xpath('descendant-or-self::text()[not(ancestor::script) and not(ancestor::style)]'))
+        lines = [' '.join(line.split()) for line in text.splitlines()]
+        return '\n'.join(line for line in lines if line != '')
+
+    def get_attribute(self, element, name):
+        """
+        Attribute of an element; links are made absolute as a browser would do
+        :param element:
+        :param name:
+        :return:
+        """
+        value = element.get(name)
+        if value is not None and name in ('href', 'src', 'action') and self.__url is not None:
+            value = urllib.parse.urljoin(self.__url, value)
+        return value
+
+    @staticmethod
+    def __get_elem_list(elements):
+        if elements is None:
+            return []
+        elif isinstance(elements, list):
+            return elements
+        else:
+            return [elements]
+
+    def __get_first_elem_or_none(self, elements):
+        elements = self.__get_elem_list(elements)
+        return elements[0] if len(elements) > 0 else None
+
+    def __store_elements(self, run, step, elements, description):
+        from scrapebot.database import Log, Data
+        step.temp_result = elements
+        count = str(len(elements))
+        run.data.append(Data(step=step, value=count))
+        run.log.append(Log(message='Retrieved ' + count + ' element(s) with ' + description + ' (count stored as data)'))
+
+    @handles(RecipeStepTypeEnum.log, registry=http_step_handlers)
+    def __handle_log(self, run, step, prior_step=None):
+        from scrapebot.database import Log
+        run.log.append(Log(message=step.value))
+
+    @handles(RecipeStepTypeEnum.data, registry=http_step_handlers)
+    def __handle_data(self, run, step, prior_step=None):
+        from scrapebot.database import Data
+        run.data.append(Data(step=step, value=step.value))
+
+    @handles(RecipeStepTypeEnum.pause, registry=http_step_handlers)
+    def __handle_pause(self, run, step, prior_step=None):
+        from scrapebot.database import Log
+        pause = int(step.value)
+        pause = random.uniform(pause*.75, pause*1.25)
+        time.sleep(pause)
+        run.log.append(Log(message='Paused for ' + str(round(pause, 1)) + ' seconds'))
+
+    @handles(RecipeStepTypeEnum.navigate, registry=http_step_handlers)
+    def __handle_navigate(self, run, step, prior_step=None):
+        from scrapebot.database import Log, LogTypeEnum
+        import lxml.html
+        response = http_pool.request('GET', step.value, headers=self.__headers, timeout=self.__http_timeout)
+        self.__url = urllib.parse.urljoin(step.value, response.geturl() or step.value)
+        charset = self.get_charset(response.headers.get('Content-Type'))
+        self.__source = response.data.decode(charset or 'utf-8', errors='replace')
+        if len(response.data.strip()) > 0:
+            self.__document = lxml.html.document_fromstring(response.data,
+                                                            parser=lxml.html.HTMLParser(encoding=charset))
+        else:
+            self.__document = lxml.html.document_fromstring('<html></html>')
+        if response.status >= 400:
+            run.log.append(Log(message='Server responded to "' + step.value + '" with HTTP status ' +
+                                       str(response.status), type=LogTypeEnum.warning))
+        run.log.append(Log(message='Navigated to "' + step.value + '"'))
+
+    @handles(RecipeStepTypeEnum.find_by_css, registry=http_step_handlers)
+    def __handle_find_by_css(self, run, step, prior_step=None):
+        from lxml.cssselect import CSSSelector
+        self.__store_elements(run, step, CSSSelector(step.value)(self.__document),
+                              'CSS selector "' + step.value + '"')
+
+    @handles(RecipeStepTypeEnum.find_by_xpath, registry=http_step_handlers)
+    def __handle_find_by_xpath(self, run, step, prior_step=None):
+        result = self.__document.xpath(step.value)
+        # as in the browser, only elements count (and not, e.g., attributes or text nodes)
+        elements = [element for element in result if hasattr(element, 'tag')] if isinstance(result, list) else []
+        self.__store_elements(run, step, elements, 'XPath "' + step.value + '"')
+
+    @handles(RecipeStepTypeEnum.get_text, registry=http_step_handlers)
+    def __handle_get_text(self, run, step, prior_step=None):
+        from scrapebot.database import Log, LogTypeEnum, Data
+        element = self.__get_first_elem_or_none(prior_step.temp_result)
+        if element is None:
+            run.log.append(Log(message='No element available to get text from', type=LogTypeEnum.warning))
+        else:
+            value = self.get_text(element)
+            run.data.append(Data(step=step, value=value))
+            run.log.append(Log(message='Retrieved and stored text "' + value[:15] + '..." of prior element'))
+
+    @handles(RecipeStepTypeEnum.get_texts, registry=http_step_handlers)
+    def __handle_get_texts(self, run, step, prior_step=None):
+        from scrapebot.database import Log, Data
+        elements = self.__get_elem_list(prior_step.temp_result)
+        run.data.extend(Data(step=step, value=self.get_text(element)) for element in elements)
+        run.flush_results(False)
+        run.log.append(Log(message='Stored text from ' + str(len(elements)) + ' element(s), each as separate data'))
+
+    @handles(RecipeStepTypeEnum.get_attribute, registry=http_step_handlers)
+    def __handle_get_attribute(self, run, step, prior_step=None):
+        from scrapebot.database import Log, LogTypeEnum, Data
+        element = self.__get_first_elem_or_none(prior_step.temp_result)
+        if element is None:
+            run.log.append(Log(message='No element available to get the attribute "' + step.value +
+                                       '" from', type=LogTypeEnum.warning))
+        else:
+            value = str(self.get_attribute(element, step.value))
+            run.data.append(Data(step=step, value=value))
+            run.log.append(Log(message='Retrieved and stored value "' + value[:15] + '..." of attribute "' +
+                                       step.value + '" of prior element'))
+
+    @handles(RecipeStepTypeEnum.get_attributes, registry=http_step_handlers)
+    def __handle_get_attributes(self, run, step, prior_step=None):
+        from scrapebot.database import Log, Data
+        elements = self.__get_elem_list(prior_step.temp_result)
+        run.data.extend(Data(step=step, value=str(self.get_attribute(element, step.value))) for element in elements)
+        run.flush_results(False)
+        run.log.append(Log(message='Stored "' + step.value + '" values from ' + str(len(elements)) +
+                                   ' element(s), each as separate data'))
+
+    @handles(RecipeStepTypeEnum.get_pagetitle, registry=http_step_handlers)
+    def __handle_get_pagetitle(self, run, step, prior_step=None):
+        from scrapebot.database import Log, Data
+        title = self.__document.find('.//title')
+        value = '' if title is None else ' '.join(title.text_content().split())
+        run.data.append(Data(step=step, value=value))
+        run.log.append(Log(message='Retrieved and stored page title "' + value + '"'))
+
+    @handles(RecipeStepTypeEnum.get_htmlsource, registry=http_step_handlers)
+    def __handle_get_htmlsource(self, run, step, prior_step=None):
+        from scrapebot.database import Log, Data
+        run.data.append(Data(step=step, value=self.__source))
+        run.log.append(Log(message='Retrieved and stored HTML source code'))
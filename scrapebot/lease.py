@@ -0,0 +1,246 @@
+import os
+import time
+import uuid
+import socket
+import tempfile
+import threading
+import weakref
+from datetime import timedelta
+from sqlalchemy import select, or_, func
+from sqlalchemy.exc import IntegrityError
+from scrapebot.database import RunLease
+try:
+    import fcntl
+except ImportError:
+    # on Windows, byte-range locks take the place of flock
+    fcntl = None
+    import msvcrt
+
+
+# engines known to have the lease table, which is looked up for every lease only until it has been found
+engines_with_table = weakref.WeakSet()
+
+
+def lock_descriptor(descriptor):
+    """
+    Lock an open file exclusively without waiting; the lock is released by the operating system as soon as the file is
+    closed, also if the process dies, so that lock files never become stale
+    :param descriptor:
+    :return: whether the lock has been taken
+    """
+    try:
+        if fcntl is not None:
+            fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(descriptor, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+class Lease:
+    """
+    Exclusive claim of one runner on a recipe-instance combination which expires unless renewed through a heartbeat.
+    The claim is stored as a row in the database; only if the table has not been created yet, a local lock file serves
+    as fallback (any other database error is raised, as a lock file would not exclude runners on other hosts), which
+    is locked through the operating system for as long as the lease is held.
+    """
+    def __init__(self, engine, recipe_uid, instance_uid, duration=300, lock_dir=None, holder=None):
+        self.__engine = engine
+        self.__recipe_uid = recipe_uid
+        self.__instance_uid = instance_uid
+        self.__duration = duration
+        self.__lock_dir = tempfile.gettempdir() if lock_dir is None else lock_dir
+        self.__holder = Lease.create_holder() if holder is None else holder
+        self.__use_file = False
+        self.__descriptor = None
+        self.__acquired = False
+        self.__lost = False
+        self.__heartbeat = None
+        self.__heartbeat_stop = threading.Event()
+
+    @staticmethod
+    def create_holder():
+        return socket.gethostname() + ':' + str(os.getpid()) + ':' + uuid.uuid4().hex[:8]
+
+    def get_holder(self):
+        return self.__holder
+
+    def get_recipe_uid(self):
+        return self.__recipe_uid
+
+    def is_file_based(self):
+        return self.__use_file
+
+    def is_lost(self):
+        """
+        Whether the heartbeat has failed to renew the lease (see start_heartbeat), so that another runner may have taken
+        it over and the run should be stopped
+        :return:
+        """
+        return self.__lost
+
+    def acquire(self):
+        """
+        Try to claim the lease, which succeeds if nobody else holds it or if the other holder's claim has expired.
+        :return:
+        """
+        if self.__has_table():
+            self.__acquired = self.__acquire_row()
+        else:
+            self.__use_file = True
+            self.__acquired = self.__acquire_file()
+        return self.__acquired
+
+    def adopt(self):
+        """
+        Take over a lease row which has already been claimed on behalf of this lease's holder (e.g., by a WorkQueue).
+        :return:
+        """
+        self.__use_file = False
+        self.__acquired = True
+
+    def renew(self):
+        """
+        Extend the lease by another duration, as long as it is still held by us.
+        :return: False if the lease has been lost in the meantime
+        """
+        if not self.__acquired:
+            return False
+        if self.__use_file:
+            return self.__renew_file()
+        with self.__engine.connect() as connection:
+            now = connection.execute(select([func.now()])).scalar()
+            return connection.execute(
+                RunLease.__table__.update()
+                .where(self.__get_clause())
+                .where(RunLease.holder == self.__holder)
+                .values(expires=now + timedelta(seconds=self.__duration))
+            ).rowcount == 1
+
+    def release(self, retry_after=None):
+        """
+        Give up the lease.
+        :param retry_after: if given, keep the lease for this many seconds so nobody retries (e.g., a failed run) earlier
+        :return:
+        """
+        self.stop_heartbeat()
+        if not self.__acquired:
+            return
+        self.__acquired = False
+        if self.__use_file:
+            self.__release_file(retry_after)
+            return
+        with self.__engine.connect() as connection:
+            if retry_after is None:
+                values = {'holder': None, 'expires': None}
+            else:
+                now = connection.execute(select([func.now()])).scalar()
+                values = {'expires': now + timedelta(seconds=retry_after)}
+            connection.execute(
+                RunLease.__table__.update()
+                .where(self.__get_clause())
+                .where(RunLease.holder == self.__holder)
+                .values(**values)
+            )
+
+    def start_heartbeat(self):
+        """
+        Renew the lease in the background (three times per duration) until it is released; if that fails (or the lease
+        expires while the database cannot be reached), the lease is marked as lost (see is_lost).
+        :return:
+        """
+        self.__heartbeat_stop.clear()
+        self.__heartbeat = threading.Thread(target=self.__beat, daemon=True)
+        self.__heartbeat.start()
+
+    def stop_heartbeat(self):
+        if self.__heartbeat is not None:
+            self.__heartbeat_stop.set()
+            self.__heartbeat.join()
+            self.__heartbeat = None
+
+    def __beat(self):
+        renewed = time.time()
+        while not self.__heartbeat_stop.wait(self.__duration/3):
+            try:
+                if self.renew():
+                    renewed = time.time()
+                    continue
+            except Exception:
+                if time.time() - renewed <= self.__duration:
+                    continue
+            self.__lost = True
+            print('- Warning: lease on recipe ' + str(self.__recipe_uid) + ' has been lost')
+            return
+
+    def __get_clause(self):
+        return (RunLease.recipe_uid == self.__recipe_uid) & (RunLease.instance_uid == self.__instance_uid)
+
+    def __has_table(self):
+        if self.__engine not in engines_with_table:
+            with self.__engine.connect() as connection:
+                if not self.__engine.dialect.has_table(connection, RunLease.__tablename__):
+                    return False
+            engines_with_table.add(self.__engine)
+        return True
+
+    def __acquire_row(self):
+        with self.__engine.connect() as connection:
+            now = connection.execute(select([func.now()])).scalar()
+            expires = now + timedelta(seconds=self.__duration)
+            if connection.execute(
+                RunLease.__table__.update()
+                .where(self.__get_clause())
+                .where(or_(RunLease.holder == None, RunLease.expires < now))
+                .values(holder=self.__holder, expires=expires)
+            ).rowcount == 1:
+                return True
+            try:
+                connection.execute(RunLease.__table__.insert().values(
+                    created=now,
+                    recipe_uid=self.__recipe_uid,
+                    instance_uid=self.__instance_uid,
+                    holder=self.__holder,
+                    expires=expires
+                ))
+                return True
+            except IntegrityError:
+                # the row exists and is held by someone else (or has just been inserted by someone else)
+                return False
+
+    def __get_lock_file(self):
+        return os.path.join(self.__lock_dir, 'scrapebot_' + str(self.__instance_uid) + '_' +
+                            str(self.__recipe_uid) + '.lock')
+
+    def __acquire_file(self):
+        descriptor = os.open(self.__get_lock_file(), os.O_CREAT | os.O_RDWR)
+        if not lock_descriptor(descriptor):
+            os.close(descriptor)
+            return False
+        # a lease released for a while (see release) holds the time until when it is kept
+        content = os.read(descriptor, 1024).decode('utf-8').split('\n')
+        if len(content) > 1 and float(content[1]) > time.time():
+            os.close(descriptor)
+            return False
+        self.__write_lock_file(descriptor, self.__holder)
+        self.__descriptor = descriptor
+        return True
+
+    def __renew_file(self):
+        # the lock is held for as long as the file is open
+        return self.__descriptor is not None
+
+    def __release_file(self, retry_after):
+        descriptor, self.__descriptor = self.__descriptor, None
+        if retry_after is not None:
+            self.__write_lock_file(descriptor, self.__holder + '\n' + str(time.time() + retry_after))
+        else:
+            self.__write_lock_file(descriptor, '')
+        os.close(descriptor)
+
+    @staticmethod
+    def __write_lock_file(descriptor, content):
+        os.lseek(descriptor, 0, os.SEEK_SET)
+        os.ftruncate(descriptor, 0)
+        os.write(descriptor, content.encode('utf-8'))
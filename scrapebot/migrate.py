@@ -0,0 +1,156 @@
+from sqlalchemy import inspect, select, func, text
+from sqlalchemy.schema import CreateColumn
+from scrapebot.database import base, SchemaVersion, Instance, Recipe, RecipeStep, RecipeEngineEnum, Run, RunStats, Log, \
+    Data
+
+migrations = []
+
+
+def migration(version, description):
+    """
+    Decorator registering a function as the migration of an existing database schema to the given version. As MySQL
+    commits schema changes implicitly (and thus cannot roll back half-applied migrations), every migration needs to
+    check for its changes first, so that it can be run again on databases that already (partly) have them.
+    :param version:
+    :param description:
+    :return:
+    """
+    def register(function):
+        migrations.append((version, description, function))
+        migrations.sort(key=lambda known: known[0])
+        return function
+    return register
+
+
+def has_column(connection, column):
+    return column.name in [known['name'] for known in inspect(connection).get_columns(column.table.name)]
+
+
+def has_index(connection, index):
+    return index.name in [known['name'] for known in inspect(connection).get_indexes(index.table.name)]
+
+
+def get_index(table, name):
+    for index in table.indexes:
+        if index.name == name:
+            return index
+    raise KeyError(name)
+
+
+def add_column(connection, column):
+    """
+    Add a column, as defined in the models, to its existing table (unless it exists already)
+    :param connection:
+    :param column:
+    :return: whether the column has been added
+    """
+    if has_column(connection, column):
+        return False
+    connection.execute('ALTER TABLE ' + connection.dialect.identifier_preparer.format_table(column.table) +
+                       ' ADD COLUMN ' + str(CreateColumn(column).compile(dialect=connection.dialect)))
+    return True
+
+
+def add_index(connection, index):
+    """
+    Create an index, as defined in the models, on its existing table (unless it exists already); on MySQL (InnoDB),
+    secondary indexes are built online, so the table stays writable for running instances in the meantime
+    :param connection:
+    :param index:
+    :return: whether the index has been created
+    """
+    if has_index(connection, index):
+        return False
+    index.create(connection)
+    return True
+
+
+@migration(1, 'Add engine to recipes')
+def add_recipe_engine(connection):
+    if add_column(connection, Recipe.__table__.c.engine):
+        # existing recipes keep running in the browser (as they might rely on JavaScript), only new ones default to auto;
+        # not via Recipe.__table__.update(), which would also set the modification date added by a later migration
+        connection.execute(text('UPDATE ' + connection.dialect.identifier_preparer.format_table(Recipe.__table__) +
+                                ' SET engine = :engine WHERE engine IS NULL'), engine=RecipeEngineEnum.browser.name)
+
+
+@migration(2, 'Add indexes for looking up runs, their log entries and data, and recipe steps')
+def add_lookup_indexes(connection):
+    add_index(connection, get_index(Run.__table__, 'ix_run_recipe_instance_status_created'))
+    add_index(connection, get_index(Data.__table__, 'ix_data_run_step'))
+    add_index(connection, get_index(Log.__table__, 'ix_log_run_created'))
+    add_index(connection, get_index(RecipeStep.__table__, 'ix_recipestep_recipe_sort'))
+
+
+@migration(3, 'Compute run statistics of all runs stored so far')
+def add_run_stats(connection):
+    RunStats.rebuild(connection)
+
+
+@migration(4, 'Add retention to recipes')
+def add_recipe_retention(connection):
+    add_column(connection, Recipe.__table__.c.retention)
+
+
+@migration(5, 'Add indexes for browsing the runs of recipes and instances')
+def add_run_browsing_indexes(connection):
+    add_index(connection, get_index(Run.__table__, 'ix_run_recipe_created_uid'))
+    add_index(connection, get_index(Run.__table__, 'ix_run_instance_created_uid'))
+
+
+@migration(6, 'Add modification dates to recipes and instances')
+def add_modification_dates(connection):
+    add_column(connection, Recipe.__table__.c.updated)
+    add_column(connection, Instance.__table__.c.updated)
+
+
+class SchemaMigrator:
+    """
+    Brings a database schema up to date: tables that do not exist yet are created as defined in the models, while
+    existing tables are changed by all migrations not yet applied to them (in order of their versions). Applied
+    versions are kept in the schemaversion table.
+    """
+    def __init__(self, engine):
+        self.__engine = engine
+
+    def get_version(self):
+        """
+        Version of the database schema, i.e., the latest migration applied to it (or 0 if none has been applied yet)
+        :return:
+        """
+        with self.__engine.connect() as connection:
+            if not self.__engine.dialect.has_table(connection, SchemaVersion.__tablename__):
+                return 0
+            return connection.execute(select([func.max(SchemaVersion.version)])).scalar() or 0
+
+    def get_pending(self):
+        version = self.get_version()
+        return [(known_version, description) for known_version, description, function in migrations
+                if known_version > version]
+
+    def migrate(self):
+        """
+        Create missing tables and apply pending migrations
+        :return: list of the (version, description) of all migrations applied
+        """
+        version = self.get_version()
+        base.metadata.create_all(self.__engine)
+        applied = []
+        for known_version, description, function in migrations:
+            if known_version <= version:
+                continue
+            with self.__engine.begin() as connection:
+                function(connection)
+                # the migration may have been applied by another process (e.g., a second setup) in the meantime
+                if connection.execute(select([SchemaVersion.uid])
+                                      .where(SchemaVersion.version == known_version)).first() is None:
+                    connection.execute(SchemaVersion.__table__.insert().values(version=known_version,
+                                                                               description=description))
+            applied.append((known_version, description))
+        return applied
+
+
+@migration(7, 'Add origins to runs uploaded from local buffers')
+def add_run_origin(connection):
+    add_column(connection, Run.__table__.c.origin)
+    add_index(connection, get_index(Run.__table__, 'ix_run_origin'))
@@ -0,0 +1,33 @@
+from scrapebot.emulate import step_handlers
+
+
+class ExecutionPlan:
+    """
+    A recipe's active steps, compiled once before a run: every step needs a handler for its type registered with the
+    engine the recipe runs with and references to data collected by other steps need to point to earlier steps, so that
+    broken recipes are rejected before a browser is started for them.
+    """
+    def __init__(self, steps, handlers=None):
+        self.steps = []
+        self.errors = []
+        self.__handlers = step_handlers if handlers is None else handlers
+        self.__sorts = set()
+        for step in steps:
+            self.__compile(step)
+
+    def __compile(self, step):
+        if step.type not in self.__handlers:
+            self.errors.append('Step ' + str(step.sort) + ' is of a type not supported by the engine ("' +
+                               str(step.type) + '")')
+        if step.use_data_item_instead_of_value is not None and step.use_data_item_instead_of_value > 0:
+            data_item_step_sort = int(step.use_data_item_instead_of_value)
+            if data_item_step_sort not in self.__sorts:
+                self.errors.append('Step ' + str(step.sort) + ' uses data from step ' + str(data_item_step_sort) +
+                                   ', which is not an active step run before')
+        elif step.use_random_item_instead_of_value and len(step.items) == 0:
+            self.errors.append('Step ' + str(step.sort) + ' uses a random item but has no items to choose from')
+        self.__sorts.add(step.sort)
+        self.steps.append(step)
+
+    def is_valid(self):
+        return len(self.errors) == 0
@@ -0,0 +1,132 @@
+import heapq
+import hashlib
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from scrapebot.database import Recipe, RecipeOrder, RecipeStep, RunStatusEnum
+
+
+class Scheduler:
+    """
+    Priority queue of an instance's active recipes, keyed by the (database) time at which each of them is due next.
+    """
+    def __init__(self, db, instance, reload_interval=60, retry_interval=120):
+        self.__db = db
+        self.__instance = instance
+        self.__reload_interval = reload_interval
+        self.__retry_interval = retry_interval
+        self.__queue = []
+        self.__running = set()
+        self.__fingerprint = None
+        self.__offset = timedelta(0)
+        self.__last_check = None
+
+    def __len__(self):
+        return len(self.__queue)
+
+    def now(self):
+        """
+        Current time according to the database clock, which is what Run.created is based on.
+        :return:
+        """
+        return datetime.now() + self.__offset
+
+    def refresh(self, force=False):
+        """
+        Check (at most every reload_interval seconds) whether recipe definitions have changed and reload if so.
+        :param force:
+        :return: True if the queue was (re)built
+        """
+        if not force and self.__last_check is not None and \
+                (datetime.now() - self.__last_check).total_seconds() < self.__reload_interval:
+            return False
+        self.__last_check = datetime.now()
+        fingerprint = self.get_fingerprint()
+        if not force and fingerprint == self.__fingerprint:
+            return False
+        self.__fingerprint = fingerprint
+        self.reload()
+        return True
+
+    def get_fingerprint(self):
+        """
+        Hash all scheduling-relevant recipe and step settings of this instance within one single query.
+        :return:
+        """
+        rows = []
+        for row in self.__db.query(
+                    Recipe.uid, Recipe.active, Recipe.interval, Recipe.cookies,
+                    RecipeStep.uid, RecipeStep.sort, RecipeStep.type, RecipeStep.active,
+                    RecipeStep.use_random_item_instead_of_value, RecipeStep.use_data_item_instead_of_value,
+                    RecipeStep.value
+                )\
+                .select_from(RecipeOrder)\
+                .join(Recipe, Recipe.uid == RecipeOrder.recipe_uid)\
+                .outerjoin(RecipeStep, RecipeStep.recipe_uid == Recipe.uid)\
+                .filter(RecipeOrder.instance_uid == self.__instance.uid)\
+                .order_by(Recipe.uid, RecipeStep.uid):
+            # values of data-item and random-item steps are overwritten during runs, so they do not count as changes
+            if row[8] or row[9]:
+                row = row[:-1]
+            rows.append(row)
+        return hashlib.md5(repr(rows).encode('utf-8')).hexdigest()
+
+    def reload(self):
+        """
+        Rebuild the queue from scratch, based on each recipe's interval and its latest successful run.
+        :return:
+        """
+        self.__db.expire_all()
+        self.__queue = []
+        db_now = None
+        for recipe, active_steps, latest_run_created, now in self.__instance.get_recipe_schedule():
+            db_now = now
+            if recipe.uid not in self.__running and active_steps > 0:
+                self.push(recipe, recipe.get_next_due(latest_run_created, now))
+        if db_now is None:
+            db_now = self.__db.query(func.now()).first()[0]
+        self.__offset = db_now - datetime.now()
+
+    def push(self, recipe, due):
+        heapq.heappush(self.__queue, (due, recipe.uid, recipe))
+
+    def reschedule(self, recipe, run):
+        """
+        Put a recipe back into the queue after it has been run.
+        :param recipe:
+        :param run:
+        :return:
+        """
+        self.__running.discard(recipe.uid)
+        if run is not None and run.status == RunStatusEnum.success:
+            self.push(recipe, recipe.get_next_due(run.created, self.now()))
+        else:
+            self.push(recipe, self.now() + timedelta(seconds=self.__retry_interval))
+
+    def pop_due(self):
+        """
+        Remove and return the recipe that is due next, if it is already due. Until it is rescheduled, the recipe is
+        considered running and thus not put back into the queue upon reload.
+        :return:
+        """
+        if len(self.__queue) > 0 and self.__queue[0][0] <= self.now():
+            recipe = heapq.heappop(self.__queue)[2]
+            self.__running.add(recipe.uid)
+            return recipe
+        return None
+
+    def get_next_due(self):
+        return self.__queue[0][0] if len(self.__queue) > 0 else None
+
+    def get_sleep_time(self, include_queue=True):
+        """
+        Seconds until either the next recipe is due or recipe definitions should be checked again.
+        :param include_queue: if False, only consider the next check of recipe definitions
+        :return:
+        """
+        sleep = self.__reload_interval
+        if self.__last_check is not None:
+            sleep = sleep - (datetime.now() - self.__last_check).total_seconds()
+        next_due = self.get_next_due()
+        if include_queue and next_due is not None:
+            sleep = min(sleep, (next_due - self.now()).total_seconds())
+        return max(sleep, 0)
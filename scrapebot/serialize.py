@@ -0,0 +1,171 @@
+import enum
+from sqlalchemy import inspect, select, func
+from sqlalchemy.orm import joinedload, selectinload
+from scrapebot.database import User, Recipe, RecipeOrder, RecipeStep, Run, Data
+
+# columns that are never serialized
+hidden_columns = {
+    User: ('password',)
+}
+# columns that may hold references to values stored in a blob store (see scrapebot.blobstore)
+blob_columns = {
+    Data: ('value',)
+}
+# columns of the objects embedded in runs, so that, e.g., a step's value is not repeated for every data row
+run_fields = {
+    RecipeStep: ('uid', 'sort', 'type', 'recipe_uid')
+}
+
+
+class Serializer:
+    """
+    Shallow serialization of models into JSON-ready dicts: every object is serialized with its columns only, so related
+    objects are referenced through their uids (e.g., run_uid) unless their relationship is explicitly included. Included
+    relationships are loaded eagerly, with one query per relationship rather than one per object.
+    """
+    def __init__(self, model, include=(), fields=None, blob_store=None):
+        """
+        :param model: the model class to serialize objects of
+        :param include: paths of relationships to embed, e.g., ('recipe', 'data', 'data.step') for runs
+        :param fields: optional dict of model classes and the names of their columns to serialize (default is all)
+        :param blob_store: optional blob store to dereference values stored as blobs with (otherwise, references are
+        serialized as they are)
+        """
+        self.__model = model
+        self.__include = set(include)
+        self.__fields = {} if fields is None else fields
+        self.__blob_store = blob_store
+        for path in self.__include:
+            # including data.step implies including data
+            if '.' in path and path.rsplit('.', 1)[0] not in self.__include:
+                raise ValueError('Relationship "' + path + '" included without its parent')
+
+    def get_options(self):
+        """
+        Loader options that eagerly load all included relationships: many-to-one relationships are joined into the
+        query, collections are fetched through one additional SELECT ... IN query each
+        :return:
+        """
+        options = []
+        for path in sorted(self.__include):
+            model = self.__model
+            option = None
+            for name in path.split('.'):
+                relationship = inspect(model).relationships[name]
+                loader = selectinload if relationship.uselist else joinedload
+                attribute = getattr(model, name)
+                option = loader(attribute) if option is None else getattr(option, loader.__name__)(attribute)
+                model = relationship.mapper.class_
+            options.append(option)
+        return options
+
+    def query(self, query):
+        return query.options(*self.get_options())
+
+    def dump(self, obj, path=''):
+        """
+        Serialize one object along with its included relationships
+        :param obj:
+        :param path: path of the relationship obj has been reached through (for nested objects)
+        :return:
+        """
+        if obj is None:
+            return None
+        mapper = inspect(type(obj))
+        fields = self.__fields.get(mapper.class_)
+        hidden = hidden_columns.get(mapper.class_, ())
+        blobs = blob_columns.get(mapper.class_, ()) if self.__blob_store is not None else ()
+        result = {}
+        for column in mapper.column_attrs:
+            if column.key not in hidden and (fields is None or column.key in fields):
+                value = getattr(obj, column.key)
+                if column.key in blobs:
+                    value = self.__blob_store.load(value)
+                result[column.key] = value.name if isinstance(value, enum.Enum) else value
+        for relationship in mapper.relationships:
+            relationship_path = path + relationship.key
+            if relationship_path in self.__include:
+                value = getattr(obj, relationship.key)
+                if relationship.uselist:
+                    result[relationship.key] = [self.dump(item, relationship_path + '.') for item in value]
+                else:
+                    result[relationship.key] = self.dump(value, relationship_path + '.')
+        return result
+
+    def dump_all(self, objects):
+        return [self.dump(obj) for obj in objects]
+
+
+class RunSerializer(Serializer):
+    """
+    Serializer for runs that renders log entries stored compactly (see LogBlob) just like log rows
+    """
+    def __init__(self, include=(), fields=None, blob_store=None):
+        super().__init__(Run, include, fields, blob_store)
+        self.__include_log = 'log' in include
+
+    def get_options(self):
+        options = super().get_options()
+        if self.__include_log:
+            options.append(selectinload(Run.log_blobs))
+        return options
+
+    def dump(self, obj, path=''):
+        result = super().dump(obj, path)
+        if path == '' and self.__include_log and obj is not None and len(obj.log_blobs) > 0:
+            result['log'] = sorted(result['log'] + [self.dump(log, 'log.') for log_blob in obj.log_blobs
+                                                    for log in log_blob.get_log()],
+                                   key=lambda log: log['created'])
+        return result
+
+
+def get_run_serializer(include_log=False, include_data=False, blob_store=None):
+    """
+    Serializer for runs with their recipe and instance and, optionally, their log entries and data (with their steps)
+    :param include_log:
+    :param include_data:
+    :param blob_store:
+    :return:
+    """
+    include = ['recipe', 'instance']
+    if include_log:
+        include.append('log')
+    if include_data:
+        include.extend(['data', 'data.step'])
+    return RunSerializer(include, run_fields, blob_store)
+
+
+def get_data_serializer(blob_store=None):
+    return Serializer(Data, ['step'], run_fields, blob_store)
+
+
+def dump_recipes_with_latest_runs(db, acl, instance_uids=None):
+    """
+    All recipes visible to a user (optionally, only those run by one of the given instances), each with its owner and
+    its latest run on any instance (if any), in two queries: one for the recipes with their owners and the uids of
+    their latest runs (looked up per recipe through the index on runs), and one for these runs
+    :param db:
+    :param acl: access control of the user
+    :param instance_uids:
+    :return:
+    """
+    latest_run_uid = select([func.max(Run.uid)]).where(Run.recipe_uid == Recipe.uid).label('latest_run_uid')
+    query = db.query(Recipe, latest_run_uid).options(joinedload(Recipe.owner)).filter(acl.get_recipe_filter())
+    if instance_uids is not None:
+        query = query.filter(Recipe.uid.in_(
+            select([RecipeOrder.recipe_uid]).where(RecipeOrder.instance_uid.in_(instance_uids))
+        ))
+    recipes = query.order_by(Recipe.uid).all()
+    serializer = get_run_serializer()
+    latest_runs = {}
+    run_uids = [run_uid for recipe, run_uid in recipes if run_uid is not None]
+    if len(run_uids) > 0:
+        for run in serializer.query(db.query(Run)).filter(Run.uid.in_(run_uids)):
+            latest_runs[run.uid] = serializer.dump(run)
+    data = []
+    for recipe, run_uid in recipes:
+        recipe_json = recipe.jsonify()
+        if run_uid in latest_runs:
+            recipe_json['latest_run'] = latest_runs[run_uid]
+        data.append(recipe_json)
+    return data
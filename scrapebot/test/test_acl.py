@@ -0,0 +1,79 @@
+import pytest
+from scrapebot.database import base, User, Instance, Recipe, Run, UserInstancePrivilege, UserRecipePrivilege
+from scrapebot.acl import AccessControl
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.fixture
+def new_db():
+    engine = create_engine('sqlite:///:memory:', encoding='utf-8')
+    base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def make_shared_objects(db):
+    owner = User(uid=1000, email='owner@haim.it', name='owner')
+    guest = User(uid=2000, email='guest@haim.it', name='guest')
+    recipes = [Recipe(uid=1000 + i, name='recipe_' + str(i), owner=owner) for i in range(3)]
+    instances = [Instance(uid=1000 + i, name='instance_' + str(i), owner=owner) for i in range(2)]
+    recipes[0].privileged_users.append(UserRecipePrivilege(user=guest, allowed_to_edit=False))
+    recipes[1].privileged_users.append(UserRecipePrivilege(user=guest, allowed_to_edit=True))
+    instances[0].privileged_users.append(UserInstancePrivilege(user=guest, allowed_to_edit=False))
+    for recipe in recipes:
+        for instance in instances:
+            db.add(Run(recipe=recipe, instance=instance))
+    db.commit()
+    return owner, guest, recipes, instances
+
+
+class TestAccessControl(object):
+    def test_sets(self, new_db):
+        owner, guest, recipes, instances = make_shared_objects(new_db)
+        # load the objects expired by the commit before counting queries
+        assert [obj.uid for obj in [guest] + recipes + instances] == [2000, 1000, 1001, 1002, 1000, 1001]
+        queries = []
+        event.listen(new_db.get_bind(), 'before_cursor_execute', lambda *args: queries.append(args[2]))
+        acl = AccessControl(new_db, guest)
+        assert acl.get_visible_recipe_uids() == {1000, 1001}
+        assert acl.get_editable_recipe_uids() == {1001}
+        assert acl.get_visible_instance_uids() == {1000}
+        assert acl.get_editable_instance_uids() == set()
+        assert acl.can_view_recipe(recipes[0]) and not acl.can_edit_recipe(recipes[0])
+        assert acl.can_edit_recipe(1001)
+        assert not acl.can_view_recipe(recipes[2]) and not acl.can_view_recipe(None)
+        assert acl.can_view_instance(instances[0]) and not acl.can_view_instance(instances[1])
+        assert len(queries) == 1
+        owner_acl = AccessControl(new_db, owner)
+        assert owner_acl.get_editable_recipe_uids() == {1000, 1001, 1002}
+        assert owner_acl.get_editable_instance_uids() == {1000, 1001}
+
+    def test_filters(self, new_db):
+        owner, guest, recipes, instances = make_shared_objects(new_db)
+        acl = AccessControl(new_db, guest)
+        runs = new_db.query(Run).filter(acl.get_run_filter()).all()
+        assert sorted((run.recipe_uid, run.instance_uid) for run in runs) == [(1000, 1000), (1001, 1000)]
+        assert all(acl.can_view_run(run) for run in runs)
+        assert [recipe.uid for recipe in new_db.query(Recipe).filter(acl.get_recipe_filter(only_editable=True))] == \
+            [1001]
+        assert [instance.uid for instance in new_db.query(Instance).filter(acl.get_instance_filter())] == [1000]
+
+    def test_invalidation(self, new_db):
+        owner, guest, recipes, instances = make_shared_objects(new_db)
+        acl = AccessControl(new_db, guest)
+        assert not acl.can_view_instance(instances[1])
+        instances[1].privileged_users.append(UserInstancePrivilege(user=guest, allowed_to_edit=True))
+        new_db.commit()
+        assert acl.can_edit_instance(instances[1])
+        new_db.delete(recipes[0].privileged_users[0])
+        new_db.commit()
+        assert not acl.can_view_recipe(recipes[0])
+
+    def test_large_uids(self, new_db):
+        owner, guest, recipes, instances = make_shared_objects(new_db)
+        # uids beyond the range of cached small integers are distinct objects, which must still be equal
+        other_owner = User(uid=int('1000'), email='copy@haim.it')
+        other_guest = User(uid=int('2000'), email='copy@haim.it')
+        assert recipes[2].is_visible_to_user(other_owner) and recipes[2].is_editable_by_user(other_owner)
+        assert recipes[1].is_editable_by_user(other_guest) and not recipes[0].is_editable_by_user(other_guest)
+        assert instances[0].is_visible_to_user(other_guest) and not instances[1].is_visible_to_user(other_guest)
@@ -0,0 +1,79 @@
+import os
+import pytest
+from datetime import datetime, timedelta
+from scrapebot.database import base, User, Instance, Recipe, RecipeStep, RecipeStepTypeEnum, Run, RunStatusEnum, Log, \
+    Data
+from scrapebot.archive import RunArchive, parse_date
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.fixture
+def new_db():
+    engine = create_engine('sqlite:///:memory:', encoding='utf-8')
+    base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def make_old_runs(db):
+    user = User(email='archive@haim.it', name='archive')
+    recipe = Recipe(uid=1000, name='archive', owner=user)
+    kept_recipe = Recipe(uid=2000, name='kept', owner=user, retention=0)
+    recipe.steps.append(RecipeStep(sort=1, type=RecipeStepTypeEnum.get_text, value='h1'))
+    instances = [Instance(name='archive_' + str(i), owner=user) for i in range(2)]
+    db.add_all([recipe, kept_recipe] + instances)
+    db.flush()
+    now = db.query(func.now()).first()[0]
+    for days in (100, 70, 40, 10):
+        for instance in instances:
+            run = Run(recipe=recipe, instance=instance, created=now - timedelta(days=days), runtime=days)
+            run.log.append(Log(message='log ' + str(days)))
+            run.data.append(Data(step=recipe.steps[0], value='data ' + str(days)))
+            db.add(run)
+        db.add(Run(recipe=kept_recipe, instance=instances[0], created=now - timedelta(days=days)))
+    db.add(Run(recipe=recipe, instance=instances[0], created=now - timedelta(days=50),
+               status=RunStatusEnum.in_progress))
+    db.commit()
+    return recipe, instances
+
+
+class TestRunArchive(object):
+    def test_archive(self, new_db, tmpdir):
+        recipe, instances = make_old_runs(new_db)
+        archive = RunArchive(str(tmpdir))
+        assert archive.archive(new_db, default_retention=30, batch_size=4) == {1000: 6}
+        assert new_db.query(Run).filter(Run.recipe_uid == 1000).count() == 3
+        assert new_db.query(Run).filter(Run.recipe_uid == 2000).count() == 4
+        assert new_db.query(Log).count() == 2
+        assert new_db.query(Data).count() == 2
+        months = archive.get_months(1000)
+        assert len(months) in (3, 4)
+        assert all(os.path.isfile(archive.get_path(1000, month)) for month in months)
+        runs = list(archive.read(1000))
+        assert len(runs) == 6
+        assert [run['runtime'] for run in runs] == [100, 100, 70, 70, 40, 40]
+        assert isinstance(runs[0]['created'], datetime) and runs[0]['status'] is RunStatusEnum.success
+        assert runs[0]['log'][0]['message'] == 'log 100'
+        assert runs[0]['data'][0]['value'] == 'data 100'
+        assert runs[0]['data'][0]['step_sort'] == 1 and runs[0]['data'][0]['step_type'] == 'get_text'
+        assert [run['instance_uid'] for run in archive.read(1000, instances[1].uid)] == [instances[1].uid] * 3
+        assert list(archive.read(2000)) == []
+
+    def test_archive_again(self, new_db, tmpdir):
+        recipe, instances = make_old_runs(new_db)
+        archive = RunArchive(str(tmpdir))
+        runs = new_db.query(Run).filter(Run.recipe_uid == 1000, Run.runtime == 100).all()
+        # runs written to the archive before their deletion failed are written once more but read only once
+        archive.write(runs)
+        assert archive.archive(new_db, default_retention=60) == {1000: 4}
+        assert [run['runtime'] for run in archive.read(1000)] == [100, 100, 70, 70]
+        recipe = new_db.query(Recipe).filter(Recipe.uid == 1000).one()
+        recipe.retention = 5
+        new_db.commit()
+        assert archive.archive(new_db) == {1000: 4}
+        assert new_db.query(Run).filter(Run.recipe_uid == 1000).count() == 1
+        assert len(list(archive.read(1000))) == 8
+
+    def test_parse_date(self):
+        for date in (datetime(2020, 5, 1, 12, 30, 15), datetime(2020, 5, 1, 12, 30, 15, 250)):
+            assert parse_date(str(date)) == date
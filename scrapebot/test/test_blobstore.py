@@ -0,0 +1,58 @@
+import os
+import pytest
+from scrapebot.database import base, User, Instance, Recipe, RecipeStep, RecipeStepTypeEnum, Run, RunStatusEnum, Data
+from scrapebot.blobstore import BlobStore, LocalBlobStore, reference_prefix
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.fixture
+def new_db():
+    engine = create_engine('sqlite:///:memory:', encoding='utf-8')
+    base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+class TestBlobStore(object):
+    def test_abstract(self):
+        with pytest.raises(TypeError):
+            BlobStore()
+
+
+class TestLocalBlobStore(object):
+    def test_store_and_load(self, tmpdir):
+        store = LocalBlobStore(str(tmpdir), min_size=100)
+        page = '<html>' + 'x' * 1000 + '</html>'
+        reference = store.store(page)
+        assert reference.startswith(reference_prefix)
+        assert store.store(page) == reference
+        assert store.store('<html></html>') == '<html></html>'
+        assert store.store(None) is None
+        assert store.load(reference) == page
+        assert store.load('<html></html>') == '<html></html>'
+        # identical values are stored once, and compressed
+        blobs = [os.path.join(path, name) for path, directories, names in os.walk(str(tmpdir)) for name in names]
+        assert len(blobs) == 1 and os.path.getsize(blobs[0]) < 100
+
+    def test_run_data(self, new_db, tmpdir):
+        user = User(email='blob@haim.it', name='blob')
+        recipe = Recipe(name='blob', owner=user)
+        recipe.steps.append(RecipeStep(sort=1, type=RecipeStepTypeEnum.get_htmlsource))
+        run = Run(recipe=recipe, instance=Instance(name='blob', owner=user), status=RunStatusEnum.in_progress)
+        run.blob_store = LocalBlobStore(str(tmpdir), min_size=100)
+        new_db.add(run)
+        page = '<html>' + 'x' * 1000 + '</html>'
+        run.data.append(Data(step=recipe.steps[0], value=page))
+        run.data.append(Data(step=recipe.steps[0], value='small'))
+        run.flush_results()
+        run.data.append(Data(step=recipe.steps[0], value=page))
+        run.flush_results()
+        assert [data.value[:len(reference_prefix)] for data in new_db.query(Data).order_by(Data.uid)] == \
+            [reference_prefix, 'small', reference_prefix]
+        assert [data.value for data in run.get_all_data()] == [page, 'small', page]
+        assert run.get_data_item(1) == page
+        new_db.commit()
+        assert new_db.query(Data).first().value.startswith(reference_prefix)
+        assert [data['value'] for data in run.jsonify(include_data=True, blob_store=run.blob_store)['data']] == \
+            [page, 'small', page]
+        assert run.jsonify(include_data=True)['data'][0]['value'].startswith(reference_prefix)
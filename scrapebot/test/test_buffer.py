@@ -0,0 +1,112 @@
+import os
+import pytest
+from scrapebot.database import *
+from scrapebot.buffer import RunBuffer, get_buffer_engine
+from scrapebot.test.test_database import make_scheduled_instance
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.fixture
+def central_engine():
+    engine = create_engine('sqlite:///:memory:', encoding='utf-8')
+    base.metadata.create_all(engine)
+    make_scheduled_instance(sessionmaker(bind=engine)(), [15, 30])
+    return engine
+
+
+def record_run(db, status, rows):
+    run = Run(recipe=db.query(Recipe).order_by(Recipe.uid).first(), instance=db.query(Instance).one(), status=status)
+    db.add(run)
+    run.flush_results()
+    step = run.recipe.steps[0]
+    for i in range(rows):
+        run.log.append(Log(message='log ' + str(i)))
+        run.data.append(Data(step=step, value='data ' + str(i)))
+    run.flush_results()
+    if status is not RunStatusEnum.in_progress:
+        RunStats.record(db, run)
+        db.commit()
+    return run
+
+
+class TestRunBuffer(object):
+    def test_sync(self, central_engine, tmpdir):
+        run_buffer = RunBuffer(get_buffer_engine(os.path.join(str(tmpdir), 'buffer.db')), central_engine,
+                               'scheduler_instance', batch_size=2)
+        assert run_buffer.sync() == 0
+        db = sessionmaker(bind=run_buffer.get_engine())()
+        assert db.query(Instance).one().name == 'scheduler_instance'
+        assert [len(recipe.steps) for recipe in db.query(Recipe).order_by(Recipe.uid)] == [1, 1]
+        for i in range(3):
+            record_run(db, RunStatusEnum.success, i + 1)
+        record_run(db, RunStatusEnum.in_progress, 1)
+        assert run_buffer.count_pending() == 3
+        assert run_buffer.sync() == 3
+        # finished runs moved to the central database, with their log entries and data referring to their new uids
+        assert db.query(Run).one().status is RunStatusEnum.in_progress
+        central_db = sessionmaker(bind=central_engine)()
+        assert [len(run.log) for run in central_db.query(Run).order_by(Run.uid)] == [1, 2, 3]
+        assert [data.value for data in central_db.query(Run).order_by(Run.uid).all()[-1].data] == \
+            ['data 0', 'data 1', 'data 2']
+        assert central_db.query(RunStats).one().run_count == 3
+        assert db.query(RunStats).one().run_count == 3
+        assert run_buffer.sync() == 0
+        assert central_db.query(Run).count() == 3
+
+    def test_sync_interrupted(self, central_engine, tmpdir):
+        run_buffer = RunBuffer(get_buffer_engine(os.path.join(str(tmpdir), 'buffer.db')), central_engine,
+                               'scheduler_instance')
+        run_buffer.sync()
+        db = sessionmaker(bind=run_buffer.get_engine())()
+        record_run(db, RunStatusEnum.success, 2)
+
+        # as if the runner was killed after the upload had been committed but before the buffer was cleared
+        def interrupt(connection, cursor, statement, *args):
+            if statement.startswith('DELETE'):
+                raise RuntimeError('killed')
+        event.listen(run_buffer.get_engine(), 'before_cursor_execute', interrupt)
+        with pytest.raises(RuntimeError):
+            run_buffer.sync()
+        event.remove(run_buffer.get_engine(), 'before_cursor_execute', interrupt)
+        assert run_buffer.count_pending() == 1
+        assert run_buffer.sync() == 0
+        assert run_buffer.count_pending() == 0
+        central_db = sessionmaker(bind=central_engine)()
+        assert [len(run.log) for run in central_db.query(Run)] == [2]
+        assert central_db.query(RunStats).one().run_count == 1
+        assert central_db.query(RunEvent).count() == 1
+
+    def test_sync_cookies(self, central_engine, tmpdir):
+        central_db = sessionmaker(bind=central_engine)()
+        central_db.query(Recipe).update({Recipe.cookies: True})
+        central_db.commit()
+        run_buffer = RunBuffer(get_buffer_engine(os.path.join(str(tmpdir), 'buffer.db')), central_engine,
+                               'scheduler_instance')
+        run_buffer.sync()
+        db = sessionmaker(bind=run_buffer.get_engine())()
+        run = record_run(db, RunStatusEnum.success, 1)
+        # as stored by the emulator when closing the session of a recipe with cookies
+        order = run.get_recipe_order()
+        order.cookies_from_last_run = '[{"name": "session", "value": "kept"}]'
+        uid = order.uid
+        db.commit()
+        assert run_buffer.sync() == 1
+        db.expire_all()
+        assert db.query(RecipeOrder).get(uid).cookies_from_last_run == '[{"name": "session", "value": "kept"}]'
+        assert central_db.query(RecipeOrder).get(uid).cookies_from_last_run == \
+            '[{"name": "session", "value": "kept"}]'
+        # unchanged cookies are not uploaded again
+        assert run_buffer.push_cookies() == 0
+
+    def test_unreachable(self, central_engine, tmpdir):
+        path = os.path.join(str(tmpdir), 'buffer.db')
+        RunBuffer(get_buffer_engine(path), central_engine, 'scheduler_instance').sync()
+        unreachable = create_engine('sqlite:///' + os.path.join(str(tmpdir), 'missing', 'central.db'))
+        run_buffer = RunBuffer(get_buffer_engine(path), unreachable, 'scheduler_instance', retries=2, backoff=0)
+        record_run(sessionmaker(bind=run_buffer.get_engine())(), RunStatusEnum.error, 1)
+        with pytest.raises(OperationalError):
+            run_buffer.sync()
+        assert run_buffer.count_pending() == 1
+        assert RunBuffer(get_buffer_engine(path), central_engine, 'scheduler_instance').sync() == 1
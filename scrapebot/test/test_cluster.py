@@ -0,0 +1,92 @@
+import os
+from datetime import datetime
+import pytest
+import threading
+from scrapebot.database import base, Instance, Recipe, Run, RunStatusEnum, RunLease
+from scrapebot.cluster import WorkQueue
+from scrapebot.test.test_database import make_scheduled_instance, add_finished_run
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import sessionmaker, scoped_session
+
+
+@pytest.fixture
+def new_engine(tmpdir):
+    # several workers need to share one database, which in-memory SQLite databases cannot
+    engine = create_engine('sqlite:///' + os.path.join(str(tmpdir), 'cluster.db'), encoding='utf-8',
+                           connect_args={'check_same_thread': False, 'timeout': 30})
+    base.metadata.create_all(engine)
+    return engine
+
+
+def make_worker(engine, name):
+    db = scoped_session(sessionmaker(bind=engine))
+    instance = db.query(Instance).filter(Instance.name == 'scheduler_instance').one()
+    return WorkQueue(db, instance, name=name), db
+
+
+class TestWorkQueue(object):
+    def test_register(self, new_engine):
+        make_scheduled_instance(scoped_session(sessionmaker(bind=new_engine)), [15])
+        queue, db = make_worker(new_engine, 'host_a')
+        queue.register()
+        queue.register()
+        make_worker(new_engine, 'host_b')[0].register()
+        assert [worker.name for worker in queue.get_active_workers()] == ['host_a', 'host_b']
+        assert len(db.query(Instance).one().workers) == 2
+
+    def test_claim_once(self, new_engine):
+        make_scheduled_instance(scoped_session(sessionmaker(bind=new_engine)), [15, 30])
+        queue, db = make_worker(new_engine, 'host_a')
+        first = queue.claim()
+        second = queue.claim(exclude={first.get_recipe_uid()})
+        assert first.get_recipe_uid() != second.get_recipe_uid()
+        assert queue.claim() is None
+        first.release()
+        assert queue.claim().get_recipe_uid() == first.get_recipe_uid()
+
+    def test_claim_only_due(self, new_engine):
+        db = scoped_session(sessionmaker(bind=new_engine))
+        instance = make_scheduled_instance(db, [15, 30])
+        recipe = db.query(Recipe).filter(Recipe.interval == 15).one()
+        add_finished_run(db, recipe, instance)
+        db.commit()
+        queue = make_worker(new_engine, 'host_a')[0]
+        lease = queue.claim()
+        assert lease.get_recipe_uid() != recipe.uid
+        assert queue.claim() is None
+        assert 0 < queue.get_sleep_time() <= 60
+
+    def test_several_workers(self, new_engine):
+        make_scheduled_instance(scoped_session(sessionmaker(bind=new_engine)), [15] * 6)
+        workers = [make_worker(new_engine, 'host_' + str(i))[0] for i in range(4)]
+        start = threading.Barrier(len(workers))
+        claimed = []
+        lock = threading.Lock()
+
+        def work(queue):
+            start.wait()
+            while True:
+                lease = queue.claim()
+                if lease is None:
+                    return
+                with lock:
+                    claimed.append(lease.get_recipe_uid())
+
+        threads = [threading.Thread(target=work, args=(queue,)) for queue in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(claimed) == sorted(uid for uid, in
+                                         scoped_session(sessionmaker(bind=new_engine)).query(Recipe.uid))
+        assert new_engine.execute(RunLease.__table__.select().where(RunLease.holder == None)).first() is None
+
+    def test_skip_locked_query(self, new_engine):
+        make_scheduled_instance(scoped_session(sessionmaker(bind=new_engine)), [15])
+        queue = make_worker(new_engine, 'host_a')[0]
+        query = queue.get_claim_query([1, 2], datetime.now())
+        assert 'SKIP LOCKED' in str(query.compile(dialect=postgresql.dialect()))
+        assert 'SKIP LOCKED' in str(query.compile(dialect=mysql.dialect()))
+        assert WorkQueue.supports_skip_locked(postgresql.dialect())
+        assert not WorkQueue.supports_skip_locked(sqlite.dialect())
@@ -31,3 +31,22 @@ class TestConfiguration(object):
 
     def test_get_fallback(self, new_configuration):
         assert new_configuration.get('foo', 'bar', 42) == 42
+
+    def test_db_engine_options(self, new_configuration):
+        assert new_configuration.get_db_engine_options() == {}
+        new_configuration.add_value('Database', 'PoolSize', 5)
+        new_configuration.add_value('Database', 'PoolOverflow', 0)
+        new_configuration.add_value('Database', 'PoolPrePing', 1)
+        new_configuration.add_value('Database', 'Timeout', 'never')
+        assert new_configuration.get_db_engine_options() == {'pool_size': 5, 'max_overflow': 0, 'pool_pre_ping': True}
+
+    def test_db_replica_string(self, new_configuration):
+        assert not new_configuration.has_replica()
+        assert new_configuration.get_db_engine_string(replica=True) is None
+        new_configuration.add_value('Database', 'Host', 'primary')
+        new_configuration.add_value('Database', 'ReplicaHost', 'replica')
+        new_configuration.add_value('Database', 'ReplicaUser', 'reader')
+        assert new_configuration.has_replica()
+        assert '@primary/' in new_configuration.get_db_engine_string()
+        assert new_configuration.get_db_engine_string(replica=True).split('://')[1].startswith('reader:')
+        assert '@replica/' in new_configuration.get_db_engine_string(replica=True)
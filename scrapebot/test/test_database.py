@@ -1,7 +1,48 @@
 import pytest
-from datetime import datetime
+from datetime import datetime, timedelta
 from scrapebot.database import *
 from scrapebot.emulate import RecipeStepTypeEnum
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, scoped_session
+
+
+@pytest.fixture
+def new_db():
+    engine = create_engine('sqlite:///:memory:', encoding='utf-8')
+    base.metadata.create_all(engine)
+    return scoped_session(sessionmaker(bind=engine))
+
+
+def make_scheduled_instance(db, intervals):
+    user = User(email='scheduler@haim.it', name='scheduler')
+    instance = Instance(name='scheduler_instance', owner=user)
+    for i, interval in enumerate(intervals):
+        recipe = Recipe(name='recipe_' + str(i), active=True, interval=interval, owner=user)
+        recipe.steps.append(RecipeStep(sort=1, type=RecipeStepTypeEnum.log, value='hello', active=True))
+        db.add(RecipeOrder(recipe=recipe, instance=instance))
+    db.add(instance)
+    db.commit()
+    return instance
+
+
+def add_finished_run(db, recipe, instance, status=RunStatusEnum.success, **kwargs):
+    run = Run(recipe=recipe, instance=instance, status=status, **kwargs)
+    db.add(run)
+    RunStats.record(db, run)
+    return run
+
+
+def make_stored_runs(db):
+    instance = make_scheduled_instance(db, [15, 30])
+    recipes = db.query(Recipe).order_by(Recipe.uid).all()
+    start = datetime.now() - timedelta(hours=1)
+    for runtime in range(1, 6):
+        db.add(Run(recipe=recipes[0] if runtime % 2 == 1 else recipes[1], instance=instance, runtime=runtime,
+                   status=RunStatusEnum.error if runtime == 4 else RunStatusEnum.success,
+                   created=start + timedelta(minutes=runtime)))
+    db.commit()
+    db.expire_all()
+    return instance
 
 
 @pytest.fixture
@@ -242,6 +283,34 @@ class TestInstance(object):
         instance = new_run.instance
         assert instance.get_latest_runs().__len__() == 1
 
+    def test_get_latest_runs_stored(self, new_db):
+        instance = make_stored_runs(new_db)
+        recipes = new_db.query(Recipe).order_by(Recipe.uid).all()
+        assert [run.runtime for run in instance.get_latest_runs(3)] == [5, 4, 3]
+        assert instance.get_latest_run(recipes[1]).runtime == 4
+        assert instance.get_latest_run(recipes[1], only_include_successful_runs=True).runtime == 2
+        assert [run.runtime for run in instance.get_latest_runs(10, recipes[0], True)] == [5, 3, 1]
+        assert 'runs' not in instance.__dict__
+
+    def test_get_recipe_schedule(self, new_db):
+        instance = make_scheduled_instance(new_db, [15, 30, 45])
+        recipes = new_db.query(Recipe).order_by(Recipe.uid).all()
+        recipes[1].steps[0].active = False
+        recipes[2].active = False
+        add_finished_run(new_db, recipes[0], instance)
+        add_finished_run(new_db, recipes[0], instance, RunStatusEnum.error)
+        new_db.commit()
+        schedule = instance.get_recipe_schedule()
+        assert [recipe for recipe, active_steps, latest_run_created, now in schedule] == recipes[:2]
+        for recipe, active_steps, latest_run_created, now in schedule:
+            if recipe is recipes[0]:
+                assert active_steps == 1
+                assert isinstance(latest_run_created, datetime)
+            else:
+                assert active_steps == 0
+                assert latest_run_created is None
+            assert isinstance(now, datetime)
+
 
 class TestRecipeOrder(object):
     def test_jsonify(self, new_recipe_order):
@@ -288,6 +357,20 @@ class TestRecipe(object):
         recipe = new_run.recipe
         assert recipe.get_latest_runs().__len__() == 1
 
+    def test_get_latest_runs_stored(self, new_db):
+        instance = make_stored_runs(new_db)
+        recipe = new_db.query(Recipe).order_by(Recipe.uid).first()
+        assert recipe.get_latest_run(instance).runtime == 5
+        assert [run.runtime for run in recipe.get_latest_runs(2)] == [5, 3]
+        assert recipe.get_latest_run(Instance(name='other_instance', owner=instance.owner)) is None
+        assert 'runs' not in recipe.__dict__
+
+    def test_is_due(self, new_recipe):
+        now = datetime.now()
+        assert new_recipe.is_due(None, now)
+        assert new_recipe.is_due(now - timedelta(minutes=new_recipe.interval), now)
+        assert new_recipe.is_due(now - timedelta(minutes=1), now) is False
+
 
 class TestRecipeStep(object):
     @pytest.mark.parametrize('new_type', [RecipeStepTypeEnum.scroll_to, RecipeStepTypeEnum.write_slowly])
@@ -316,6 +399,170 @@ class TestRun(object):
         run = make_run(new_recipe_order.recipe, new_recipe_order.instance)
         assert run.get_recipe_order() is new_recipe_order
 
+    def test_get_emulator(self, new_run):
+        assert new_run.get_emulator() is new_run.get_emulator()
+        assert new_run.get_emulator() is not make_run(new_run.recipe, new_run.instance).get_emulator()
+
+    def test_get_data_item(self, new_run, new_recipe_step):
+        assert new_run.get_data_item(new_recipe_step.sort) is None
+        new_run.data.append(Data(step=new_recipe_step, value='first'))
+        new_run.data.append(Data(step=new_recipe_step, value='second'))
+        assert new_run.get_data_item(new_recipe_step.sort) == 'first'
+
+    def test_paginate(self, new_db):
+        instance = make_stored_runs(new_db)
+        # a run created at the same time as another one is still listed exactly once
+        same_time = new_db.query(Run).filter(Run.runtime == 3).one()
+        new_db.add(Run(recipe=same_time.recipe, instance=instance, runtime=6, created=same_time.created))
+        new_db.commit()
+        runtimes = []
+        cursor = None
+        for i in range(3):
+            runs, cursor = Run.paginate(new_db.query(Run), cursor, 2)
+            runtimes.append([run.runtime for run in runs])
+        assert runtimes == [[5, 4], [6, 3], [2, 1]]
+        assert cursor is None
+        query = new_db.query(Run).filter(Run.recipe_uid == same_time.recipe_uid)
+        assert [run.runtime for run in Run.paginate(query, limit=10)[0]] == [5, 6, 3, 1]
+        assert Run.parse_cursor(same_time.get_cursor()) == same_time.uid
+
+    def test_paginate_same_second(self, new_db):
+        instance = make_scheduled_instance(new_db, [15])
+        recipe = new_db.query(Recipe).one()
+        # dates set by the database itself, which SQLite stores without microseconds
+        for runtime in range(1, 6):
+            new_db.add(Run(recipe=recipe, instance=instance, runtime=runtime))
+        new_db.commit()
+        runtimes = []
+        cursor = None
+        for i in range(3):
+            runs, cursor = Run.paginate(new_db.query(Run), cursor, 2)
+            runtimes.append([run.runtime for run in runs])
+        assert runtimes == [[5, 4], [3, 2], [1]]
+        assert cursor is None
+
+    def test_get_latest_uids(self, new_db):
+        instance = make_stored_runs(new_db)
+        recipes = new_db.query(Recipe).order_by(Recipe.uid).all()
+        # runs in progress are included, as with get_latest_run
+        new_db.add(Run(recipe=recipes[1], instance=instance, status=RunStatusEnum.in_progress))
+        new_db.commit()
+        latest = Run.get_latest_uids(new_db, [instance.uid])
+        assert latest[(instance.uid, None)] == instance.get_latest_run().uid
+        for recipe in recipes:
+            assert latest[(instance.uid, recipe.uid)] == instance.get_latest_run(recipe).uid
+        assert Run.get_latest_uids(new_db, [instance.uid], [recipes[0].uid]) == {
+            (instance.uid, None): instance.get_latest_run(recipes[0]).uid,
+            (instance.uid, recipes[0].uid): instance.get_latest_run(recipes[0]).uid
+        }
+        assert Run.get_latest_uids(new_db, []) == {}
+
+    def test_fail_abandoned(self, new_db):
+        instance = make_scheduled_instance(new_db, [15, 30])
+        recipes = new_db.query(Recipe).order_by(Recipe.uid).all()
+        yesterday = datetime.now() - timedelta(days=1)
+        abandoned = Run(recipe=recipes[0], instance=instance, status=RunStatusEnum.in_progress, created=yesterday)
+        # a run going on for that long still holds its lease
+        leased = Run(recipe=recipes[1], instance=instance, status=RunStatusEnum.in_progress, created=yesterday)
+        new_db.add(RunLease(recipe_uid=recipes[1].uid, instance_uid=instance.uid, holder='runner',
+                            expires=datetime.now() + timedelta(minutes=5)))
+        recent = Run(recipe=recipes[0], instance=instance, status=RunStatusEnum.in_progress)
+        new_db.add_all([abandoned, leased, recent])
+        new_db.commit()
+        assert Run.fail_abandoned(new_db, datetime.now() - timedelta(hours=1), instance) == 1
+        new_db.commit()
+        assert [abandoned.status, leased.status, recent.status] == \
+            [RunStatusEnum.error, RunStatusEnum.in_progress, RunStatusEnum.in_progress]
+        assert [entry.type for entry in abandoned.log] == [LogTypeEnum.error]
+        assert recipes[0].stats[0].error_count == 1
+        assert new_db.query(RunEvent).filter(RunEvent.run_uid == abandoned.uid).one().status == RunStatusEnum.error
+        assert Run.fail_abandoned(new_db, datetime.now() - timedelta(hours=1)) == 0
+
+    def test_flush_results(self, new_db):
+        instance = make_scheduled_instance(new_db, [15])
+        step = new_db.query(Recipe).one().steps[0]
+        run = Run(recipe=step.recipe, instance=instance, status=RunStatusEnum.in_progress)
+        new_db.add(run)
+        assert run.flush_results() == 0
+        assert run.uid is not None
+        for i in range(3):
+            run.log.append(Log(message='log ' + str(i)))
+            run.data.append(Data(step=step, value=str(i)))
+        assert run.flush_results(False) == 0
+        run.flush_rows = 5
+        assert run.flush_results(False) == 6
+        assert len(run.log) == 0 and len(run.data) == 0
+        assert new_db.query(Log).filter(Log.run_uid == run.uid).count() == 3
+        run.data.append(Data(step=step, value='3'))
+        assert [data.value for data in run.get_all_data()] == ['0', '1', '2', '3']
+        assert run.flush_results() == 1
+        assert [data.step.uid for data in run.get_all_data()] == [step.uid] * 4
+        assert run.get_data_item(step.sort) == '0'
+        # pending entries are stored once, even if the run has been expired by a commit in between
+        new_db.commit()
+        run.log.append(Log(message='log 3'))
+        assert run.flush_results() == 1
+        assert new_db.query(Log).filter(Log.run_uid == run.uid).count() == 4
+
+    def test_flush_compact_log(self, new_db):
+        instance = make_scheduled_instance(new_db, [15])
+        run = Run(recipe=new_db.query(Recipe).one(), instance=instance, status=RunStatusEnum.in_progress)
+        run.compact_log = True
+        run.log_level = LogTypeEnum.warning
+        new_db.add(run)
+        run.log.append(Log(message='skipped'))
+        run.log.append(Log(message='first', type=LogTypeEnum.warning))
+        run.flush_results()
+        run.log.append(Log(message='second', type=LogTypeEnum.error))
+        run.flush_results()
+        assert new_db.query(Log).count() == 0
+        # one chunk appended per flush
+        assert [(log_blob.sequence, log_blob.entry_count) for log_blob in new_db.query(LogBlob).order_by(LogBlob.uid)] \
+            == [(0, 1), (1, 1)]
+        new_db.expire_all()
+        assert [(log.type, log.message) for log in run.get_log()] == \
+            [(LogTypeEnum.warning, 'first'), (LogTypeEnum.error, 'second')]
+        # entries are dated by the database when stored
+        assert [log.created for log in run.get_log()] == [log_blob.created for log_blob in run.log_blobs]
+        result = run.jsonify(include_log=True)
+        assert [log['message'] for log in result['log']] == ['first', 'second']
+        assert result['log'][0].keys() == {'uid', 'created', 'type', 'message', 'run_uid'}
+
+
+class TestRunStats(object):
+    def test_record(self, new_db):
+        instance = make_scheduled_instance(new_db, [15])
+        recipe = new_db.query(Recipe).one()
+        start = datetime.now() - timedelta(hours=1)
+        for i, runtime in enumerate([10, 20, 30]):
+            add_finished_run(new_db, recipe, instance, RunStatusEnum.error if i == 2 else RunStatusEnum.success,
+                             runtime=runtime, created=start + timedelta(minutes=i))
+        new_db.commit()
+        stats = new_db.query(RunStats).one()
+        assert (stats.run_count, stats.error_count) == (3, 1)
+        assert (stats.runtime_sum, stats.runtime_min, stats.runtime_max) == (60, 10, 30)
+        assert stats.runtime_ewma == pytest.approx(.2 * 30 + .8 * (.2 * 20 + .8 * 10))
+        assert stats.last_run.runtime == 30
+        assert stats.last_run_status is RunStatusEnum.error
+        assert stats.last_success_run.runtime == 20
+        assert recipe.get_average_runtime() == 20
+        assert instance.get_run_count() == 3
+        assert instance.jsonify(include_latest_run=True, recipe=recipe)['latest_run']['runtime'] == 30
+
+    def test_rebuild(self, new_db):
+        instance = make_stored_runs(new_db)
+        new_db.add(Run(recipe=new_db.query(Recipe).first(), instance=instance, status=RunStatusEnum.in_progress))
+        new_db.commit()
+        assert RunStats.rebuild(new_db.connection()) == 2
+        new_db.commit()
+        stats = new_db.query(RunStats).order_by(RunStats.recipe_uid).all()
+        assert [temp_stats.run_count for temp_stats in stats] == [3, 2]
+        assert [temp_stats.error_count for temp_stats in stats] == [0, 1]
+        assert stats[0].last_run.runtime == 5
+        assert stats[1].last_run_status is RunStatusEnum.error
+        assert stats[1].last_success_run.runtime == 2
+        assert instance.get_latest_stats() is stats[0]
+
 
 class TestLog(object):
     @pytest.mark.parametrize('new_type', [LogTypeEnum.info, LogTypeEnum.error])
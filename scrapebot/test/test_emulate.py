@@ -2,8 +2,9 @@ from time import time
 import pytest
 from scrapebot.test.test_database import *
 from scrapebot.test.test_configuration import *
-from scrapebot.emulate import RecipeStepTypeEnum, Emulator
+from scrapebot.emulate import RecipeStepTypeEnum, Emulator, BrowserPool, step_handlers
 from scrapebot.database import base, Recipe, RecipeStep, Instance, User, RecipeOrder, Run, RunStatusEnum
+from selenium.common.exceptions import WebDriverException
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, scoped_session
 
@@ -44,6 +45,72 @@ def test_step_run_with_fixed_item(new_recipe_step_item):
         assert run.data.__len__() == 0
 
 
+def test_step_handlers():
+    for step_type in RecipeStepTypeEnum:
+        assert step_type in step_handlers
+
+
+class FakeSession(object):
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeElement(object):
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeSelenium(object):
+    def __init__(self, fail=False):
+        self.calls = 0
+        self.fail = fail
+
+    def execute_script(self, script, elements, *arguments):
+        self.calls = self.calls + 1
+        if self.fail:
+            raise WebDriverException('script failed')
+        return [element.text.upper() for element in elements]
+
+
+class TestBulkValues(object):
+    def test_single_round_trip_per_bulk(self):
+        selenium = FakeSelenium()
+        elements = [FakeElement('text ' + str(i)) for i in range(Emulator.bulk_size * 2 + 1)]
+        values = Emulator.get_bulk_values(selenium, elements, Emulator.bulk_text_script, lambda element: element.text)
+        assert selenium.calls == 3
+        assert values == ['TEXT ' + str(i) for i in range(len(elements))]
+        assert Emulator.get_bulk_values(selenium, [], Emulator.bulk_text_script, lambda element: element.text) == []
+        assert selenium.calls == 3
+
+    def test_fallback(self):
+        selenium = FakeSelenium(fail=True)
+        values = Emulator.get_bulk_values(selenium, [FakeElement('a'), FakeElement('b')], Emulator.bulk_text_script,
+                                          lambda element: element.text)
+        assert values == ['a', 'b']
+
+
+class TestBrowserPool(object):
+    def test_acquire_release(self):
+        pool = BrowserPool()
+        session = FakeSession()
+        assert pool.acquire('Firefox') is None
+        assert pool.release('Firefox', session, 1)
+        assert pool.release('Firefox', FakeSession(), 1) is False
+        assert pool.acquire('Chrome') is None
+        assert pool.acquire('Firefox') is session
+        assert pool.acquire('Firefox') is None
+
+    def test_close_all(self):
+        pool = BrowserPool()
+        session = FakeSession()
+        pool.release('Firefox', session, 1)
+        pool.close_all()
+        assert session.closed
+        assert pool.acquire('Firefox') is None
+
+
 class TestEmulator(object):
     def test_run_init_firefox(self, new_configuration, new_emulator, new_run, new_recipe_step):
         handler = new_emulator.run(new_configuration, new_run, new_recipe_step)
@@ -0,0 +1,94 @@
+import os
+import pytest
+from datetime import datetime, timedelta
+from scrapebot.database import *
+from scrapebot.events import EventFeed
+from scrapebot.test.test_database import make_scheduled_instance
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.fixture
+def new_engine(tmpdir):
+    # a file rather than memory, so that the feed and the runs use separate connections to the same database
+    engine = create_engine('sqlite:///' + os.path.join(str(tmpdir), 'events.db'), encoding='utf-8')
+    base.metadata.create_all(engine)
+    return engine
+
+
+def start_run(db):
+    run = Run(recipe=db.query(Recipe).order_by(Recipe.uid).first(), instance=db.query(Instance).one(),
+              status=RunStatusEnum.in_progress)
+    db.add(run)
+    RunEvent.record(db, run, RunEventTypeEnum.started)
+    db.commit()
+    return run
+
+
+def finish_run(db, run):
+    run.status = RunStatusEnum.success
+    run.runtime = 3
+    RunEvent.record(db, run, RunEventTypeEnum.finished)
+    db.commit()
+
+
+class TestRunEvent(object):
+    def test_query_since(self, new_engine):
+        db = sessionmaker(bind=new_engine)()
+        make_scheduled_instance(db, [15])
+        run = start_run(db)
+        finish_run(db, run)
+        events = [RunEvent.jsonify_row(row) for row in RunEvent.query_since(new_engine)]
+        assert [(event['type'], event['run']['status']) for event in events] == \
+            [('started', 'in_progress'), ('finished', 'success')]
+        assert events[1]['run']['uid'] == run.uid and events[1]['run']['runtime'] == 3
+        assert events[1]['run']['recipe'] == {'uid': run.recipe_uid, 'name': run.recipe.name}
+        assert events[1]['run']['instance'] == {'uid': run.instance_uid, 'name': 'scheduler_instance'}
+        assert len(RunEvent.query_since(new_engine, events[0]['uid'])) == 1
+        assert RunEvent.prune(new_engine, datetime.utcnow() - timedelta(days=1)) == 0
+        assert RunEvent.prune(new_engine, datetime.utcnow() + timedelta(days=1)) == 2
+
+
+class TestEventFeed(object):
+    def test_poll(self, new_engine):
+        db = sessionmaker(bind=new_engine)()
+        make_scheduled_instance(db, [15])
+        finish_run(db, start_run(db))
+        # events from before the feed started are not replayed
+        feed = EventFeed(lambda: new_engine, interval=3600, size=3)
+        feed.start()
+        latest_uid = feed.get_latest_uid()
+        assert feed.get_events(latest_uid) == []
+        assert feed.wait(latest_uid, 0) == []
+        run = start_run(db)
+        assert feed.poll() == 1
+        assert [event['type'] for event in feed.wait(latest_uid, 1)] == ['started']
+        finish_run(db, run)
+        finish_run(db, start_run(db))
+        assert feed.poll() == 3
+        assert [event['run']['status'] for event in feed.get_events(latest_uid + 1)] == \
+            ['success', 'in_progress', 'success']
+        # clients that fell behind further than the events kept need to reload everything
+        assert feed.get_events(latest_uid) is None
+
+    def test_poll_out_of_order(self, new_engine):
+        db = sessionmaker(bind=new_engine)()
+        make_scheduled_instance(db, [15])
+        feed = EventFeed(lambda: new_engine, interval=3600, grace=3600)
+        feed.start()
+        # an event committed before the one with the preceding uid (e.g., by another runner) is held back
+        run = start_run(db)
+        new_engine.execute(RunEvent.__table__.insert().values(uid=3, type=RunEventTypeEnum.finished, run_uid=run.uid))
+        assert feed.poll() == 1
+        assert feed.get_latest_uid() == 1
+        new_engine.execute(RunEvent.__table__.insert().values(uid=2, type=RunEventTypeEnum.started, run_uid=run.uid))
+        assert feed.poll() == 2
+        assert [event['uid'] for event in feed.get_events(1)] == [2, 3]
+        # until the grace period has passed, e.g., as the missing event has been rolled back
+        new_engine.execute(RunEvent.__table__.insert().values(uid=5, type=RunEventTypeEnum.started, run_uid=run.uid))
+        assert feed.poll() == 0
+        feed = EventFeed(lambda: new_engine, interval=3600, grace=0)
+        feed.start()
+        new_engine.execute(RunEvent.__table__.insert().values(uid=7, type=RunEventTypeEnum.started, run_uid=run.uid))
+        assert feed.poll() == 1
+        assert feed.get_latest_uid() == 7
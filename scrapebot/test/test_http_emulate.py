@@ -0,0 +1,90 @@
+import pytest
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from scrapebot.test.test_configuration import make_configuration
+from scrapebot.database import User, Instance, Recipe, RecipeStep, RecipeStepTypeEnum, RecipeEngineEnum, Run, \
+    RunStatusEnum
+from scrapebot.http_emulate import HttpEmulator
+from scrapebot.plan import ExecutionPlan
+
+PAGE = '<html><head><title> Fixture   page </title><style>p { color: red; }</style></head><body>' \
+       '<p class="item">First <b>item</b></p><p class="item">Second item<script>var x = 1;</script></p>' \
+       '<a href="/one">One</a><a href="https://example.org/two">Two</a></body></html>'
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.end_headers()
+        self.wfile.write(PAGE.encode('utf-8'))
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def fixture_server():
+    server = HTTPServer(('127.0.0.1', 0), FixtureHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:' + str(server.server_address[1])
+    server.shutdown()
+
+
+def make_recipe(step_types, engine=RecipeEngineEnum.auto, cookies=False):
+    recipe = Recipe(name='http', active=True, cookies=cookies, engine=engine, owner=User(name='http'))
+    for i, step_type in enumerate(step_types):
+        recipe.steps.append(RecipeStep(sort=i+1, type=step_type, active=True, use_data_item_instead_of_value=0,
+                                       use_random_item_instead_of_value=False))
+    return recipe
+
+
+def run_recipe(recipe, values):
+    config = make_configuration('')
+    run = Run(recipe=recipe, instance=Instance(name='http_instance'))
+    prior_step = None
+    for step, value in zip(recipe.steps, values):
+        step.value = value
+        assert step.run(config, run, prior_step) is RunStatusEnum.success
+        if step.temp_result is None and prior_step is not None:
+            step.temp_result = prior_step.temp_result
+        prior_step = step
+    run.end_session()
+    return run
+
+
+class TestHttpEmulator(object):
+    def test_get_engine(self):
+        assert make_recipe([RecipeStepTypeEnum.navigate, RecipeStepTypeEnum.get_htmlsource]).get_engine() is \
+            RecipeEngineEnum.http
+        assert make_recipe([RecipeStepTypeEnum.navigate, RecipeStepTypeEnum.click]).get_engine() is \
+            RecipeEngineEnum.browser
+        assert make_recipe([RecipeStepTypeEnum.navigate], cookies=True).get_engine() is RecipeEngineEnum.browser
+        assert make_recipe([RecipeStepTypeEnum.navigate], engine=None).get_engine() is RecipeEngineEnum.browser
+        assert make_recipe([RecipeStepTypeEnum.navigate], engine=RecipeEngineEnum.browser).get_engine() is \
+            RecipeEngineEnum.browser
+
+    def test_plan_rejects_unsupported_steps(self):
+        recipe = make_recipe([RecipeStepTypeEnum.navigate, RecipeStepTypeEnum.click], engine=RecipeEngineEnum.http)
+        assert not ExecutionPlan(recipe.steps, HttpEmulator.handlers).is_valid()
+
+    def test_css_and_texts(self, fixture_server):
+        recipe = make_recipe([RecipeStepTypeEnum.navigate, RecipeStepTypeEnum.find_by_css,
+                              RecipeStepTypeEnum.get_texts, RecipeStepTypeEnum.get_pagetitle])
+        run = run_recipe(recipe, [fixture_server + '/page', 'p.item', None, None])
+        assert isinstance(run.get_emulator(), HttpEmulator)
+        assert [data.value for data in run.data] == ['2', 'First item', 'Second item', 'Fixture page']
+
+    def test_xpath_and_attributes(self, fixture_server):
+        recipe = make_recipe([RecipeStepTypeEnum.navigate, RecipeStepTypeEnum.find_by_xpath,
+                              RecipeStepTypeEnum.get_attributes, RecipeStepTypeEnum.get_attribute])
+        run = run_recipe(recipe, [fixture_server + '/dir/page', '//a', 'href', 'title'])
+        assert [data.value for data in run.data] == \
+            ['2', fixture_server + '/one', 'https://example.org/two', 'None']
+
+    def test_htmlsource(self, fixture_server):
+        recipe = make_recipe([RecipeStepTypeEnum.navigate, RecipeStepTypeEnum.get_htmlsource])
+        run = run_recipe(recipe, [fixture_server, None])
+        assert run.data[0].value == PAGE
+        assert run.log[-1].message == 'HTTP session closed'
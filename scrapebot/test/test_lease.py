@@ -0,0 +1,105 @@
+import time
+import pytest
+from datetime import datetime, timedelta
+from scrapebot.database import base, RunLease
+from scrapebot.lease import Lease
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+
+
+@pytest.fixture
+def new_engine():
+    engine = create_engine('sqlite:///:memory:', encoding='utf-8')
+    base.metadata.create_all(engine)
+    return engine
+
+
+class TestLease(object):
+    def test_exclusive(self, new_engine):
+        lease = Lease(new_engine, 1, 1)
+        assert lease.acquire()
+        assert Lease(new_engine, 1, 1).acquire() is False
+        assert Lease(new_engine, 2, 1).acquire()
+        assert Lease(new_engine, 1, 2).acquire()
+        lease.release()
+        assert Lease(new_engine, 1, 1).acquire()
+
+    def test_renew(self, new_engine):
+        lease = Lease(new_engine, 1, 1)
+        assert lease.renew() is False
+        assert lease.acquire()
+        assert lease.renew()
+        lease.release()
+        assert lease.renew() is False
+
+    def test_expired(self, new_engine):
+        lease = Lease(new_engine, 1, 1, duration=60)
+        assert lease.acquire()
+        new_engine.execute(RunLease.__table__.update().values(expires=datetime.now() - timedelta(days=1)))
+        other_lease = Lease(new_engine, 1, 1)
+        assert other_lease.acquire()
+        assert lease.renew() is False
+        lease.release()
+        assert Lease(new_engine, 1, 1).acquire() is False
+
+    def test_heartbeat(self, new_engine):
+        lease = Lease(new_engine, 1, 1, duration=60)
+        assert lease.acquire()
+        lease.start_heartbeat()
+        lease.release()
+        assert Lease(new_engine, 1, 1).acquire()
+
+    def test_release_with_retry(self, new_engine):
+        lease = Lease(new_engine, 1, 1, duration=60)
+        assert lease.acquire()
+        lease.release(retry_after=60)
+        assert Lease(new_engine, 1, 1).acquire() is False
+        new_engine.execute(RunLease.__table__.update().values(expires=datetime.now() - timedelta(days=1)))
+        assert Lease(new_engine, 1, 1).acquire()
+
+    def test_adopt(self, new_engine):
+        holder = Lease.create_holder()
+        assert Lease(new_engine, 1, 1, holder=holder).acquire()
+        lease = Lease(new_engine, 1, 1, holder=holder)
+        lease.adopt()
+        assert lease.renew()
+        lease.release()
+        assert Lease(new_engine, 1, 1).acquire()
+
+    def test_lock_file_fallback(self, tmpdir):
+        engine = create_engine('sqlite:///:memory:', encoding='utf-8')
+        lease = Lease(engine, 1, 1, lock_dir=str(tmpdir))
+        assert lease.acquire()
+        assert lease.is_file_based()
+        assert lease.renew()
+        assert Lease(engine, 1, 1, lock_dir=str(tmpdir)).acquire() is False
+        lease.release()
+        assert Lease(engine, 1, 1, lock_dir=str(tmpdir)).acquire()
+
+    def test_lock_file_left_behind(self, tmpdir):
+        engine = create_engine('sqlite:///:memory:', encoding='utf-8')
+        # lock files of runners that have died are not locked any more, however recent they are
+        tmpdir.join('scrapebot_1_1.lock').write('dead:1:holder')
+        lease = Lease(engine, 1, 1, lock_dir=str(tmpdir))
+        assert lease.acquire()
+        lease.release(retry_after=60)
+        assert Lease(engine, 1, 1, lock_dir=str(tmpdir)).acquire() is False
+        tmpdir.join('scrapebot_1_1.lock').write('')
+        assert Lease(engine, 1, 1, lock_dir=str(tmpdir)).acquire()
+
+    def test_lost(self, new_engine):
+        lease = Lease(new_engine, 1, 1, duration=.3)
+        assert lease.acquire()
+        lease.start_heartbeat()
+        assert lease.is_lost() is False
+        new_engine.execute(RunLease.__table__.update().values(holder='other'))
+        time.sleep(.5)
+        assert lease.is_lost()
+        lease.release()
+
+    def test_connection_error(self, tmpdir):
+        # a lock file would not keep runners on other hosts from running the same recipe
+        engine = create_engine('sqlite:///' + str(tmpdir.join('missing', 'lease.db')), encoding='utf-8')
+        with pytest.raises(OperationalError):
+            Lease(engine, 1, 1, lock_dir=str(tmpdir)).acquire()
+        assert tmpdir.listdir() == []
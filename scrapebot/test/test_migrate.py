@@ -0,0 +1,71 @@
+import pytest
+from scrapebot.database import base, User, Recipe, RecipeEngineEnum
+from scrapebot.migrate import SchemaMigrator, migrations
+from sqlalchemy import create_engine, inspect, MetaData, Table
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.fixture
+def new_engine():
+    return create_engine('sqlite:///:memory:', encoding='utf-8')
+
+
+def create_legacy_schema(engine):
+    """
+    Tables as created before any migration: recipes without engine, retention, and modification date, instances without
+    modification date, runs without origin, no composite indexes, and no run statistics
+    :param engine:
+    :return:
+    """
+    legacy = MetaData()
+    for table in base.metadata.sorted_tables:
+        if table.name in ('schemaversion', 'runstats'):
+            continue
+        elif table.name == 'recipe':
+            Table(table.name, legacy, *[column.copy() for column in table.columns
+                                        if column.name not in ('engine', 'retention', 'updated')])
+        elif table.name == 'instance':
+            Table(table.name, legacy, *[column.copy() for column in table.columns if column.name != 'updated'])
+        elif table.name == 'run':
+            Table(table.name, legacy, *[column.copy() for column in table.columns if column.name != 'origin'])
+        else:
+            table.tometadata(legacy).indexes.clear()
+    legacy.create_all(engine)
+
+
+def get_index_names(engine, table):
+    return [index['name'] for index in inspect(engine).get_indexes(table)]
+
+
+class TestSchemaMigrator(object):
+    def test_migrate_legacy(self, new_engine):
+        create_legacy_schema(new_engine)
+        new_engine.execute(User.__table__.insert().values(name='migration', email='migration@localhost'))
+        new_engine.execute("INSERT INTO recipe (name, owner_uid) VALUES ('legacy', 1)")
+        new_engine.execute("INSERT INTO instance (name, owner_uid) VALUES ('legacy', 1)")
+        new_engine.execute("INSERT INTO run (recipe_uid, instance_uid, status, runtime) VALUES (1, 1, 'success', 7)")
+        migrator = SchemaMigrator(new_engine)
+        assert migrator.get_version() == 0
+        assert len(migrator.get_pending()) == len(migrations)
+        assert [version for version, description in migrator.migrate()] == [1, 2, 3, 4, 5, 6, 7]
+        assert migrator.get_version() == 7
+        assert migrator.get_pending() == []
+        assert 'ix_run_recipe_instance_status_created' in get_index_names(new_engine, 'run')
+        assert 'ix_run_recipe_created_uid' in get_index_names(new_engine, 'run')
+        assert 'ix_run_instance_created_uid' in get_index_names(new_engine, 'run')
+        assert 'ix_run_origin' in get_index_names(new_engine, 'run')
+        assert 'ix_data_run_step' in get_index_names(new_engine, 'data')
+        assert 'ix_log_run_created' in get_index_names(new_engine, 'log')
+        assert 'ix_recipestep_recipe_sort' in get_index_names(new_engine, 'recipestep')
+        recipe = sessionmaker(bind=new_engine)().query(Recipe).one()
+        assert recipe.engine is RecipeEngineEnum.browser
+        assert recipe.retention is None
+        assert recipe.get_run_count() == 1
+        assert recipe.get_average_runtime() == 7
+
+    def test_migrate_fresh(self, new_engine):
+        migrator = SchemaMigrator(new_engine)
+        assert [version for version, description in migrator.migrate()] == [1, 2, 3, 4, 5, 6, 7]
+        assert migrator.migrate() == []
+        assert migrator.get_version() == 7
+        assert get_index_names(new_engine, 'log') == ['ix_log_run_created']
@@ -0,0 +1,29 @@
+from scrapebot.database import RecipeStep, RecipeStepItem, RecipeStepTypeEnum
+from scrapebot.plan import ExecutionPlan
+
+
+def make_step(sort, step_type=RecipeStepTypeEnum.log, data_item=0, random_item=False):
+    return RecipeStep(sort=sort, type=step_type, value='value', active=True, use_data_item_instead_of_value=data_item,
+                      use_random_item_instead_of_value=random_item)
+
+
+class TestExecutionPlan(object):
+    def test_valid(self):
+        steps = [make_step(1, RecipeStepTypeEnum.data), make_step(2, data_item=1)]
+        plan = ExecutionPlan(steps)
+        assert plan.is_valid()
+        assert plan.steps == steps
+
+    def test_data_item_of_later_step(self):
+        plan = ExecutionPlan([make_step(1, data_item=2), make_step(2, RecipeStepTypeEnum.data)])
+        assert not plan.is_valid()
+        assert 'step 2' in plan.errors[0]
+
+    def test_data_item_of_missing_step(self):
+        assert not ExecutionPlan([make_step(1), make_step(2, data_item=5)]).is_valid()
+
+    def test_random_item(self):
+        step = make_step(1, random_item=True)
+        assert not ExecutionPlan([step]).is_valid()
+        step.items.append(RecipeStepItem(value='item'))
+        assert ExecutionPlan([step]).is_valid()
@@ -0,0 +1,49 @@
+import pytest
+from datetime import timedelta
+from scrapebot.test.test_database import new_db, make_scheduled_instance, add_finished_run
+from scrapebot.database import Recipe, Run, RunStatusEnum
+from scrapebot.scheduler import Scheduler
+
+
+class TestScheduler(object):
+    def test_never_run_recipes_are_due(self, new_db):
+        instance = make_scheduled_instance(new_db, [15, 30])
+        scheduler = Scheduler(new_db, instance)
+        assert scheduler.refresh()
+        assert len(scheduler) == 2
+        assert scheduler.pop_due() is not None
+        assert scheduler.pop_due() is not None
+        assert scheduler.pop_due() is None
+
+    def test_recently_run_recipe_is_not_due(self, new_db):
+        instance = make_scheduled_instance(new_db, [15])
+        recipe = new_db.query(Recipe).one()
+        add_finished_run(new_db, recipe, instance)
+        new_db.commit()
+        scheduler = Scheduler(new_db, instance)
+        scheduler.refresh()
+        assert scheduler.pop_due() is None
+        assert 0 < scheduler.get_sleep_time() <= 60
+
+    def test_reschedule(self, new_db):
+        instance = make_scheduled_instance(new_db, [15])
+        scheduler = Scheduler(new_db, instance, retry_interval=120)
+        scheduler.refresh()
+        recipe = scheduler.pop_due()
+        run = Run(recipe=recipe, instance=instance, status=RunStatusEnum.success)
+        new_db.add(run)
+        new_db.commit()
+        scheduler.reschedule(recipe, run)
+        assert scheduler.get_next_due() == run.created + timedelta(minutes=15)
+        scheduler.pop_due()
+        scheduler.reschedule(recipe, None)
+        assert scheduler.get_next_due() - scheduler.now() <= timedelta(seconds=120)
+
+    def test_refresh_only_on_change(self, new_db):
+        instance = make_scheduled_instance(new_db, [15])
+        scheduler = Scheduler(new_db, instance, reload_interval=0)
+        assert scheduler.refresh()
+        assert not scheduler.refresh()
+        new_db.query(Recipe).one().interval = 5
+        new_db.commit()
+        assert scheduler.refresh()
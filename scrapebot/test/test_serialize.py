@@ -0,0 +1,132 @@
+import pytest
+from scrapebot.database import base, User, Instance, Recipe, RecipeStep, RecipeStepTypeEnum, Run, Log, Data, \
+    RecipeOrder, UserRecipePrivilege
+from scrapebot.serialize import Serializer, get_run_serializer, dump_recipes_with_latest_runs
+from scrapebot.acl import AccessControl
+from sqlalchemy import create_engine, event, func, or_
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.fixture
+def new_engine():
+    engine = create_engine('sqlite:///:memory:', encoding='utf-8')
+    base.metadata.create_all(engine)
+    return engine
+
+
+def make_stored_run(engine, rows):
+    db = sessionmaker(bind=engine)()
+    user = User(email='serialize@haim.it', name='serialize', password='secret')
+    recipe = Recipe(name='serialize', owner=user)
+    for sort in range(1, 3):
+        recipe.steps.append(RecipeStep(sort=sort, type=RecipeStepTypeEnum.get_text, value='value ' + str(sort)))
+    run = Run(recipe=recipe, instance=Instance(name='serialize', owner=user))
+    for i in range(rows):
+        run.log.append(Log(message='log ' + str(i)))
+        run.data.append(Data(step=recipe.steps[i % 2], value='data ' + str(i)))
+    db.add(run)
+    db.commit()
+    uid = run.uid
+    db.close()
+    return uid
+
+
+def count_queries(engine):
+    queries = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: queries.append(args[2]))
+    return queries
+
+
+def make_shared_recipes(engine):
+    db = sessionmaker(bind=engine)()
+    owner = User(email='owner@haim.it', name='owner')
+    guest = User(email='guest@haim.it', name='guest')
+    recipes = [Recipe(name='recipe_' + str(i), owner=owner if i < 4 else guest) for i in range(5)]
+    instances = [Instance(name='instance_' + str(i), owner=owner) for i in range(3)]
+    recipes[1].privileged_users.append(UserRecipePrivilege(user=guest, allowed_to_edit=False))
+    recipes[2].privileged_users.append(UserRecipePrivilege(user=guest, allowed_to_edit=True))
+    recipes[4].privileged_users.append(UserRecipePrivilege(user=owner, allowed_to_edit=True))
+    for i, recipe in enumerate(recipes):
+        for instance in instances[:i % 3 + 1]:
+            db.add(RecipeOrder(recipe=recipe, instance=instance))
+            if i != 3:
+                for status in range(2):
+                    db.add(Run(recipe=recipe, instance=instance, runtime=status))
+    db.commit()
+    return db, owner, guest, [instance.uid for instance in instances]
+
+
+def dump_recipes_legacy(db, user, instance_uids=None):
+    """
+    /json/recipes as it was implemented before, for comparison
+    """
+    data = []
+    for (recipe, latest_run_uid) in db.query(
+            Recipe,
+            func.max(Run.uid)
+        ).outerjoin(
+            UserRecipePrivilege,
+            UserRecipePrivilege.recipe_uid == Recipe.uid
+        ).outerjoin(
+            Run,
+            Run.recipe_uid == Recipe.uid
+        ).outerjoin(
+            RecipeOrder,
+            RecipeOrder.recipe_uid == Recipe.uid
+        ).filter(
+            or_(
+                Recipe.owner_uid == user.uid,
+                UserRecipePrivilege.user_uid == user.uid
+            ),
+            RecipeOrder.instance_uid.in_(instance_uids) if instance_uids is not None else 1 == 1
+        ).group_by(Recipe):
+        recipe_json = recipe.jsonify()
+        if latest_run_uid is not None:
+            run = db.query(Run).filter(Run.uid == latest_run_uid).one_or_none()
+            if run is not None:
+                recipe_json['latest_run'] = run.jsonify()
+        data.append(recipe_json)
+    return data
+
+
+class TestSerializer(object):
+    def test_run_with_log_and_data(self, new_engine):
+        uid = make_stored_run(new_engine, 50)
+        queries = count_queries(new_engine)
+        serializer = get_run_serializer(include_log=True, include_data=True)
+        run = serializer.query(sessionmaker(bind=new_engine)().query(Run)).filter(Run.uid == uid).one()
+        result = serializer.dump(run)
+        # the run joined with its recipe and instance, its log entries (as rows and as compact chunks), and its data
+        # joined with their steps
+        assert len(queries) == 4
+        assert result['recipe']['name'] == 'serialize'
+        assert result['instance']['owner_uid'] == result['recipe']['owner_uid']
+        assert 'owner' not in result['recipe']
+        assert len(result['log']) == 50
+        assert result['log'][0] == {'uid': result['log'][0]['uid'], 'created': result['log'][0]['created'],
+                                    'type': 'info', 'message': 'log 0', 'run_uid': uid}
+        assert result['data'][1]['step'] == {'uid': result['data'][1]['step_uid'], 'sort': 2, 'type': 'get_text',
+                                             'recipe_uid': result['recipe']['uid']}
+
+    def test_fields_and_hidden_columns(self, new_engine):
+        make_stored_run(new_engine, 1)
+        db = sessionmaker(bind=new_engine)()
+        assert 'password' not in Serializer(User).dump(db.query(User).one())
+        assert Serializer(Recipe, fields={Recipe: ('uid', 'name')}).dump(db.query(Recipe).one()).keys() == \
+            {'uid', 'name'}
+        with pytest.raises(ValueError):
+            Serializer(Run, ['data.step'])
+
+    @pytest.mark.parametrize('instances', [None, [0], [1, 2], []])
+    def test_recipes_with_latest_runs(self, new_engine, instances):
+        db, owner, guest, instance_uids = make_shared_recipes(new_engine)
+        instance_uids = None if instances is None else [instance_uids[i] for i in instances]
+        queries = count_queries(new_engine)
+        for user in (owner, guest):
+            legacy = dump_recipes_legacy(db, user, instance_uids)
+            db.expire_all()
+            acl = AccessControl(db, user)
+            del queries[:]
+            assert dump_recipes_with_latest_runs(db, acl, instance_uids) == legacy
+            # the recipes with their owners and the uids of their latest runs, and these runs
+            assert len(queries) <= 2
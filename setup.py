@@ -1,13 +1,17 @@
 import platform
 import os
+import argparse
 import getpass
 import sys
 import traceback
+from datetime import timedelta
 from crontab import CronTab
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, func
 from sqlalchemy.orm import sessionmaker, scoped_session
 from scrapebot.configuration import Configuration
-from scrapebot.database import base, User, Instance
+from scrapebot.database import base, User, Instance, Run, RunStats, RunEvent
+from scrapebot.migrate import SchemaMigrator
+from scrapebot.archive import RunArchive
 
 
 def main():
@@ -20,12 +24,14 @@ def main():
     print('- connecting to ' + config.get('Database', 'host', fallback='localhost'))
     try:
         engine = get_engine(config)
-        base.metadata.create_all(engine)
+        applied = SchemaMigrator(engine).migrate()
         db = get_db(engine)
     except:
         print('- uh, there is a problem with connecting to your database ...')
         exit(3)
     print('- read tables: ' + ', '.join(base.metadata.tables.keys()))
+    for version, description in applied:
+        print('- updated database schema to version ' + str(version) + ': ' + description)
     users = db.query(User).order_by(User.created).all()
     user = None
     if len(users) == 0:
@@ -55,6 +61,11 @@ def main():
         print('- instance name already registered, meaning that it has been used elsewhere')
         if read_bool_forcefully('- is this on purpose'):
             print('- okay, fair enough, proceeding ...')
+            if read_bool_forcefully('- should this machine share the instance\'s recipes with the other machines '
+                                    '(as a worker in a cluster, which requires daemon mode)'):
+                config.add_value('Instance', 'Cluster', '1')
+                config.write()
+                print('- alright, updated "config.ini"')
         else:
             instance_name = read_forcefully('- so how should this instance be called')
             config.add_value('Instance', 'Name', instance_name)
@@ -68,6 +79,7 @@ def main():
     print('Finishing up')
     print('- instance should be ready to use')
     print('- to run it once, use the script "scrapebot.py"')
+    print('- to keep it running and start recipes whenever they are due, use "scrapebot.py --daemon"')
     if platform.system() == 'Linux':
         print('- to run it regularly and since you are using Linux, I recommend a cronjob')
         os_user = getpass.getuser()
@@ -86,6 +98,68 @@ def main():
     db.close()
 
 
+def migrate():
+    config = get_config(False)
+    check_minimal_config(config)
+    print('Updating the database schema')
+    migrator = SchemaMigrator(get_engine(config))
+    print('- current version is ' + str(migrator.get_version()))
+    try:
+        applied = migrator.migrate()
+    except:
+        print('- uh, there is a problem with updating your database ...')
+        print('- ' + traceback.format_exc())
+        exit(3)
+    for version, description in applied:
+        print('- updated to version ' + str(version) + ': ' + description)
+    if len(applied) == 0:
+        print('- database schema is up to date')
+
+
+def rebuild_stats():
+    config = get_config(False)
+    check_minimal_config(config)
+    print('Rebuilding run statistics from all runs stored so far')
+    try:
+        with get_engine(config).begin() as connection:
+            count = RunStats.rebuild(connection)
+    except:
+        print('- uh, there is a problem with rebuilding the statistics ...')
+        print('- ' + traceback.format_exc())
+        exit(3)
+    print('- done, statistics of ' + str(count) + ' combination(s) of recipe and instance stored')
+
+
+def archive_runs():
+    config = get_config(False)
+    check_minimal_config(config)
+    default_retention = config.get('Database', 'ArchiveAfter', fallback=None)
+    archive = RunArchive(config.get('Database', 'ArchiveDirectory', fallback='archive/'))
+    print('Moving runs older than their recipes\' retention into the archive')
+    db = get_db(get_engine(config))
+    try:
+        archived = archive.archive(db, None if default_retention is None else int(default_retention))
+    except:
+        print('- uh, there is a problem with archiving runs ...')
+        print('- ' + traceback.format_exc())
+        db.close()
+        exit(3)
+    for recipe_uid, count in archived.items():
+        if count > 0:
+            print('- archived ' + str(count) + ' run(s) of recipe ' + str(recipe_uid))
+    print('- done, ' + str(sum(archived.values())) + ' run(s) archived')
+    # run events are only of interest to the web frontend while they are new
+    pruned = RunEvent.prune(db, db.query(func.now()).scalar() - timedelta(days=1))
+    db.commit()
+    print('- ' + str(pruned) + ' run event(s) older than a day deleted')
+    # runs of instances whose runner has not been started again since it was killed
+    failed = Run.fail_abandoned(db, db.query(func.now()).scalar() -
+                                timedelta(seconds=int(config.get('Instance', 'AbandonAfter', fallback=86400))))
+    db.commit()
+    print('- ' + str(failed) + ' abandoned run(s) marked as failed')
+    db.close()
+
+
 def create_user(db, username, email):
     email = email.lower()
     user = db.query(User).filter(User.email == email).first()
@@ -238,19 +312,15 @@ def check_minimal_config(config):
         return instance_name
 
 
-def get_engine(config):
-    database_timeout = -1
-    try:
-        database_timeout = int(config.get('Database', 'Timeout', fallback=-1))
-        if database_timeout > 0:
-            print('Reconnecting to MySQL (through SQLAlchemy\'s pool_recycle) every ' + str(database_timeout) +
-                  ' seconds')
-    except:
-        database_timeout = -1
+def get_engine(config, replica=False):
+    options = config.get_db_engine_options()
+    if 'pool_recycle' in options:
+        print('Reconnecting to MySQL (through SQLAlchemy\'s pool_recycle) every ' + str(options['pool_recycle']) +
+              ' seconds')
     try:
-        return create_engine(config.get_db_engine_string(), encoding='utf-8', pool_recycle=database_timeout)
+        return create_engine(config.get_db_engine_string(replica), encoding='utf-8', **options)
     except:
-        print('Error: Database engine could not be created (' + config.get_db_engine_string() + ')')
+        print('Error: Database engine could not be created (' + str(config.get_db_engine_string(replica)) + ')')
         error = sys.exc_info()[0]
         if error is not None:
             print('- ' + str(error))
@@ -272,4 +342,21 @@ def get_db(engine):
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Set up this ScrapeBot instance step by step.')
+    parser.add_argument('--migrate', action='store_true',
+                        help='only bring the database schema up to date (e.g., after an update), without any questions')
+    parser.add_argument('--rebuild-stats', action='store_true',
+                        help='only recompute the run statistics of all recipes from their runs (e.g., if runs have '
+                             'been deleted manually), without any questions')
+    parser.add_argument('--archive', action='store_true',
+                        help='only move runs older than their recipes\' retention from the database into the archive '
+                             '(e.g., through a daily cronjob), without any questions')
+    args = parser.parse_args()
+    if args.migrate:
+        migrate()
+    elif args.rebuild_stats:
+        rebuild_stats()
+    elif args.archive:
+        archive_runs()
+    else:
+        main()
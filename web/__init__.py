@@ -1,14 +1,25 @@
-from setup import get_config
+from setup import get_config, get_engine
 from scrapebot.database import User
-from flask import Flask
-from flask_login import LoginManager
+from scrapebot.acl import AccessControl
+from scrapebot.blobstore import get_blob_store
+from scrapebot.events import EventFeed
+from flask import Flask, g, _app_ctx_stack
+from flask_login import LoginManager, current_user
 from flask_bootstrap import Bootstrap
-from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy import SQLAlchemy, BaseQuery
 from flask_mail import Mail
+from sqlalchemy.orm import scoped_session, sessionmaker
 
 
 config = get_config(False)
 db = SQLAlchemy()
+# read-only queries (e.g., of JSON routes and downloads) go to the replica, if any, so they do not slow down runners
+replica_db = scoped_session(sessionmaker(bind=get_engine(config, replica=True), query_cls=BaseQuery),
+                            scopefunc=_app_ctx_stack.__ident_func__) if config.has_replica() else None
+blob_store = get_blob_store(config)
+# run events are looked up by one thread per process (started with the first event stream) for all its clients
+event_feed = EventFeed(lambda: get_engine(config, replica=config.has_replica()),
+                       float(config.get('Database', 'EventInterval', fallback=2)))
 login = LoginManager()
 login.login_view = 'auth.login'
 bootstrap = Bootstrap()
@@ -19,6 +30,7 @@ def create_web():
     web = Flask(__name__)
     web.config['SQLALCHEMY_DATABASE_URI'] = config.get_db_engine_string()
     web.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    web.config['SQLALCHEMY_ENGINE_OPTIONS'] = config.get_db_engine_options()
     web.config['SECRET_KEY'] = 'yn+T[bf037&3k$7ypK4"6LMjDkymbA~gv`#qN0N*7e{i+m4%,G+/.R<qh4y7!&O'
     web.config['MAIL_SERVER'] = config.get('Email', 'host')
     web.config['MAIL_PORT'] = int(config.get('Email', 'port'))
@@ -28,6 +40,7 @@ def create_web():
     # web.debug = True
 
     db.init_app(web)
+    web.teardown_appcontext(remove_read_db)
     login.init_app(web)
     bootstrap.init_app(web)
     mail.init_app(web)
@@ -50,3 +63,27 @@ def create_web():
 @login.user_loader
 def load_user(uid):
     return db.session.query(User).filter(User.uid == int(uid)).first()
+
+
+def get_read_db():
+    """
+    Session for read-only queries, bound to the replica if one is configured (and to the primary database otherwise);
+    as the replica may lag behind, anything read in order to be changed must be read through db.session instead
+    :return:
+    """
+    return db.session if replica_db is None else replica_db
+
+
+def remove_read_db(exception=None):
+    if replica_db is not None:
+        replica_db.remove()
+
+
+def get_acl():
+    """
+    Access control of the current user, computed at most once per request (unless privileges change in the meantime)
+    :return:
+    """
+    if 'acl' not in g:
+        g.acl = AccessControl(db.session, current_user)
+    return g.acl
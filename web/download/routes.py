@@ -4,8 +4,10 @@ from flask_mail import Message
 from flask import render_template, flash, redirect, url_for, current_app
 from web.main import bp
 from flask_login import current_user, login_required
-from web import db, config
+from web import db, config, blob_store, get_read_db
 from scrapebot.database import *
+from scrapebot.acl import AccessControl
+from scrapebot.archive import RunArchive
 import csv
 import os
 import hashlib
@@ -31,6 +33,10 @@ def download():
                 return redirect(url_for('main.dashboard'))
 
 
+def load_value(value):
+    return value if blob_store is None else blob_store.load(value)
+
+
 def init_threaded_download(web, user, instance_uids, recipe_uids):
     with web.app_context():
         temp_name = 'order_' + hashlib.md5(bytes(user.email + str(time.time()), encoding='utf-8')).hexdigest() + '.csv'
@@ -43,15 +49,31 @@ def init_threaded_download(web, user, instance_uids, recipe_uids):
                                               'data_creation', 'data_value'],
                                   extrasaction='ignore')
         csv_data.writeheader()
+        acl = AccessControl(db.session, user)
+        read_db = get_read_db()
+        archive = RunArchive(config.get('Database', 'ArchiveDirectory', fallback='archive/'))
         for instance_uid in instance_uids:
-            instance = db.session.query(Instance).filter(Instance.uid == instance_uid).one_or_none()
-            if instance and instance.is_visible_to_user(user):
+            instance = read_db.query(Instance).filter(Instance.uid == instance_uid).one_or_none()
+            if instance and acl.can_view_instance(instance):
                 for recipe_uid in recipe_uids:
-                    recipe = db.session.query(Recipe).filter(Recipe.uid == recipe_uid).one_or_none()
-                    if recipe and recipe.is_visible_to_user(user):
+                    recipe = read_db.query(Recipe).filter(Recipe.uid == recipe_uid).one_or_none()
+                    if recipe and acl.can_view_recipe(recipe):
+                        # runs moved into the archive are older than those still in the database, so they come first
+                        for run in archive.read(recipe_uid, instance_uid):
+                            csv_data.writerows([{
+                                'run': str(run['created']),
+                                'instance': instance.name,
+                                'recipe': str(recipe_uid),
+                                'recipe_name': recipe.name,
+                                'recipe_status': run['status'].name,
+                                'step': data['step_sort'],
+                                'step_name': data['step_type'],
+                                'data_creation': str(data['created']),
+                                'data_value': load_value(data['value'])
+                            } for data in run['data']])
                         rows = []
                         for run_data in \
-                                db.session.query(
+                                read_db.query(
                                     Data.created, Data.value,
                                     RecipeStep.sort, RecipeStep.type,
                                     Run.created, Run.status
@@ -69,7 +91,7 @@ def init_threaded_download(web, user, instance_uids, recipe_uids):
                                 'step': run_data[2],
                                 'step_name': run_data[3].name,
                                 'data_creation': str(run_data[0]),
-                                'data_value': run_data[1]
+                                'data_value': load_value(run_data[1])
                             })
                         csv_data.writerows(rows)
         file_size = temp_file.tell()
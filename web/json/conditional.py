@@ -0,0 +1,113 @@
+import hashlib
+from functools import wraps
+from flask import request, make_response, current_app
+from flask_login import current_user
+from sqlalchemy import select, func, and_
+from web import get_read_db, get_acl
+from scrapebot.database import Instance, Recipe, RecipeOrder, Run, RunStats, UserInstancePrivilege, \
+    UserRecipePrivilege
+
+
+def get_scope_columns(acl):
+    """
+    Scalar subqueries on the instances and recipes visible to the user, which change whenever any of them is edited,
+    shared, added, or removed
+    :param acl:
+    :return:
+    """
+    instance_filter = acl.get_instance_filter(Instance.uid)
+    recipe_filter = acl.get_recipe_filter(Recipe.uid)
+    order_filter = and_(acl.get_instance_filter(RecipeOrder.instance_uid),
+                        acl.get_recipe_filter(RecipeOrder.recipe_uid))
+    return [
+        select([func.count(Instance.uid)]).where(instance_filter).as_scalar(),
+        select([func.max(Instance.updated)]).where(instance_filter).as_scalar(),
+        select([func.count(Recipe.uid)]).where(recipe_filter).as_scalar(),
+        select([func.max(Recipe.updated)]).where(recipe_filter).as_scalar(),
+        select([func.count(RecipeOrder.uid)]).where(order_filter).as_scalar(),
+        select([func.max(RecipeOrder.created)]).where(order_filter).as_scalar(),
+        select([func.max(UserInstancePrivilege.created)])
+        .where(UserInstancePrivilege.user_uid == current_user.uid).as_scalar(),
+        select([func.max(UserRecipePrivilege.created)])
+        .where(UserRecipePrivilege.user_uid == current_user.uid).as_scalar()
+    ]
+
+
+def get_stats_columns(acl, recipe_uid=None, instance_uid=None):
+    """
+    Scalar subqueries on the statistics of the runs visible to the user (optionally only of a recipe and/or
+    instance), which change whenever one of these runs finishes
+    :param acl:
+    :param recipe_uid:
+    :param instance_uid:
+    :return:
+    """
+    stats_filter = and_(acl.get_instance_filter(RunStats.instance_uid), acl.get_recipe_filter(RunStats.recipe_uid))
+    if recipe_uid is not None:
+        stats_filter = and_(stats_filter, RunStats.recipe_uid == recipe_uid)
+    if instance_uid is not None:
+        stats_filter = and_(stats_filter, RunStats.instance_uid == instance_uid)
+    return [
+        select([func.sum(RunStats.run_count)]).where(stats_filter).as_scalar(),
+        select([func.max(RunStats.updated)]).where(stats_filter).as_scalar()
+    ]
+
+
+def get_newest_run_columns(recipe_uid=None, instance_uid=None):
+    """
+    Scalar subqueries on the most recently started run (optionally only of a recipe and/or instance), so that runs
+    still in progress are considered, too; either way, the run is found via an index rather than by scanning runs
+    :param recipe_uid:
+    :param instance_uid:
+    :return:
+    """
+    if recipe_uid is None and instance_uid is None:
+        newest_uid = select([func.max(Run.uid)]).as_scalar()
+    else:
+        newest_uid = select([Run.uid]).order_by(Run.created.desc(), Run.uid.desc()).limit(1)
+        if recipe_uid is not None:
+            newest_uid = newest_uid.where(Run.recipe_uid == recipe_uid)
+        if instance_uid is not None:
+            newest_uid = newest_uid.where(Run.instance_uid == instance_uid)
+        newest_uid = newest_uid.as_scalar()
+    return [newest_uid, select([Run.created]).where(Run.uid == newest_uid).as_scalar()]
+
+
+def get_etag(db, columns):
+    """
+    Entity tag of the current request's response, computed from the state of the data it is built from (as fetched by
+    columns) rather than from the response itself; there is deliberately no modification date, since the newest date
+    does not change when something is deleted or no longer shared, while the counts within the state do
+    :param db:
+    :param columns:
+    :return:
+    """
+    state = db.query(*columns).one()
+    return hashlib.sha1(repr((current_user.uid, request.path, sorted(request.args.items(multi=True)),
+                              request.get_data(), tuple(state))).encode('utf-8')).hexdigest()
+
+
+def conditional(get_columns):
+    """
+    Decorator answering conditional requests (If-None-Match) to a JSON view with 304 Not Modified whenever the data
+    the view is built from has not changed since, so that polling browsers cause one cheap query instead of a complete
+    serialization; the columns (see get_etag) are given by get_columns, called with the ACL and the arguments of the
+    view
+    :param get_columns:
+    :return:
+    """
+    def decorate(view):
+        @wraps(view)
+        def respond(*args, **kwargs):
+            etag = get_etag(get_read_db(), get_columns(get_acl(), *args, **kwargs))
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+            response.set_etag(etag, weak=True)
+            # browsers may keep responses, but need to revalidate them every time
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return respond
+    return decorate
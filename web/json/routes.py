@@ -1,94 +1,148 @@
-from flask import jsonify, request
-from web import db
-from scrapebot.database import Run, Instance, Recipe, UserRecipePrivilege, RecipeOrder
+import time
+from flask import jsonify, request, json, Response
+from web import get_read_db, get_acl, blob_store, event_feed
+from scrapebot.database import Run, Instance, Recipe, UserInstancePrivilege, RecipeOrder
+from scrapebot.serialize import get_run_serializer, dump_recipes_with_latest_runs
 from flask_login import current_user, login_required
 from web.json import bp
-from sqlalchemy import func, or_
+from web.json.conditional import conditional, get_scope_columns, get_stats_columns, get_newest_run_columns
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+
+
+def get_uids():
+    """
+    Uids the current request filters by, given as repeated uids query arguments (so that the request can be a
+    conditional GET) or, as formerly, in a JSON body posted
+    :return: list of uids, or None if not filtered
+    """
+    if 'uids' in request.args:
+        return request.args.getlist('uids', type=int)
+    json = request.get_json(silent=True)
+    if json is not None and 'uids' in json:
+        return json['uids']
+    return None
 
 
 @bp.route('/json/instances', methods=['GET', 'POST'])
 @login_required
+# the latest runs of instances include runs in progress, too
+@conditional(lambda acl: get_scope_columns(acl) + get_stats_columns(acl) + get_newest_run_columns())
 def instances():
-    recipe_uids = []
-    json = request.get_json()
-    if json is not None and 'uids' in json:
-        recipe_uids = json['uids']
+    recipe_uids = get_uids() or []
+    read_db = get_read_db()
+    # owned instances first, then those shared with the user, all with their owners and in one query each
+    temp_instances = read_db.query(Instance)\
+        .options(joinedload(Instance.owner))\
+        .filter(Instance.owner_uid == current_user.uid)\
+        .order_by(Instance.name)\
+        .all()
+    temp_instances.extend(privilege.instance for privilege in read_db.query(UserInstancePrivilege)
+                          .options(joinedload(UserInstancePrivilege.instance).joinedload(Instance.owner))
+                          .filter(UserInstancePrivilege.user_uid == current_user.uid)
+                          .order_by(UserInstancePrivilege.created))
+    instance_uids = [temp_instance.uid for temp_instance in temp_instances]
+    if len(recipe_uids) > 0:
+        # one entry per instance and each of the given recipes it runs
+        orders = {}
+        for instance_uid, recipe_uid in read_db.query(RecipeOrder.instance_uid, RecipeOrder.recipe_uid)\
+                .filter(RecipeOrder.instance_uid.in_(instance_uids), RecipeOrder.recipe_uid.in_(recipe_uids))\
+                .order_by(RecipeOrder.created):
+            orders.setdefault(instance_uid, []).append(recipe_uid)
+        entries = [(temp_instance, recipe_uid) for temp_instance in temp_instances
+                   for recipe_uid in orders.get(temp_instance.uid, [])]
+    else:
+        entries = [(temp_instance, None) for temp_instance in temp_instances]
+    latest_run_uids = Run.get_latest_uids(read_db, instance_uids, recipe_uids if len(recipe_uids) > 0 else None)
+    serializer = get_run_serializer()
+    latest_runs = dict((temp_run.uid, serializer.dump(temp_run)) for temp_run in serializer.query(read_db.query(Run))
+                       .filter(Run.uid.in_(set(latest_run_uids.values()))))
     data = []
-    for instance in current_user.instances_owned:
-        if len(recipe_uids) > 0:
-            for order in instance.recipes:
-                if order.recipe_uid in recipe_uids:
-                    data.append(instance.jsonify(include_latest_run=True, recipe=order.recipe))
-        else:
-            data.append(instance.jsonify(include_latest_run=True))
-    for privilege in current_user.instance_privileges:
-        if len(recipe_uids) > 0:
-            for order in privilege.instance.recipes:
-                if order.recipe_uid in recipe_uids:
-                    data.append(privilege.instance.jsonify(include_latest_run=True, recipe=order.recipe))
-        else:
-            data.append(privilege.instance.jsonify(include_latest_run=True))
+    for temp_instance, recipe_uid in entries:
+        instance_json = temp_instance.jsonify()
+        instance_json['latest_run'] = latest_runs.get(latest_run_uids.get((temp_instance.uid, recipe_uid)), False)
+        data.append(instance_json)
     return jsonify({'status': 200, 'count': len(data), 'data': data})
 
 
 @bp.route('/json/recipes', methods=['GET', 'POST'])
 @login_required
+# the latest runs of recipes include runs in progress
+@conditional(lambda acl: get_scope_columns(acl) + get_stats_columns(acl) + get_newest_run_columns())
 def recipes():
-    data = []
-    for (recipe, latest_run_uid) in db.session.query(
-            Recipe,
-            func.max(Run.uid)
-        ).outerjoin(
-            UserRecipePrivilege,
-            UserRecipePrivilege.recipe_uid == Recipe.uid
-        ).outerjoin(
-            Run,
-            Run.recipe_uid == Recipe.uid
-        ).outerjoin(
-            RecipeOrder,
-            RecipeOrder.recipe_uid == Recipe.uid
-        ).filter(
-            or_(
-                Recipe.owner_uid == current_user.uid,
-                UserRecipePrivilege.user_uid == current_user.uid
-            ),
-            # careful: the following is a filter statement based on an IF
-            RecipeOrder.instance_uid.in_(request.get_json()['uids']) if
-            request.get_json() is not None and 'uids' in request.get_json() else
-            1 == 1
-        ).group_by(Recipe):
-        recipe_json = recipe.jsonify()
-        if latest_run_uid is not None:
-            run = db.session.query(Run).filter(Run.uid == latest_run_uid).one_or_none()
-            if run is not None:
-                recipe_json['latest_run'] = run.jsonify()
-        data.append(recipe_json)
+    data = dump_recipes_with_latest_runs(get_read_db(), get_acl(), get_uids())
     return jsonify({'status': 200, 'count': len(data), 'data': data})
 
 
 @bp.route('/json/run/<run_uid>')
 @login_required
 def run(run_uid):
-    temp_run = db.session.query(Run).filter(Run.uid == int(run_uid)).first()
-    if temp_run.recipe.is_visible_to_user(current_user) and temp_run.instance.is_visible_to_user(current_user):
-        return jsonify({'status': 200, 'run': temp_run.jsonify(True, True)})
+    serializer = get_run_serializer(include_log=True, include_data=True, blob_store=blob_store)
+    temp_run = serializer.query(get_read_db().query(Run)).filter(Run.uid == int(run_uid)).first()
+    if temp_run is not None and get_acl().can_view_run(temp_run):
+        return jsonify({'status': 200, 'run': serializer.dump(temp_run)})
     return jsonify({'status': 403, 'message': 'No permission to view this run.'})
 
 
-@bp.route('/json/runs/<recipe_uid>-<instance_uid>', defaults={'page': 1})
-@bp.route('/json/runs/<recipe_uid>-<instance_uid>/<page>')
-@login_required
-def runs(recipe_uid, instance_uid, page):
-    data = []
-    temp_runs = db.session.query(Run)
+def get_runs_columns(acl, recipe_uid, instance_uid, page=None):
+    recipe_uid = int(recipe_uid) if int(recipe_uid) > 0 else None
+    instance_uid = int(instance_uid) if int(instance_uid) > 0 else None
+    return get_scope_columns(acl) + get_stats_columns(acl, recipe_uid, instance_uid) + \
+        get_newest_run_columns(recipe_uid, instance_uid)
+
+
+def query_runs(serializer, recipe_uid, instance_uid):
+    # permissions are checked by the database, so that every page holds as many visible runs as requested
+    temp_runs = serializer.query(get_read_db().query(Run)).filter(get_acl().get_run_filter())
     if int(recipe_uid) > 0:
         temp_runs = temp_runs.filter(Run.recipe_uid == int(recipe_uid))
     if int(instance_uid) > 0:
         temp_runs = temp_runs.filter(Run.instance_uid == int(instance_uid))
-    temp_runs = temp_runs.order_by(Run.created.desc()).paginate(int(page), 10, error_out=False)
+    return temp_runs
+
+
+@bp.route('/json/runs/<recipe_uid>-<instance_uid>')
+@login_required
+@conditional(get_runs_columns)
+def runs(recipe_uid, instance_uid):
+    data = []
+    serializer = get_run_serializer()
+    temp_runs = query_runs(serializer, recipe_uid, instance_uid)
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+    try:
+        temp_runs, next_cursor = Run.paginate(temp_runs, request.args.get('before'), limit)
+    except ValueError:
+        return jsonify({'status': 400, 'message': 'Invalid cursor.'})
+    for temp_run in temp_runs:
+        data.append(serializer.dump(temp_run))
+    return jsonify({
+        'status': 200,
+        'count': len(data),
+        'data': data,
+        'limit': limit,
+        'has_next': next_cursor is not None,
+        'next_cursor': next_cursor
+    })
+
+
+@bp.route('/json/runs/<recipe_uid>-<instance_uid>/<page>')
+@login_required
+@conditional(get_runs_columns)
+def runs_page(recipe_uid, instance_uid, page):
+    """
+    Numbered pages of ten runs, kept for clients from before cursors (see runs), although far pages get slow
+    :param recipe_uid:
+    :param instance_uid:
+    :param page:
+    :return:
+    """
+    data = []
+    serializer = get_run_serializer()
+    temp_runs = query_runs(serializer, recipe_uid, instance_uid)\
+        .order_by(Run.created.desc(), Run.uid.desc())\
+        .paginate(int(page), 10, error_out=False)
     for temp_run in temp_runs.items:
-        if temp_run.recipe.is_visible_to_user(current_user) and temp_run.instance.is_visible_to_user(current_user):
-            data.append(temp_run.jsonify())
+        data.append(serializer.dump(temp_run))
     return jsonify({
         'status': 200,
         'count': len(data),
@@ -104,9 +158,9 @@ def runs(recipe_uid, instance_uid, page):
 @bp.route('/json/instance/<instance_uid>/chart')
 @login_required
 def instance_chart(instance_uid):
-    temp_instance = db.session.query(Instance).filter(Instance.uid == instance_uid).first()
-    if temp_instance is not None and temp_instance.is_visible_to_user(current_user):
-        data = db.session.query(Recipe.name, func.date(Run.created), func.count(Run.uid))\
+    temp_instance = get_read_db().query(Instance).filter(Instance.uid == instance_uid).first()
+    if temp_instance is not None and get_acl().can_view_instance(temp_instance):
+        data = get_read_db().query(Recipe.name, func.date(Run.created), func.count(Run.uid))\
             .select_from(Run)\
             .filter(Run.instance_uid == instance_uid)\
             .join(Run.recipe)\
@@ -127,3 +181,41 @@ def instance_chart(instance_uid):
             'datasets': [{'label': name, 'data': values} for name, values in datasets.items()]
         })
     return jsonify({'status': 403, 'message': 'No permission to view this instance.'})
+
+
+@bp.route('/json/events')
+@login_required
+def events():
+    # server-sent events on runs started and finished; streams end after five minutes, upon which browsers reconnect
+    # (with the uid of the last event received), so that changed privileges are taken into account
+    event_feed.start()
+    acl = get_acl()
+    recipe_uids = acl.get_visible_recipe_uids()
+    instance_uids = acl.get_visible_instance_uids()
+    after_uid = request.headers.get('Last-Event-ID', type=int)
+    if after_uid is None:
+        after_uid = event_feed.get_latest_uid()
+
+    def stream(after_uid):
+        yield 'retry: 5000\n\n'
+        end = time.time() + 300
+        while time.time() < end:
+            temp_events = event_feed.wait(after_uid, 15)
+            if temp_events is None:
+                # events have been missed, so everything needs to be reloaded
+                after_uid = event_feed.get_latest_uid()
+                yield 'id: %d\nevent: reset\ndata: {}\n\n' % after_uid
+            elif len(temp_events) == 0:
+                yield ': keep-alive\n\n'
+            for temp_event in temp_events or []:
+                after_uid = temp_event['uid']
+                if temp_event['run']['recipe']['uid'] in recipe_uids and \
+                        temp_event['run']['instance']['uid'] in instance_uids:
+                    yield 'id: %d\nevent: run\ndata: %s\n\n' % (after_uid, json.dumps(temp_event))
+                else:
+                    # only moves on the uid the browser reconnects with
+                    yield 'id: %d\n\n' % after_uid
+
+    # the request (and thus its database sessions) ends before streaming starts, as no queries are needed anymore
+    return Response(stream(after_uid), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
@@ -1,7 +1,7 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, SubmitField, TextAreaField, BooleanField, SelectField, IntegerField
-from wtforms.validators import DataRequired, Email
-from scrapebot.emulate import RecipeStepTypeEnum
+from wtforms.validators import DataRequired, Email, Optional
+from scrapebot.emulate import RecipeStepTypeEnum, RecipeEngineEnum
 
 
 class RecipeForm(FlaskForm):
@@ -9,6 +9,9 @@ class RecipeForm(FlaskForm):
     description = TextAreaField('Description')
     interval = IntegerField('Interval [minutes]', validators=[DataRequired()])
     cookies = BooleanField('Store cookies')
+    engine = SelectField('Engine', choices=RecipeEngineEnum.choices(), coerce=RecipeEngineEnum.coerce,
+                         default=RecipeEngineEnum.auto.name)
+    retention = IntegerField('Archive runs after [days, empty for default, 0 for never]', validators=[Optional()])
     active = BooleanField('Activated', default=True)
     submit = SubmitField('Save')
 
@@ -5,7 +5,7 @@ from threading import Thread
 from datetime import date
 from flask import render_template, flash, redirect, url_for, request, current_app, send_file
 from scrapebot.database import *
-from web import db, mail
+from web import db, mail, get_acl
 from flask_login import current_user, login_required
 from flask_mail import Message
 from web.main import bp
@@ -31,14 +31,14 @@ def imprint():
 @login_required
 def instance(instance_uid):
     temp_instance = db.session.query(Instance).filter(Instance.uid == instance_uid).first()
-    if temp_instance is not None and temp_instance.is_visible_to_user(current_user):
+    if temp_instance is not None and get_acl().can_view_instance(temp_instance):
         user_recipes = current_user.recipes_owned
         for privilege in current_user.recipe_privileges:
             if privilege.allowed_to_edit:
                 user_recipes.append(privilege.recipe)
         form_privilege = PrivilegeForm()
         if form_privilege.validate_on_submit() and form_privilege.email.data:
-            if temp_instance.owner_uid is current_user.uid:
+            if temp_instance.owner_uid == current_user.uid:
                 temp_user = db.session.query(User).filter(User.email == form_privilege.email.data).first()
                 if temp_user is None or temp_user is temp_instance.owner:
                     flash('User not found')
@@ -124,7 +124,7 @@ def recipe(recipe_uid):
     temp_recipe = None
     if recipe_uid is not None:
         temp_recipe = db.session.query(Recipe).filter(Recipe.uid == int(recipe_uid)).first()
-        if not temp_recipe.is_visible_to_user(current_user):
+        if not get_acl().can_view_recipe(temp_recipe):
             flash('You do not have the permission to view this recipe.')
             return redirect(url_for('main.dashboard'))
     instances = current_user.instances_owned
@@ -139,6 +139,8 @@ def recipe(recipe_uid):
         temp_recipe.description = form.description.data
         temp_recipe.interval = form.interval.data
         temp_recipe.cookies = form.cookies.data
+        temp_recipe.engine = RecipeEngineEnum[RecipeEngineEnum.coerce(form.engine.data)]
+        temp_recipe.retention = form.retention.data
         temp_recipe.active = form.active.data
         for temp_instance in instances:
             if request.form.get('instance_' + str(temp_instance.uid)) == 'y':
@@ -162,7 +164,7 @@ def recipe(recipe_uid):
         return redirect(url_for('main.recipe', recipe_uid=recipe_uid))
     form_privilege = PrivilegeForm()
     if form_privilege.validate_on_submit() and form_privilege.email.data:
-        if temp_recipe.owner_uid is current_user.uid:
+        if temp_recipe.owner_uid == current_user.uid:
             temp_user = db.session.query(User).filter(User.email == form_privilege.email.data).first()
             if temp_user is None or temp_user is temp_recipe.owner:
                 flash('User not found')
@@ -202,6 +204,8 @@ def recipe(recipe_uid):
         form.description.data = temp_recipe.description
         form.interval.data = temp_recipe.interval
         form.cookies.data = temp_recipe.cookies
+        form.engine.data = temp_recipe.engine.name if temp_recipe.engine is not None else RecipeEngineEnum.auto.name
+        form.retention.data = temp_recipe.retention
         form.active.data = temp_recipe.active
         for temp_instance in instances:
             user_instances.append({
@@ -247,7 +251,7 @@ def recipe_multiple_action(recipe_uids, deactivate):
     changes = 0
     for recipe_uid in recipe_uids:
         temp_recipe = db.session.query(Recipe).filter(Recipe.uid == recipe_uid).first()
-        if temp_recipe is not None and temp_recipe.is_editable_by_user(current_user):
+        if temp_recipe is not None and get_acl().can_edit_recipe(temp_recipe):
             if temp_recipe.active and deactivate:
                 temp_recipe.active = False
                 changes = changes + 1
@@ -266,7 +270,7 @@ def recipe_multiple_action(recipe_uids, deactivate):
 @login_required
 def recipe_export(recipe_uid):
     temp_recipe = db.session.query(Recipe).filter(Recipe.uid == int(recipe_uid)).one_or_none()
-    if temp_recipe is None or not temp_recipe.is_visible_to_user(current_user):
+    if temp_recipe is None or not get_acl().can_view_recipe(temp_recipe):
         flash('You do not have the permission to view this recipe.')
         return redirect(url_for('main.dashboard'))
     sbj = {
@@ -276,6 +280,7 @@ def recipe_export(recipe_uid):
         'description': temp_recipe.description,
         'interval': temp_recipe.interval,
         'cookies': temp_recipe.cookies,
+        'engine': temp_recipe.engine.name if temp_recipe.engine is not None else RecipeEngineEnum.auto.name,
         'active': temp_recipe.active,
         'steps': []
     }
@@ -312,6 +317,8 @@ def recipe_import():
             description=sbj['description'],
             active=True if sbj['active'] else False,
             cookies=True if sbj['cookies'] else False,
+            engine=RecipeEngineEnum[sbj['engine']] if sbj.get('engine') in RecipeEngineEnum.__members__ else
+            RecipeEngineEnum.auto,
             interval=sbj['interval'],
             owner=current_user
         )
@@ -349,7 +356,7 @@ def recipe_duplicate(recipe_uid):
     temp_recipe = None
     if recipe_uid is not None:
         temp_recipe = db.session.query(Recipe).filter(Recipe.uid == int(recipe_uid)).first()
-        if not temp_recipe.is_editable_by_user(current_user):
+        if not get_acl().can_edit_recipe(temp_recipe):
             flash('You do not have the permission to copy this recipe.')
             return redirect(url_for('main.recipe', recipe_uid=recipe_uid))
     instances = current_user.instances_owned
@@ -399,6 +406,8 @@ def init_threaded_duplication(web, user, form, temp_recipe, instances, form_subm
                 description=form.description.data,
                 active=form.active.data,
                 cookies=temp_recipe.cookies,
+                engine=temp_recipe.engine,
+                retention=temp_recipe.retention,
                 interval=temp_recipe.interval
             )
             for temp_step in temp_recipe.steps:
@@ -445,13 +454,13 @@ def init_threaded_duplication(web, user, form, temp_recipe, instances, form_subm
 @login_required
 def step(recipe_uid, step_uid):
     temp_recipe = db.session.query(Recipe).filter(Recipe.uid == int(recipe_uid)).first()
-    if not temp_recipe.is_visible_to_user(current_user):
+    if not get_acl().can_view_recipe(temp_recipe):
         flash('You do not have the permission to view this recipe.')
         return redirect(url_for('main.dashboard'))
     temp_step = None
     if step_uid is not None:
         temp_step = db.session.query(RecipeStep).filter(RecipeStep.uid == int(step_uid)).first()
-        if not temp_step.recipe.is_visible_to_user(current_user):
+        if not get_acl().can_view_recipe(temp_step.recipe_uid):
             flash('You do not have the permission to view this recipe.')
             return redirect(url_for('main.dashboard'))
     form_step = RecipeStepForm()
@@ -509,7 +518,7 @@ def step(recipe_uid, step_uid):
 @login_required
 def step_move(step_uid, direction):
     temp_step = db.session.query(RecipeStep).filter(RecipeStep.uid == int(step_uid)).first()
-    if not temp_step.recipe.is_visible_to_user(current_user):
+    if not get_acl().can_view_recipe(temp_step.recipe_uid):
         flash('You do not have the permission to view this recipe.')
         return redirect(url_for('main.dashboard'))
     if len(temp_step.recipe.steps) > 1:
@@ -539,7 +548,7 @@ def step_move(step_uid, direction):
 def item(recipe_uid, step_uid, item_uid, delete):
     temp_recipe = db.session.query(Recipe).filter(Recipe.uid == int(recipe_uid)).first()
     temp_step = db.session.query(RecipeStep).filter(RecipeStep.uid == int(step_uid)).first()
-    if not temp_recipe.is_visible_to_user(current_user) or not temp_step.recipe.is_visible_to_user(current_user):
+    if not get_acl().can_view_recipe(temp_recipe) or not get_acl().can_view_recipe(temp_step.recipe_uid):
         flash('You do not have the permission to view this recipe.')
         return redirect(url_for('main.dashboard'))
     form = RecipeStepItemForm()
@@ -14,12 +14,13 @@ $(function(){
         $('#' + model + 's').html(loading);
         var fifo_element = Math.random();
         refresh_fifo[model].push(fifo_element);
+        // a GET (with uids=1&uids=2 rather than uids[]=...) so that the browser revalidates its cached copy, which
+        // the server confirms with 304 as long as nothing listed has changed
         $.ajax({
             url: '/json/' + model + 's',
-            method: 'POST',
             dataType: 'json',
-            data: ($.isArray(only_with_connections) ? JSON.stringify({uids: only_with_connections}) : '{}'),
-            processData: false,
+            data: ($.isArray(only_with_connections) ? {uids: only_with_connections} : {}),
+            traditional: true,
             success: (function (callback, fifo_element) {
                 return function (_data) {
                     if ((refresh_fifo[model].indexOf(fifo_element)+1) == refresh_fifo[model].length) {
@@ -27,10 +28,6 @@ $(function(){
                             $('#' + model + 's').html('');
                             var opposing_model = get_opposing_model(model);
                             $.each(_data['data'], function (i, elem) {
-                                var opposing_model_from_latest_run = '';
-                                if (typeof(elem.latest_run) !== 'undefined') {
-                                    opposing_model_from_latest_run = elem.latest_run[opposing_model];
-                                }
                                 $('#' + model + 's').append(
                                     '<li class="list-group-item px-1' + (typeof (elem.active) != 'undefined' && !elem.active ?
                                     ' list-group-item-light" title="currently inactive"' : '"') + '>' +
@@ -48,14 +45,9 @@ $(function(){
                                         elem.description.replace(/\r\n|\r|\n/g, '<br />') +
                                         '</p>'
                                     ) : '') +
-                                    (elem.latest_run ? (
-                                        '<small class="text-muted">Last run was <a href="/' + opposing_model + '/' +
-                                        opposing_model_from_latest_run.uid + '">' +
-                                        opposing_model_from_latest_run.name.substr(0, 12) +
-                                        (opposing_model_from_latest_run.name.length > 12 ? '...' : '') +
-                                        '</a> on <a href="/json/run/' + elem.latest_run.uid + '">' +
-                                        elem.latest_run.created + '</a></small>'
-                                    ) : '') +
+                                    '<small class="text-muted latest-run">' +
+                                    render_latest_run(opposing_model, elem.latest_run) +
+                                    '</small>' +
                                     '</div>' +
                                     '</div>' +
                                     '</li>');
@@ -75,6 +67,26 @@ $(function(){
             })(callback, fifo_element)
         });
     }
+    function render_latest_run(opposing_model, latest_run) {
+        if (!latest_run) {
+            return '';
+        }
+        var opposing = latest_run[opposing_model];
+        return 'Last run was <a href="/' + opposing_model + '/' + opposing.uid + '">' +
+            opposing.name.substr(0, 12) + (opposing.name.length > 12 ? '...' : '') +
+            '</a> on <a href="/json/run/' + latest_run.uid + '">' + latest_run.created + '</a>';
+    }
+    function update_latest_run(model, run) {
+        // lists filtered by the opposing model hold one entry per combination, which events cannot tell apart
+        if (filter != '') {
+            return;
+        }
+        $('#' + model + 's input[type="checkbox"][data-uid="' + run[model].uid + '"]')
+            .parents('li.list-group-item')
+            .find('.latest-run')
+            .html(render_latest_run(get_opposing_model(model), run));
+        init_run_detail_view_handler();
+    }
     function init_instance_recipe_connector(model) {
         $('#' + model + 's input[type="checkbox"][data-uid]').off('change').on('change', function() {
             if($(this).is(':checked')) {
@@ -258,27 +270,39 @@ $(function(){
     /**
      * Self-updating run-view handler
      */
+    function render_run(run, recipe_uid) {
+        var item = $('<li class="list-group-item list-group-item-' +
+            (run.status == 'success' ? 'success' :
+                (run.status == 'in_progress' ? 'info' :
+                    (run.status == 'error' ? 'danger' : 'warning'))) + '" data-run="' + run.uid + '"></li>');
+        if(recipe_uid === null) {
+            item.append('<a href="/json/run/' + run.uid + '" class="d-block">' +
+                run.recipe.name + ' on ' + run.created + (run.status == 'success' ? '' : (': ' + run.status))
+                + ' (' + run.runtime + 's)</a>');
+        } else {
+            item.append('<a href="/json/run/' + run.uid + '" class="d-block">' +
+                run.created + ' on ' + run.instance.name + (run.status == 'success' ? '' : (': ' + run.status))
+                + ' (' + run.runtime + 's)</a>');
+        }
+        return item;
+    }
     function refresh_runs(ul, recipe_uid, instance_uid) {
-        var runs = [];
-        $(ul).html(loading);
-        $.getJSON('/json/runs/' + (recipe_uid > 0 ? recipe_uid : '0') + '-' + (instance_uid > 0 ? instance_uid : '0'), function(_data) {
+        if($(ul).children().length == 0) {
+            $(ul).html(loading);
+        }
+        // conditional request, answered with 304 (and thus no data) as long as no run has changed since the last one
+        $.ajax({
+            url: '/json/runs/' + (recipe_uid > 0 ? recipe_uid : '0') + '-' + (instance_uid > 0 ? instance_uid : '0'),
+            dataType: 'json',
+            ifModified: true
+        }).done(function(_data, status) {
+            if(status == 'notmodified') {
+                return;
+            }
             if(_data['status'] == 200) {
                 $(ul).html('');
                 $.each(_data['data'], function(i, run) {
-                    var item = $('<li class="list-group-item list-group-item-' +
-                        (run.status == 'success' ? 'success' :
-                            (run.status == 'in_progress' ? 'info' :
-                                (run.status == 'error' ? 'danger' : 'warning'))) + '"></li>');
-                    if(recipe_uid === null) {
-                        item.append('<a href="/json/run/' + run.uid + '" class="d-block">' +
-                            run.recipe.name + ' on ' + run.created + (run.status == 'success' ? '' : (': ' + run.status))
-                            + ' (' + run.runtime + 's)</a>');
-                    } else {
-                        item.append('<a href="/json/run/' + run.uid + '" class="d-block">' +
-                            run.created + ' on ' + run.instance.name + (run.status == 'success' ? '' : (': ' + run.status))
-                            + ' (' + run.runtime + 's)</a>');
-                    }
-                    $(ul).append(item);
+                    $(ul).append(render_run(run, recipe_uid));
                 });
                 init_run_detail_view_handler();
             } else {
@@ -286,14 +310,47 @@ $(function(){
             }
         });
     }
-    $('.runs[data-recipe]').each(function(i, elem) {
-        refresh_runs(elem, $(elem).data('recipe'));
-        setInterval(refresh_runs, 60000, elem, $(elem).data('recipe'));
-    });
-    $('.runs[data-instance]').each(function(i, elem) {
-        refresh_runs(elem, null, $(elem).data('instance'));
-        setInterval(refresh_runs, 60000, elem, null, $(elem).data('instance'));
-    });
+    function update_run(ul, run, recipe_uid) {
+        var item = render_run(run, recipe_uid),
+            existing = $(ul).children('[data-run="' + run.uid + '"]');
+        if(existing.length > 0) {
+            existing.replaceWith(item);
+        } else {
+            $(ul).children(':not([data-run])').remove();
+            $(ul).prepend(item);
+            $(ul).children().slice(10).remove();
+        }
+        init_run_detail_view_handler();
+    }
+    function refresh_all_runs() {
+        $('.runs[data-recipe]').each(function(i, elem) {
+            refresh_runs(elem, $(elem).data('recipe'));
+        });
+        $('.runs[data-instance]').each(function(i, elem) {
+            refresh_runs(elem, null, $(elem).data('instance'));
+        });
+    }
+    refresh_all_runs();
+    if(typeof(EventSource) !== 'undefined') {
+        // runs started and finished are pushed by the server, so lists are only reloaded rarely, just in case
+        var run_events = new EventSource('/json/events');
+        run_events.addEventListener('run', function(_event) {
+            var run = JSON.parse(_event.data).run;
+            $('.runs[data-recipe="' + run.recipe.uid + '"]').each(function(i, elem) {
+                update_run(elem, run, run.recipe.uid);
+            });
+            $('.runs[data-instance="' + run.instance.uid + '"]').each(function(i, elem) {
+                update_run(elem, run, null);
+            });
+            // the latest runs of recipes and instances both include runs in progress
+            update_latest_run('recipe', run);
+            update_latest_run('instance', run);
+        });
+        run_events.addEventListener('reset', refresh_all_runs);
+        setInterval(refresh_all_runs, 600000);
+    } else {
+        setInterval(refresh_all_runs, 60000);
+    }
 
 
     /**